@@ -162,4 +162,87 @@ WEB_REPORTS_DIR = os.path.join(SIMILARITY_REPORTS_DIR, 'web_reports')
 os.makedirs(WEB_REPORTS_DIR, exist_ok=True)
 
 MAX_URLS_PER_REQUEST = 10
-MIN_SIMILARITY_THRESHOLD = 10
\ No newline at end of file
+MIN_SIMILARITY_THRESHOLD = 10
+
+# Worker processes used to run pairwise assignment comparisons in parallel
+SIMILARITY_MAX_WORKERS = os.cpu_count() or 1
+
+# A 'running' job whose worker has not reported progress for this long
+# (seconds) is taken to belong to a worker that died: it is queued again, or
+# failed once it has been claimed SIMILARITY_JOB_MAX_ATTEMPTS times
+SIMILARITY_JOB_TIMEOUT = 30 * 60
+SIMILARITY_JOB_MAX_ATTEMPTS = 3
+
+# Web similarity HTTP client: concurrent searches/fetches, per-host cap,
+# per-request timeout and an overall deadline for one analysis (seconds)
+WEB_MAX_CONCURRENCY = 8
+WEB_PER_HOST_LIMIT = 2
+WEB_REQUEST_TIMEOUT = 10
+WEB_ANALYSIS_DEADLINE = 30
+
+# On-disk cache of cleaned web page text used by the web similarity check
+WEB_PAGE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'web_pages')
+WEB_PAGE_CACHE_TTL = 7 * 24 * 60 * 60  # seconds before a page is revalidated
+WEB_PAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# On-disk cache of web search results, keyed by normalized query
+WEB_SEARCH_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'web_searches')
+WEB_SEARCH_CACHE_TTL = 3 * 24 * 60 * 60  # seconds before a query is searched again
+WEB_SEARCH_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+# Local reference corpus (past submissions, lecturer assignments, fetched web
+# pages) checked before any live web search. Scores are the percentage of a
+# submission's word shingles found in a source.
+CORPUS_INDEX_DIR = os.path.join(BASE_DIR, 'cache', 'corpus_index')
+CORPUS_SHINGLE_SIZE = 5
+CORPUS_TOP_K = 5
+CORPUS_MIN_SCORE = 5
+CORPUS_SKIP_SEARCH_SCORE = 30  # a cached web page this similar makes the live search unnecessary
+
+# Text extraction runs in a pool of sandboxed worker processes. A file taking
+# longer than the timeout (seconds) has its worker killed; timeouts and
+# crashed workers are retried EXTRACTION_RETRIES times.
+EXTRACTION_MAX_WORKERS = 2
+EXTRACTION_TIMEOUT = 60
+EXTRACTION_MEMORY_LIMIT_MB = 1024  # address space cap per worker, POSIX only
+EXTRACTION_RETRIES = 1
+
+# Corpus-wide vocabulary and IDF weights shared by all TF-IDF comparisons
+IDF_MODEL_DIR = os.path.join(BASE_DIR, 'cache', 'idf_model')
+
+# Stored comparison scores are rescored under the current IDF weights once
+# the corpus has grown by this fraction since they were computed (or the
+# model is rebuilt); smaller updates keep them and their rendered reports
+IDF_GENERATION_DRIFT = 0.25
+
+# Matches shown in full in a pairwise similarity report; the rest go to a
+# summary appendix (0 shows every match)
+SIMILARITY_REPORT_TOP_K = 200
+
+# Pairwise comparison algorithm. Stored comparison results are keyed by the
+# two files' content hashes plus this version and threshold; bump the version
+# whenever the analysis changes so old results are recomputed.
+SIMILARITY_ALGORITHM_VERSION = 2
+SENTENCE_MATCH_THRESHOLD = 0.6
+
+# Winnowing fingerprints: character k-gram length and window size. Any shared
+# run of at least k + w - 1 characters of preprocessed text is detected.
+FINGERPRINT_KGRAM_SIZE = 20
+FINGERPRINT_WINDOW_SIZE = 20
+
+# MinHash/LSH candidate search over fingerprint sets. Signatures of
+# MINHASH_NUM_PERM values are split into MINHASH_BANDS bands; pairs sharing a
+# band whose estimated Jaccard similarity reaches the threshold are analysed.
+# Once common fingerprints are left out (below), copying a few sentences of a
+# long submission still gives a Jaccard of only 1-2%: bands of two rows
+# missed half of such pairs in benchmark_minhash, so every band is one row.
+MINHASH_NUM_PERM = 256
+MINHASH_BANDS = 256
+MINHASH_JACCARD_THRESHOLD = 0.01
+
+# Fingerprints found in more than this fraction of the compared submissions
+# (a prompt, template or common reference list) are left out of MinHash, and
+# LSH buckets of more than MINHASH_MAX_BUCKET_SIZE submissions are skipped,
+# so shared boilerplate doesn't make every pair a candidate
+MINHASH_COMMON_FRACTION = 0.2
+MINHASH_MAX_BUCKET_SIZE = 50
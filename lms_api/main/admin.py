@@ -10,5 +10,10 @@ admin.site.register(models.Course)
 admin.site.register(models.Student)
 admin.site.register(models.Assignment)
 admin.site.register(models.St_Assignment)
+admin.site.register(models.DocumentText)
+admin.site.register(models.SimilarityJob)
+admin.site.register(models.ComparisonResult)
+admin.site.register(models.SimilarityReport)
+admin.site.register(models.PairSimilarity)
 #admin.site.register(models.AssignmentSubmission)
 
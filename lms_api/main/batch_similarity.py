@@ -0,0 +1,58 @@
+import logging
+
+import numpy as np
+
+from .idf_model import get_document_counts, get_idf_model
+from .utils import cache_assignment_text
+
+logger = logging.getLogger(__name__)
+
+# Term counts of a document with no cached text
+EMPTY_COUNTS = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+
+
+def compute_similarity_matrix(counts_list):
+    """
+    Compute the full N x N cosine similarity matrix for a list of stored term
+    counts (see idf_model). The rows of the shared TF-IDF model are
+    L2-normalised, so every pairwise cosine comes out of a single sparse product.
+
+    Returns:
+        numpy.ndarray: N x N matrix of similarity scores between 0.0 and 1.0
+    """
+    tfidf_matrix = get_idf_model().matrix(counts_list)
+    return (tfidf_matrix @ tfidf_matrix.T).toarray()
+
+def load_assignment_counts(assignments):
+    """
+    Return the stored term counts of each assignment, in order, without
+    reading any text. Documents with no cached text get empty counts.
+    """
+    for assignment in assignments:
+        if not assignment.content_hash:
+            cache_assignment_text(assignment)
+    counts = get_document_counts([assignment.content_hash for assignment in assignments])
+    return [counts.get(assignment.content_hash, EMPTY_COUNTS) for assignment in assignments]
+
+def build_similarity_matrix(assignments):
+    """
+    Compare a batch of St_Assignment rows in one pass.
+
+    Returns:
+        dict: assignment ids and titles in matrix order, and the matrix as
+        percentages rounded to two decimals
+    """
+    assignments = list(assignments)
+    counts_list = load_assignment_counts(assignments)
+
+    if not any(len(indices) for indices, _ in counts_list):
+        raise ValueError("None of the selected documents contain any text")
+
+    matrix = compute_similarity_matrix(counts_list)
+    logger.info(f"Computed {len(assignments)}x{len(assignments)} similarity matrix")
+
+    return {
+        'assignment_ids': [assignment.id for assignment in assignments],
+        'assignment_titles': [assignment.title for assignment in assignments],
+        'matrix': [[round(float(score) * 100, 2) for score in row] for row in matrix]
+    }
@@ -0,0 +1,99 @@
+import logging
+
+import numpy as np
+
+from .idf_model import get_document_counts, get_idf_model
+from .models import PairSimilarity, St_Assignment
+
+logger = logging.getLogger(__name__)
+
+
+def update_class_similarity(assignment):
+    """
+    Compare a newly uploaded submission with every earlier submission of its
+    course and store the resulting row of the class similarity matrix.
+    Existing pairs are left untouched, so they keep the scores of the IDF
+    model at the time they were stored.
+
+    Returns:
+        int: number of pairs stored
+    """
+    if assignment.course_id is None or not assignment.content_hash:
+        return 0
+
+    candidates = list(
+        St_Assignment.objects.filter(course_id=assignment.course_id).exclude(id=assignment.id).exclude(content_hash='')
+    )
+    counts = get_document_counts([assignment.content_hash] + [other.content_hash for other in candidates])
+    if assignment.content_hash not in counts:
+        return 0
+
+    others = [other for other in candidates if other.content_hash in counts]
+    if not others:
+        return 0
+
+    # TF-IDF rows under the shared corpus model, so scores agree with pairwise
+    # comparisons; one sparse product gives the whole new row
+    matrix = get_idf_model().matrix([counts[assignment.content_hash]] + [counts[other.content_hash] for other in others])
+    scores = (matrix[1:] @ matrix[0].T).toarray().ravel()
+
+    pairs = []
+    for other, score in zip(others, scores):
+        first, second = sorted([assignment, other], key=lambda a: a.id)
+        pairs.append(PairSimilarity(
+            course_id=assignment.course_id,
+            assignment1=first,
+            assignment2=second,
+            score=round(float(score) * 100, 2)
+        ))
+    PairSimilarity.objects.bulk_create(
+        pairs,
+        update_conflicts=True,
+        unique_fields=['assignment1', 'assignment2'],
+        update_fields=['score', 'computed_at']
+    )
+    logger.info(f"Stored {len(pairs)} class similarity pairs for submission {assignment.id}")
+    return len(pairs)
+
+def get_class_matrix(course_id):
+    """
+    Return the stored similarity matrix of a course's submissions.
+
+    Returns:
+        dict: assignment_ids, assignment_titles and matrix (percentages)
+    """
+    assignments = list(St_Assignment.objects.filter(course_id=course_id).order_by('id'))
+    positions = {assignment.id: i for i, assignment in enumerate(assignments)}
+
+    matrix = np.full((len(assignments), len(assignments)), None, dtype=object)
+    np.fill_diagonal(matrix, 100.0)
+    for assignment1_id, assignment2_id, score in PairSimilarity.objects.filter(course_id=course_id).values_list(
+            'assignment1_id', 'assignment2_id', 'score'):
+        i, j = positions.get(assignment1_id), positions.get(assignment2_id)
+        if i is not None and j is not None:
+            matrix[i, j] = matrix[j, i] = score
+
+    return {
+        'assignment_ids': [assignment.id for assignment in assignments],
+        'assignment_titles': [assignment.title for assignment in assignments],
+        'matrix': matrix.tolist()
+    }
+
+def get_suspicious_pairs(course_id, limit=10, min_score=None):
+    """
+    Return a course's most similar pairs of submissions, highest score first.
+    """
+    pairs = PairSimilarity.objects.filter(course_id=course_id).select_related('assignment1', 'assignment2')
+    if min_score is not None:
+        pairs = pairs.filter(score__gte=min_score)
+    return [
+        {
+            'assignment1_id': pair.assignment1_id,
+            'assignment1_title': pair.assignment1.title,
+            'assignment2_id': pair.assignment2_id,
+            'assignment2_title': pair.assignment2.title,
+            'similarity_score': pair.score,
+            'computed_at': pair.computed_at.isoformat()
+        }
+        for pair in pairs.order_by('-score')[:limit]
+    ]
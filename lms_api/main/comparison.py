@@ -0,0 +1,366 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .idf_model import get_document_counts, get_idf_model
+from .models import ComparisonResult, DocumentText, SimilarityReport
+from .pair_worker import compare_pair_task, init_worker
+from .report_catalogue import register_report, update_report_size
+from .sentence_spans import get_document_sentences
+from .utils import cache_assignment_texts, calculate_similarity, get_document_text, render_similarity_report
+from .web_similarity import analyze_assignment_web_similarity
+
+logger = logging.getLogger(__name__)
+
+
+def build_pair_result(assignment1, assignment2, similarity_result):
+    """
+    Build the API result entry for one compared pair from a calculate_similarity result.
+    """
+    result = {
+        'assignment1_id': assignment1.id,
+        'assignment1_title': assignment1.title,
+        'assignment2_id': assignment2.id,
+        'assignment2_title': assignment2.title,
+        'similarity_score': similarity_result.get('similarity_score', 0),
+        'cached': similarity_result.get('cached', False),
+    }
+
+    # Add report links if available; the PDF is rendered when first opened
+    if similarity_result.get('report_filename'):
+        report_filename = similarity_result['report_filename']
+        result.update({
+            'report_url': f'/api/reports/{report_filename}',
+            'download_url': f'/api/download-report/{report_filename}',
+            'report_filename': report_filename
+        })
+
+    # Add error if present
+    if 'error' in similarity_result:
+        result['error'] = similarity_result['error']
+
+    return result
+
+def get_algorithm_version():
+    return f'{settings.SIMILARITY_ALGORITHM_VERSION}-t{settings.SENTENCE_MATCH_THRESHOLD}'
+
+def comparison_key(assignment1, assignment2):
+    """
+    Content address of a comparison: the unordered pair of file content hashes
+    plus the algorithm version. Re-comparing the same files (in either order,
+    or re-uploaded under another name) maps to the same key, and bumping the
+    version maps every pair to a new one. None if either hash is unknown.
+    
+    The corpus IDF model is deliberately not part of the key: it changes with
+    every upload, while the sentence analysis does not depend on it. Stored
+    results record the model generation instead, and refresh_stored_score
+    rescores them when a new generation starts (see IDFModel.generation).
+    """
+    if not assignment1.content_hash or not assignment2.content_hash:
+        return None
+    first, second = sorted([assignment1.content_hash, assignment2.content_hash])
+    return hashlib.sha256(f'{first}:{second}:{get_algorithm_version()}'.encode('utf-8')).hexdigest()
+
+def ensure_content_hashes(assignments):
+    """
+    Fill in the content hash of assignments uploaded before hashes were recorded.
+    """
+    missing = [assignment for assignment in assignments if not assignment.content_hash]
+    if not missing:
+        return
+    try:
+        errors = cache_assignment_texts(missing)
+    except Exception as e:
+        logger.error(f"Could not hash assignments: {e}")
+        return
+    for assignment_id, error in errors.items():
+        logger.error(f"Could not read assignment {assignment_id}: {error}")
+
+def refresh_stored_score(comparison, assignment1, assignment2):
+    """
+    Rescore a stored comparison computed under an older IDF model from the
+    documents' stored term counts, so it agrees with a fresh comparison. The
+    rendered report, which shows the old score, is discarded.
+    """
+    if comparison.idf_generation == get_idf_model().generation:
+        return comparison
+    try:
+        counts = get_document_counts([assignment1.content_hash, assignment2.content_hash])
+        model = get_idf_model()
+        score = model.similarity(counts[assignment1.content_hash], counts[assignment2.content_hash])
+    except Exception as e:
+        logger.error(f"Could not rescore comparison {comparison.id}: {e}")
+        return comparison
+    
+    ComparisonResult.objects.filter(id=comparison.id).update(
+        similarity_score=score, idf_generation=model.generation, report_rendered_at=None
+    )
+    comparison.similarity_score = score
+    comparison.idf_generation = model.generation
+    SimilarityReport.objects.filter(kind=SimilarityReport.KIND_PAIRWISE, filename=comparison.report_filename).update(
+        score=comparison.similarity_percentage, size=None
+    )
+    file_path = os.path.join(settings.SIMILARITY_REPORTS_DIR, comparison.report_filename)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    return comparison
+
+def stored_similarity_result(comparison):
+    """
+    A calculate_similarity-style result for an already stored comparison.
+    """
+    return {
+        'similarity_score': comparison.similarity_percentage,
+        'report_path': None,
+        'report_filename': comparison.report_filename,
+        'cached': True
+    }
+
+def store_comparison_result(assignment1, assignment2, similarity_result, pair_key):
+    """
+    Save the structured analysis of a calculate_similarity result as a
+    ComparisonResult under its content address, so repeats are served from it
+    and its report can be rendered on demand. Sets the result's report_filename.
+    """
+    if 'comparison' not in similarity_result or pair_key is None:
+        return None
+    comparison, created = ComparisonResult.objects.get_or_create(
+        pair_key=pair_key,
+        defaults={
+            'report_filename': f'similarity_report_{pair_key[:16]}.pdf',
+            'algorithm_version': get_algorithm_version(),
+            'assignment1': assignment1,
+            'assignment2': assignment2,
+            **similarity_result['comparison']
+        }
+    )
+    if created:
+        register_report(comparison.report_filename, SimilarityReport.KIND_PAIRWISE,
+                        comparison.similarity_percentage, assignment1, assignment2)
+    similarity_result['report_filename'] = comparison.report_filename
+    return comparison
+
+def record_pair_result(assignment1, assignment2, similarity_result, pair_key):
+    store_comparison_result(assignment1, assignment2, similarity_result, pair_key)
+    return build_pair_result(assignment1, assignment2, similarity_result)
+
+def purge_stale_comparisons():
+    """
+    Delete stored comparisons made by another algorithm version, with their
+    catalogue entries and rendered reports. Returns the number removed.
+    """
+    stale = ComparisonResult.objects.exclude(algorithm_version=get_algorithm_version())
+    filenames = list(stale.values_list('report_filename', flat=True))
+    if not filenames:
+        return 0
+
+    SimilarityReport.objects.filter(kind=SimilarityReport.KIND_PAIRWISE, filename__in=filenames).delete()
+    stale.delete()
+    for filename in filenames:
+        file_path = os.path.join(settings.SIMILARITY_REPORTS_DIR, filename)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    logger.info(f"Purged {len(filenames)} comparison results from older algorithm versions")
+    return len(filenames)
+
+def build_pair_error(assignment1, assignment2, error):
+    return {
+        'assignment1_id': assignment1.id,
+        'assignment1_title': assignment1.title,
+        'assignment2_id': assignment2.id,
+        'assignment2_title': assignment2.title,
+        'error': f'Failed to compare: {str(error)}',
+        'similarity_score': None
+    }
+
+def compare_assignment_pair(assignment1, assignment2):
+    """
+    Compare two St_Assignment rows and build the result entry returned by the API.
+    A stored result for the same pair of file contents is reused.
+    Failures are reported in the entry's 'error' key instead of raising.
+    """
+    try:
+        ensure_content_hashes([assignment1, assignment2])
+        pair_key = comparison_key(assignment1, assignment2)
+        stored = ComparisonResult.objects.filter(pair_key=pair_key).first() if pair_key else None
+        if stored is not None:
+            stored = refresh_stored_score(stored, assignment1, assignment2)
+            return build_pair_result(assignment1, assignment2, stored_similarity_result(stored))
+        
+        similarity_result = calculate_similarity(
+            assignment1.file.path,
+            assignment2.file.path,
+            assignment1.content_hash,
+            assignment2.content_hash
+        )
+        return record_pair_result(assignment1, assignment2, similarity_result, pair_key)
+    except Exception as e:
+        return build_pair_error(assignment1, assignment2, e)
+
+def load_pair_documents(assignments):
+    """
+    Read the cached text of every assignment once, for hand-off to worker processes.
+    Assignments whose text can't be read are left out; their pairs report an error.
+    """
+    try:
+        counts = get_document_counts([assignment.content_hash for assignment in assignments])
+    except Exception as e:
+        logger.error(f"Could not load term counts: {e}")
+        counts = {}
+    try:
+        spans = get_document_sentences([assignment.content_hash for assignment in assignments])
+    except Exception as e:
+        logger.error(f"Could not load sentence spans: {e}")
+        spans = {}
+
+    documents = {}
+    for assignment in assignments:
+        try:
+            raw_text, preprocessed_text, _ = get_document_text(assignment.file.path, assignment.content_hash)
+            documents[assignment.id] = (os.path.basename(assignment.file.path), raw_text, preprocessed_text,
+                                        counts.get(assignment.content_hash), spans.get(assignment.content_hash))
+        except Exception as e:
+            logger.error(f"Could not read assignment {assignment.id}: {e}")
+    return documents
+
+def iter_pairwise_results(assignments, max_workers=None):
+    """
+    Compare every pair of the given St_Assignment rows, yielding one result
+    entry per pair in order of completion.
+    """
+    assignments = list(assignments)
+    ensure_content_hashes(assignments)
+    pairs = [(assignments[i], assignments[j])
+             for i in range(len(assignments))
+             for j in range(i + 1, len(assignments))]
+    yield from iter_pair_results(pairs, max_workers)
+
+def iter_pair_results(pairs, max_workers=None):
+    """
+    Compare the given pairs of St_Assignment rows (with content hashes filled
+    in), yielding one result entry per pair in order of completion. Pairs
+    whose file contents were compared before are answered from the stored
+    results at once; the rest are spread over a process pool of
+    SIMILARITY_MAX_WORKERS workers. One failing pair never affects the others.
+    """
+    # Answer repeated comparisons from the store with one query
+    pair_keys = {pair: comparison_key(*pair) for pair in pairs}
+    stored = {
+        comparison.pair_key: comparison
+        for comparison in ComparisonResult.objects.filter(pair_key__in=[key for key in pair_keys.values() if key])
+    }
+    pending = []
+    for assignment1, assignment2 in pairs:
+        comparison = stored.get(pair_keys[(assignment1, assignment2)])
+        if comparison is not None:
+            comparison = refresh_stored_score(comparison, assignment1, assignment2)
+            yield build_pair_result(assignment1, assignment2, stored_similarity_result(comparison))
+        else:
+            pending.append((assignment1, assignment2))
+
+    if max_workers is None:
+        max_workers = settings.SIMILARITY_MAX_WORKERS
+    max_workers = min(max_workers, len(pending))
+
+    if max_workers <= 1:
+        for assignment1, assignment2 in pending:
+            yield compare_assignment_pair(assignment1, assignment2)
+        return
+
+    documents = load_pair_documents({assignment for pair in pending for assignment in pair})
+
+    # Forked workers must not share this process's database connection
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(documents,)) as executor:
+        futures = {
+            executor.submit(compare_pair_task, assignment1.id, assignment2.id): (assignment1, assignment2)
+            for assignment1, assignment2 in pending
+        }
+        for future in as_completed(futures):
+            assignment1, assignment2 = futures[future]
+            try:
+                yield record_pair_result(assignment1, assignment2, future.result(),
+                                         pair_keys[(assignment1, assignment2)])
+            except Exception as e:
+                # The worker process itself died (e.g. killed for memory)
+                yield build_pair_error(assignment1, assignment2, e)
+
+def load_report_texts(comparison):
+    """
+    Return the cached raw texts of a ComparisonResult's two documents, with
+    '' for a document whose submission or text is gone.
+    """
+    content_hashes = [
+        assignment.content_hash if assignment is not None else ''
+        for assignment in (comparison.assignment1, comparison.assignment2)
+    ]
+    texts = dict(DocumentText.objects.filter(
+        content_hash__in=[content_hash for content_hash in content_hashes if content_hash]
+    ).values_list('content_hash', 'raw_text'))
+    return tuple(texts.get(content_hash, '') for content_hash in content_hashes)
+
+def get_report_path(filename):
+    """
+    Return the path of a pairwise similarity report, rendering the PDF from its
+    ComparisonResult the first time it is requested, and again once its score
+    has been refreshed under a new IDF generation. Returns None if there is
+    no such report.
+    """
+    file_path = os.path.join(settings.SIMILARITY_REPORTS_DIR, filename)
+    comparison = ComparisonResult.objects.filter(report_filename=filename).select_related(
+        'assignment1', 'assignment2').first()
+    if comparison is None:
+        # Reports generated before comparisons were stored
+        return file_path if os.path.isfile(file_path) else None
+
+    if comparison.assignment1 is not None and comparison.assignment2 is not None:
+        refresh_stored_score(comparison, comparison.assignment1, comparison.assignment2)
+    if os.path.isfile(file_path):
+        return file_path
+
+    os.makedirs(settings.SIMILARITY_REPORTS_DIR, exist_ok=True)
+    logger.info(f"Rendering similarity report {filename}")
+    render_similarity_report(comparison, file_path, texts=load_report_texts(comparison))
+    ComparisonResult.objects.filter(id=comparison.id).update(report_rendered_at=timezone.now())
+    update_report_size(filename, SimilarityReport.KIND_PAIRWISE)
+    return file_path
+
+def check_assignment_web_similarity(assignment):
+    """
+    Run the web similarity analysis for one St_Assignment and build the API response body.
+    Raises RuntimeError if the analysis fails.
+    """
+    # Define output directory for reports
+    web_reports_dir = os.path.join(settings.SIMILARITY_REPORTS_DIR, 'web_reports')
+    os.makedirs(web_reports_dir, exist_ok=True)
+
+    logger.info(f"Starting web similarity analysis for assignment {assignment.id}")
+
+    result = analyze_assignment_web_similarity(assignment.file.path, web_reports_dir, assignment.content_hash)
+
+    if 'error' in result:
+        logger.error(f"Web similarity analysis failed: {result['error']}")
+        raise RuntimeError(result['error'])
+
+    report_filename = os.path.basename(result['report_path'])
+    register_report(report_filename, SimilarityReport.KIND_WEB, result['web_similarity_score'], assignment)
+
+    logger.info(f"Web similarity analysis completed for assignment {assignment.id}")
+
+    return {
+        'assignment_id': assignment.id,
+        'assignment_title': assignment.title,
+        'web_similarity_score': result['web_similarity_score'],
+        'analysis_summary': result['analysis_summary'],
+        'corpus_matches': result.get('corpus_matches', []),
+        'report_url': f'/api/web-reports/{report_filename}',
+        'download_url': f'/api/download-web-report/{report_filename}'
+    }
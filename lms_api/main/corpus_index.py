@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .models import Assignment, St_Assignment
+from .utils import get_document_text
+from .web_cache import get_page_cache
+
+logger = logging.getLogger(__name__)
+
+KIND_WEB = 'web'
+KIND_SUBMISSION = 'submission'
+KIND_ASSIGNMENT = 'assignment'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def shingle_hashes(text, size=None):
+    """
+    Hash every run of `size` consecutive words of a text to a 64-bit integer.
+
+    Returns:
+        numpy.ndarray: sorted, unique uint64 shingle hashes
+    """
+    size = size or settings.CORPUS_SHINGLE_SIZE
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    if len(words) < size:
+        size = len(words)
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(' '.join(words[i:i + size]).encode('utf-8'), digest_size=8).digest(), 'little')
+        for i in range(len(words) - size + 1)
+    ]
+    return np.unique(np.array(hashes, dtype=np.uint64))
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CorpusIndex:
+    """
+    An inverted index from word-shingle hashes to the corpus sources that
+    contain them, stored on disk as:
+
+    - sources.json: source id -> {key, kind, title, url, content_hash, shingles}
+    - hashes.npy / source_ids.npy: the postings, sorted by hash, so a lookup
+      is a binary search over a memory-mapped array
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.sources = {}
+        self.next_id = 0
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.source_ids = np.empty(0, dtype=np.int32)
+        self._keys = {}
+        self._pending = []
+        self._removed = set()
+
+    @property
+    def _sources_path(self):
+        return os.path.join(self.directory, 'sources.json')
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open the index stored in a directory, or an empty one if there is none yet.
+        """
+        index = cls(directory)
+        try:
+            with open(index._sources_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            index.sources = {int(source_id): source for source_id, source in data['sources'].items()}
+            index.next_id = data['next_id']
+            index.hashes = np.load(os.path.join(directory, 'hashes.npy'), mmap_mode='r')
+            index.source_ids = np.load(os.path.join(directory, 'source_ids.npy'), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            index.sources = {}
+            index.next_id = 0
+        index._keys = {source['key']: source_id for source_id, source in index.sources.items()}
+        return index
+
+    def get_source(self, key):
+        source_id = self._keys.get(key)
+        return None if source_id is None else self.sources[source_id]
+
+    def keys(self):
+        return set(self._keys)
+
+    def add_source(self, key, kind, title, text, content_hash, url=None):
+        """
+        Add a source, replacing any older version stored under the same key.
+        Changes are kept in memory until save().
+        """
+        self.remove_source(key)
+
+        hashes = shingle_hashes(text)
+        source_id = self.next_id
+        self.next_id += 1
+        self.sources[source_id] = {
+            'key': key,
+            'kind': kind,
+            'title': title,
+            'url': url,
+            'content_hash': content_hash,
+            'shingles': int(len(hashes))
+        }
+        self._keys[key] = source_id
+        self._pending.append((hashes, np.full(len(hashes), source_id, dtype=np.int32)))
+
+    def remove_source(self, key):
+        source_id = self._keys.pop(key, None)
+        if source_id is not None:
+            del self.sources[source_id]
+            self._removed.add(source_id)
+
+    def save(self):
+        """
+        Merge pending changes into the postings and write the index to disk.
+        Each file is written to a temporary name and then renamed into place.
+        """
+        hashes, source_ids = np.asarray(self.hashes), np.asarray(self.source_ids)
+        if self._removed:
+            keep = ~np.isin(source_ids, np.fromiter(self._removed, dtype=np.int32))
+            hashes, source_ids = hashes[keep], source_ids[keep]
+
+        if self._pending:
+            hashes = np.concatenate([hashes] + [h for h, _ in self._pending])
+            source_ids = np.concatenate([source_ids] + [s for _, s in self._pending])
+            order = np.argsort(hashes, kind='stable')
+            hashes, source_ids = hashes[order], source_ids[order]
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in (('hashes.npy', hashes), ('source_ids.npy', source_ids)):
+            tmp_path = os.path.join(self.directory, f'{name}.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+
+        tmp_path = f'{self._sources_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'next_id': self.next_id, 'sources': self.sources}, f)
+        os.replace(tmp_path, self._sources_path)
+
+        self.hashes, self.source_ids = hashes, source_ids
+        self._pending = []
+        self._removed = set()
+
+    def query(self, text, top_k=None, exclude_hashes=()):
+        """
+        Find the indexed sources sharing the most word shingles with a text.
+
+        Args:
+            text: the text to look up
+            top_k: number of sources to return
+            exclude_hashes: content hashes of sources to leave out (e.g. the text itself)
+
+        Returns:
+            list: up to top_k dicts with the source fields plus 'matched_shingles' and
+                  'score', the percentage of the text's shingles found in the source
+        """
+        top_k = top_k or settings.CORPUS_TOP_K
+        query_hashes = shingle_hashes(text)
+        if not len(query_hashes) or not len(self.hashes):
+            return []
+
+        # Each query hash matches a (possibly empty) run of postings
+        left = np.searchsorted(self.hashes, query_hashes, side='left')
+        right = np.searchsorted(self.hashes, query_hashes, side='right')
+        lengths = right - left
+        total = int(lengths.sum())
+        if not total:
+            return []
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(total) - np.repeat(offsets, lengths) + np.repeat(left, lengths)
+
+        counts = np.bincount(np.asarray(self.source_ids)[positions])
+        matches = []
+        for source_id in np.argsort(counts)[::-1]:
+            matched = int(counts[source_id])
+            if not matched or len(matches) >= top_k:
+                break
+            source = self.sources.get(int(source_id))
+            if source is None or source['content_hash'] in exclude_hashes:
+                continue
+            matches.append({
+                **source,
+                'matched_shingles': matched,
+                'score': round(matched / len(query_hashes) * 100, 2)
+            })
+        return matches
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def get_corpus_index():
+    """
+    Return the on-disk corpus index, reloading it when the index has been rebuilt.
+    """
+    global _index, _index_mtime
+    directory = settings.CORPUS_INDEX_DIR
+    try:
+        mtime = os.path.getmtime(os.path.join(directory, 'sources.json'))
+    except OSError:
+        mtime = None
+
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = CorpusIndex.load(directory)
+            _index_mtime = mtime
+        return _index
+
+def query_corpus(text, top_k=None, exclude_hashes=()):
+    return get_corpus_index().query(text, top_k, exclude_hashes)
+
+def iter_corpus_documents():
+    """
+    Yield (key, kind, title, url, content_hash, load_text) for every document the
+    corpus is built from. load_text() returns the text and is only called for
+    documents that need (re)indexing.
+    """
+    for assignment in St_Assignment.objects.exclude(file=''):
+        yield (f'{KIND_SUBMISSION}:{assignment.id}', KIND_SUBMISSION, assignment.title, None,
+               assignment.content_hash,
+               lambda a=assignment: get_document_text(a.file.path, a.content_hash or None))
+
+    for assignment in Assignment.objects.exclude(file=''):
+        yield (f'{KIND_ASSIGNMENT}:{assignment.id}', KIND_ASSIGNMENT, assignment.title, None,
+               assignment.content_hash,
+               lambda a=assignment: get_document_text(a.file.path, a.content_hash or None))
+
+    for entry in get_page_cache().items():
+        if entry.get('url') and entry.get('text'):
+            content_hash = text_hash(entry['text'])
+            yield (f"{KIND_WEB}:{entry['url']}", KIND_WEB, entry['url'], entry['url'],
+                   content_hash, lambda e=entry, h=content_hash: (e['text'], None, h))
+
+def update_corpus_index(rebuild=False):
+    """
+    Bring the corpus index up to date with the current submissions, lecturer
+    assignments and cached web pages. Unchanged documents are skipped unless
+    rebuild is set; documents that no longer exist are removed.
+
+    Returns:
+        dict: counts of added, updated, removed, unchanged and failed sources
+    """
+    index = CorpusIndex(settings.CORPUS_INDEX_DIR) if rebuild else CorpusIndex.load(settings.CORPUS_INDEX_DIR)
+    stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'failed': 0}
+    stale_keys = index.keys()
+
+    for key, kind, title, url, content_hash, load_text in iter_corpus_documents():
+        stale_keys.discard(key)
+        existing = index.get_source(key)
+        if existing and content_hash and existing['content_hash'] == content_hash:
+            stats['unchanged'] += 1
+            continue
+
+        try:
+            text, _, content_hash = load_text()
+        except Exception as e:
+            logger.error(f"Could not read corpus document {key}: {e}")
+            stats['failed'] += 1
+            continue
+        if not text:
+            stats['failed'] += 1
+            continue
+
+        index.add_source(key, kind, title, text, content_hash, url)
+        stats['updated' if existing else 'added'] += 1
+
+    for key in stale_keys:
+        index.remove_source(key)
+        stats['removed'] += 1
+
+    index.save()
+    stats['sources'] = len(index.sources)
+    return stats
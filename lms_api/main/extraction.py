@@ -0,0 +1,316 @@
+"""
+Sandboxed text extraction.
+
+Extractors (see extractors) run in a bounded pool of long-lived worker
+processes, each in its own process group with a capped address space. A
+file that takes longer than the timeout gets its worker (and any converter
+it started) killed and replaced, so a pathological upload can never hang a
+request thread, and every extraction reports a structured ExtractionResult.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .extractors import IN_PROCESS_EXTENSIONS, extract_with_registry, file_extension
+from .text_normalization import tidy_extracted_text
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; workers run without a memory cap
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """Raised when a file's text could not be extracted."""
+
+
+@dataclass
+class ExtractionResult:
+    file_path: str
+    text: str = ''
+    error: str = ''
+    extractor: str = ''
+    timed_out: bool = False
+    attempts: int = 0
+    duration: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.error
+
+    def to_dict(self):
+        return {
+            'file_name': os.path.basename(self.file_path),
+            'ok': self.ok,
+            'error': self.error or None,
+            'extractor': self.extractor or None,
+            'timed_out': self.timed_out,
+            'attempts': self.attempts,
+            'duration': round(self.duration, 3),
+            'characters': len(self.text)
+        }
+
+
+def extract_text(file_path):
+    """
+    Extract and tidy a file's text in the current process.
+
+    Returns:
+        tuple: (text, name of the extractor used)
+    """
+    text, extractor = extract_with_registry(file_path)
+    return tidy_extracted_text(text), extractor
+
+def _worker_main(conn, memory_limit):
+    """
+    Worker process loop: receive file paths, send back ('ok', (text, extractor)) or ('error', message).
+    """
+    # Own process group, so a timeout also kills converters textract started
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        try:
+            file_path = conn.recv()
+        except (EOFError, OSError):
+            return
+        if file_path is None:
+            return
+        try:
+            conn.send(('ok', extract_text(file_path)))
+        except MemoryError:
+            conn.send(('error', 'Extraction exceeded the memory limit'))
+        except Exception as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+class ExtractionMetrics:
+    """
+    Counters of one process's extractions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, result):
+        extension = file_extension(result.file_path) or 'none'
+        with self._lock:
+            names = ['requested', 'succeeded' if result.ok else 'failed', f'extension_{extension}']
+            if result.extractor:
+                names.append(f'extractor_{result.extractor}')
+            for name in names:
+                self.counters[name] = self.counters.get(name, 0) + 1
+            if result.timed_out:
+                self.counters['timed_out'] = self.counters.get('timed_out', 0) + 1
+            self.total_seconds += result.duration
+            self.max_seconds = max(self.max_seconds, result.duration)
+
+    def to_dict(self):
+        with self._lock:
+            requested = self.counters.get('requested', 0)
+            return {
+                **self.counters,
+                'total_seconds': round(self.total_seconds, 3),
+                'average_seconds': round(self.total_seconds / requested, 3) if requested else 0.0,
+                'max_seconds': round(self.max_seconds, 3)
+            }
+
+
+class ExtractionPool:
+    """
+    A bounded pool of extraction worker processes. At most max_workers files
+    are extracted at once; further callers wait for a free worker. Workers
+    are started on demand and replaced after max_tasks files, a crash or a
+    timeout. Timeouts and crashes are retried on a fresh worker.
+    """
+
+    def __init__(self, max_workers=None, timeout=None, memory_limit_mb=None, retries=None, max_tasks=100):
+        self.max_workers = max_workers or settings.EXTRACTION_MAX_WORKERS
+        self.timeout = timeout or settings.EXTRACTION_TIMEOUT
+        memory_limit_mb = settings.EXTRACTION_MEMORY_LIMIT_MB if memory_limit_mb is None else memory_limit_mb
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.retries = settings.EXTRACTION_RETRIES if retries is None else retries
+        self.max_tasks = max_tasks
+        self.metrics = ExtractionMetrics()
+
+        # A fresh interpreter per worker: small address space, no inherited state
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is None or not worker.process.is_alive():
+            try:
+                worker = _Worker(self._context, self.memory_limit)
+            except Exception:
+                self._slots.release()
+                raise
+            self.metrics.count('workers_started')
+        return worker
+
+    def _release(self, worker, reusable):
+        if reusable and worker.tasks < self.max_tasks:
+            with self._lock:
+                self._idle.append(worker)
+        elif reusable:
+            worker.stop()
+        self._slots.release()
+
+    def _attempt(self, file_path):
+        """
+        Run one extraction attempt.
+
+        Returns:
+            tuple: ((text, extractor) or None, error message, timed out, worth retrying)
+        """
+        worker = self._acquire()
+        reusable = False
+        try:
+            worker.tasks += 1
+            worker.conn.send(file_path)
+            if not worker.conn.poll(self.timeout):
+                worker.kill()
+                return None, f'Extraction timed out after {self.timeout}s', True, True
+            status, payload = worker.conn.recv()
+            reusable = True
+            if status == 'ok':
+                return payload, '', False, False
+            return None, payload, False, False
+        except (EOFError, OSError) as e:
+            # The worker died, e.g. killed at the memory limit
+            worker.kill()
+            return None, f'Extraction worker crashed: {e or type(e).__name__}', False, True
+        finally:
+            self._release(worker, reusable)
+
+    def extract(self, file_path):
+        """
+        Extract a file's text. Never raises; failures are reported in the result.
+
+        Returns:
+            ExtractionResult
+        """
+        result = ExtractionResult(file_path=file_path)
+        start = time.perf_counter()
+        if not os.path.isfile(file_path):
+            result.error = 'File not found'
+        elif file_extension(file_path) in IN_PROCESS_EXTENSIONS:
+            # Nothing to sandbox: read it right here
+            result.attempts = 1
+            try:
+                result.text, result.extractor = extract_text(file_path)
+            except Exception as e:
+                result.error = f'{type(e).__name__}: {e}'
+        else:
+            for attempt in range(1 + self.retries):
+                result.attempts = attempt + 1
+                if attempt:
+                    self.metrics.count('retried')
+                extracted, result.error, result.timed_out, retry = self._attempt(file_path)
+                if extracted is not None:
+                    result.text, result.extractor = extracted
+                    break
+                if not retry:
+                    break
+        result.duration = time.perf_counter() - start
+
+        self.metrics.record(result)
+        if not result.ok:
+            logger.error(f"Could not extract text from {file_path} "
+                         f"after {result.attempts} attempt(s): {result.error}")
+        return result
+
+    def extract_many(self, file_paths):
+        """
+        Extract several files, up to max_workers at a time.
+
+        Returns:
+            dict: file path -> ExtractionResult
+        """
+        file_paths = list(dict.fromkeys(file_paths))
+        if len(file_paths) <= 1:
+            return {file_path: self.extract(file_path) for file_path in file_paths}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(file_paths, executor.map(self.extract, file_paths)))
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool():
+    """
+    Return the process-wide extraction pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool()
+        return _pool
+
+def extract_file(file_path):
+    return get_extraction_pool().extract(file_path)
+
+def extract_files(file_paths):
+    return get_extraction_pool().extract_many(file_paths)
+
+def get_extraction_metrics():
+    return {
+        'max_workers': get_extraction_pool().max_workers,
+        **get_extraction_pool().metrics.to_dict()
+    }
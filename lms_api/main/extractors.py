@@ -0,0 +1,115 @@
+"""
+Native text extractors, picked by file extension. They parse in-process and
+stream their input (docx XML element by element, PDFs page by page) instead
+of shelling out through textract, which remains the fallback for other
+formats and for files a native extractor can't read.
+"""
+import io
+import logging
+import os
+import zipfile
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+# extension -> (extractor name, function)
+EXTRACTORS = {}
+
+# Formats cheap and safe enough to extract outside the sandboxed worker pool
+IN_PROCESS_EXTENSIONS = {'txt'}
+
+TEXT_ENCODINGS = ('utf-8-sig', 'cp1252', 'latin-1')
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def register(name, *extensions):
+    def decorator(func):
+        for extension in extensions:
+            EXTRACTORS[extension] = (name, func)
+        return func
+    return decorator
+
+def file_extension(file_path):
+    return os.path.splitext(file_path)[1].lower().lstrip('.')
+
+@register('text', 'txt')
+def extract_txt(file_path):
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+@register('docx-xml', 'docx')
+def extract_docx(file_path):
+    """
+    Stream the body of a .docx: text runs, tabs and breaks, one line per paragraph.
+    """
+    parts = []
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open('word/document.xml') as document:
+            for event, element in ElementTree.iterparse(document, events=('end',)):
+                tag = element.tag
+                if tag == f'{WORD_NAMESPACE}t':
+                    parts.append(element.text or '')
+                elif tag == f'{WORD_NAMESPACE}tab':
+                    parts.append('\t')
+                elif tag in (f'{WORD_NAMESPACE}br', f'{WORD_NAMESPACE}cr'):
+                    parts.append('\n')
+                elif tag == f'{WORD_NAMESPACE}p':
+                    parts.append('\n')
+                    # Paragraphs are done with; free them as we go
+                    element.clear()
+    return ''.join(parts)
+
+@register('pdfminer', 'pdf')
+def extract_pdf(file_path):
+    """
+    Read a PDF's text layer one page at a time.
+    """
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    pages = []
+    buffer = io.StringIO()
+    resource_manager = PDFResourceManager()
+    converter = TextConverter(resource_manager, buffer, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resource_manager, converter)
+    try:
+        with open(file_path, 'rb') as f:
+            for page in PDFPage.get_pages(f):
+                interpreter.process_page(page)
+                pages.append(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        converter.close()
+    return '\n'.join(pages)
+
+def extract_with_textract(file_path):
+    import textract
+
+    return textract.process(file_path).decode('utf-8', errors='replace')
+
+def extract_with_registry(file_path):
+    """
+    Extract a file's text with its native extractor, falling back to textract
+    if there is none, it fails, or it finds no text (e.g. a scanned PDF).
+
+    Returns:
+        tuple: (text, name of the extractor used)
+    """
+    name, extractor = EXTRACTORS.get(file_extension(file_path), (None, None))
+    if extractor is not None:
+        try:
+            text = extractor(file_path)
+            if text and text.strip():
+                return text, name
+        except Exception as e:
+            logger.warning(f"{name} extractor failed on {file_path}, falling back to textract: {e}")
+    return extract_with_textract(file_path), 'textract'
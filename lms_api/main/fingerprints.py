@@ -0,0 +1,294 @@
+"""
+Winnowing fingerprints (Schleimer, Wilkerson and Aiken, as used by MOSS).
+
+Every character k-gram of a document's preprocessed text is hashed, and in
+each window of `w` consecutive hashes the minimum is kept. Any run of at
+least k + w - 1 characters shared by two documents is guaranteed to produce
+a shared fingerprint, and fingerprints keep their positions, so matches can
+be reported as spans of text rather than a single score.
+"""
+import datetime
+import io
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DocumentText, St_Assignment
+
+logger = logging.getLogger(__name__)
+
+# Base of the polynomial k-gram hash; arithmetic wraps modulo 2**64
+HASH_BASE = np.uint64(1000003)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# How far before its previous sync the index looks for newly hashed
+# submissions, covering rows whose hash was committed after its time was taken
+SYNC_OVERLAP = datetime.timedelta(minutes=1)
+
+
+def kgram_hashes(text, k):
+    """
+    Hash every character k-gram of a text.
+
+    Returns:
+        numpy.ndarray: uint64 hash of the k-gram starting at each position
+    """
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    count = len(codes) - k + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    hashes = np.zeros(count, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for offset in range(k):
+            hashes = hashes * HASH_BASE + codes[offset:offset + count]
+        # Spread the bits so that window minima are well distributed
+        hashes = hashes * HASH_MIX
+        hashes ^= hashes >> np.uint64(29)
+    return hashes
+
+def winnow(hashes, window):
+    """
+    Select the fingerprints of a hash sequence: the minimum of every window
+    (the rightmost one on ties), each position recorded once.
+
+    Returns:
+        tuple: (fingerprint hashes as uint64, their positions as uint32)
+    """
+    if len(hashes) == 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32)
+    if len(hashes) <= window:
+        position = len(hashes) - 1 - int(np.argmin(hashes[::-1]))
+        return hashes[position:position + 1], np.array([position], dtype=np.uint32)
+
+    windows = np.lib.stride_tricks.sliding_window_view(hashes, window)
+    rightmost = window - 1 - np.argmin(windows[:, ::-1], axis=1)
+    positions = np.unique(np.arange(len(windows)) + rightmost)
+    return hashes[positions], positions.astype(np.uint32)
+
+def compute_fingerprints(preprocessed_text, k=None, window=None):
+    """
+    Fingerprint a document's preprocess_text output.
+
+    Returns:
+        tuple: (fingerprint hashes as uint64, their character offsets as uint32)
+    """
+    k = k or settings.FINGERPRINT_KGRAM_SIZE
+    window = window or settings.FINGERPRINT_WINDOW_SIZE
+    return winnow(kgram_hashes(preprocessed_text, k), window)
+
+def serialize_fingerprints(hashes, positions):
+    buffer = io.BytesIO()
+    np.savez(buffer, hashes=hashes, positions=positions)
+    return buffer.getvalue()
+
+def deserialize_fingerprints(blob):
+    arrays = np.load(io.BytesIO(blob))
+    return arrays['hashes'], arrays['positions']
+
+def get_document_fingerprints(content_hashes):
+    """
+    Return the stored fingerprints of cached documents, computing and storing
+    any that are missing. Documents not in the text cache are left out.
+
+    Returns:
+        dict: content hash -> (hashes, positions)
+    """
+    fingerprints = {}
+    for document in DocumentText.objects.filter(content_hash__in=set(content_hashes)):
+        if document.fingerprints:
+            fingerprints[document.content_hash] = deserialize_fingerprints(bytes(document.fingerprints))
+            continue
+        hashes, positions = compute_fingerprints(document.preprocessed_text)
+        DocumentText.objects.filter(id=document.id).update(fingerprints=serialize_fingerprints(hashes, positions))
+        fingerprints[document.content_hash] = (hashes, positions)
+    return fingerprints
+
+
+class FingerprintIndex:
+    """
+    In-memory inverted index from fingerprint hash to the submissions that
+    contain it, as two arrays sorted by hash. New submissions are buffered
+    and merged in on the next lookup; a submission whose file changed has
+    its old fingerprints dropped at the same time.
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.assignment_ids = np.empty(0, dtype=np.int64)
+        self.indexed = {}  # assignment id -> content hash its fingerprints were indexed from
+        self.sizes = {}  # assignment id -> number of distinct fingerprints, for every indexed submission
+        self.synced_at = None
+        self._unindexed = set()  # hashed submissions whose text wasn't cached at the last sync
+        self._pending = {}  # assignment id -> fingerprints not merged yet
+        self._replaced = set()  # assignment ids whose merged fingerprints are out of date
+        self._lock = threading.Lock()
+
+    def add(self, assignment_id, content_hash, hashes):
+        unique = np.unique(hashes)
+        with self._lock:
+            previous = self.indexed.get(assignment_id)
+            if previous == content_hash:
+                return
+            if previous is not None:
+                self._replaced.add(assignment_id)
+            self.indexed[assignment_id] = content_hash
+            self.sizes[assignment_id] = len(unique)
+            self._pending[assignment_id] = unique
+
+    def _merge(self):
+        if not self._pending and not self._replaced:
+            return
+        hashes, assignment_ids = self.hashes, self.assignment_ids
+        if self._replaced:
+            keep = ~np.isin(assignment_ids, np.fromiter(self._replaced, dtype=np.int64))
+            hashes, assignment_ids = hashes[keep], assignment_ids[keep]
+        pending = list(self._pending.items())
+        hashes = np.concatenate([hashes] + [unique for _, unique in pending])
+        assignment_ids = np.concatenate(
+            [assignment_ids] + [np.full(len(unique), assignment_id, dtype=np.int64) for assignment_id, unique in pending]
+        )
+        order = np.argsort(hashes, kind='stable')
+        self.hashes, self.assignment_ids = hashes[order], assignment_ids[order]
+        self._pending = {}
+        self._replaced = set()
+
+    def sync(self):
+        """
+        Index the submissions hashed, or hashed again, since the last sync,
+        whatever their id: older submissions get their hash on demand, and
+        uploads are processed out of order. Submissions whose text isn't
+        cached are tried again next time.
+        """
+        started_at = timezone.now()
+        rows = St_Assignment.objects.exclude(content_hash='')
+        if self.synced_at is not None:
+            rows = rows.filter(Q(hashed_at__gte=self.synced_at - SYNC_OVERLAP) | Q(id__in=self._unindexed))
+        new_assignments = [
+            (assignment_id, content_hash)
+            for assignment_id, content_hash in rows.values_list('id', 'content_hash')
+            if self.indexed.get(assignment_id) != content_hash
+        ]
+        self.synced_at = started_at
+        if not new_assignments:
+            return
+        fingerprints = get_document_fingerprints([content_hash for _, content_hash in new_assignments])
+        for assignment_id, content_hash in new_assignments:
+            if content_hash in fingerprints:
+                self.add(assignment_id, content_hash, fingerprints[content_hash][0])
+                self._unindexed.discard(assignment_id)
+            else:
+                self._unindexed.add(assignment_id)
+
+    def shared_counts(self, hashes):
+        """
+        Count, for every indexed submission, how many of the given fingerprints it contains.
+
+        Returns:
+            dict: assignment id -> number of shared distinct fingerprints
+        """
+        with self._lock:
+            self._merge()
+            index_hashes, index_ids = self.hashes, self.assignment_ids
+
+        query = np.unique(hashes)
+        left = np.searchsorted(index_hashes, query, side='left')
+        right = np.searchsorted(index_hashes, query, side='right')
+        lengths = right - left
+        total = int(lengths.sum())
+        if not total:
+            return {}
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(total) - np.repeat(offsets, lengths) + np.repeat(left, lengths)
+
+        ids, counts = np.unique(index_ids[positions], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_fingerprint_index():
+    """
+    Return the process-wide fingerprint index, brought up to date with new submissions.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FingerprintIndex()
+        _index.sync()
+        return _index
+
+def matched_spans(hashes, positions, shared, k):
+    """
+    Merge the k-gram ranges of the shared fingerprints into [start, end) character spans.
+    """
+    starts = np.sort(positions[np.isin(hashes, shared)]).astype(np.int64)
+    spans = []
+    for start in starts.tolist():
+        end = start + k
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return spans
+
+def find_fingerprint_matches(assignment, limit=10, course_id=None, with_spans=True):
+    """
+    Find the submissions sharing the most fingerprints with a submission.
+
+    Args:
+        assignment: the St_Assignment to look up
+        limit: number of matches to return
+        course_id: only consider submissions of this course
+        with_spans: include the matched character spans of both documents
+
+    Returns:
+        list: dicts with the other submission, the shared fingerprint count,
+              the percentage of each document's fingerprints that are shared
+              and, optionally, the matched spans of the preprocessed texts
+    """
+    if not assignment.content_hash:
+        return []
+    fingerprints = get_document_fingerprints([assignment.content_hash])
+    if assignment.content_hash not in fingerprints:
+        return []
+    hashes, positions = fingerprints[assignment.content_hash]
+    own_size = len(np.unique(hashes))
+    if not own_size:
+        return []
+
+    index = get_fingerprint_index()
+    counts = index.shared_counts(hashes)
+    counts.pop(assignment.id, None)
+
+    others = St_Assignment.objects.filter(id__in=list(counts))
+    if course_id is not None:
+        others = others.filter(course_id=course_id)
+    others = {other.id: other for other in others}
+
+    ranked = sorted((i for i in counts if i in others), key=lambda i: counts[i], reverse=True)[:limit]
+    other_fingerprints = get_document_fingerprints([others[i].content_hash for i in ranked]) if with_spans else {}
+
+    k = settings.FINGERPRINT_KGRAM_SIZE
+    matches = []
+    for other_id in ranked:
+        other = others[other_id]
+        match = {
+            'assignment_id': other.id,
+            'assignment_title': other.title,
+            'shared_fingerprints': counts[other_id],
+            'percent_of_submission': round(counts[other_id] / own_size * 100, 2),
+            'percent_of_other': round(counts[other_id] / max(index.sizes.get(other_id, 1), 1) * 100, 2),
+        }
+        if with_spans and other.content_hash in other_fingerprints:
+            other_hashes, other_positions = other_fingerprints[other.content_hash]
+            shared = np.intersect1d(hashes, other_hashes)
+            match['spans'] = matched_spans(hashes, positions, shared, k)
+            match['other_spans'] = matched_spans(other_hashes, other_positions, shared, k)
+        matches.append(match)
+    return matches
@@ -0,0 +1,173 @@
+"""
+Highlighting of matched passages in report text.
+
+Every occurrence of every matched passage is found in one pass over the
+full text with an Aho-Corasick automaton, overlapping occurrences are
+merged, and paragraphs are rendered by walking the resulting offsets,
+instead of searching every paragraph for every matched passage.
+"""
+from collections import deque
+from xml.sax.saxutils import escape
+
+HIGHLIGHT_MARKUP = '<font color="red" backcolor="yellow">{}</font>'
+
+
+class PassageAutomaton:
+    """
+    Aho-Corasick automaton over a list of passages: a trie of their
+    characters with failure links, so a single scan of a text reports every
+    occurrence of every passage, overlapping ones included.
+    """
+
+    def __init__(self, passages):
+        self.lengths = [len(passage) for passage in passages]
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+        for idx, passage in enumerate(passages):
+            if not passage:
+                continue
+            node = 0
+            for char in passage:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                node = child
+            self.outputs[node].append(idx)
+
+        # Breadth first, so every failure link points at a finished node
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                fail[child] = state
+                # Passages ending at the longest proper suffix end here too
+                if outputs[state]:
+                    outputs[child] = outputs[child] + outputs[state]
+                queue.append(child)
+
+    def find_all(self, text):
+        """
+        Yield (start, end, passage index) for every occurrence, in order of end.
+        """
+        goto, fail, outputs, lengths = self.goto, self.fail, self.outputs, self.lengths
+        node = 0
+        for position, char in enumerate(text, start=1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for idx in outputs[node]:
+                yield position - lengths[idx], position, idx
+
+
+def merge_spans(spans):
+    """
+    Merge overlapping or touching spans.
+
+    Args:
+        spans: (start, end, label) tuples in any order
+
+    Returns:
+        list: (start, end, labels) tuples sorted by start, labels in order of first appearance
+    """
+    merged = []
+    for start, end, label in sorted(spans, key=lambda span: (span[0], span[1])):
+        if merged and start <= merged[-1][1]:
+            last_start, last_end, labels = merged[-1]
+            if label not in labels:
+                labels.append(label)
+            merged[-1] = (last_start, max(last_end, end), labels)
+        else:
+            merged.append((start, end, [label]))
+    return merged
+
+def locate_passages(text, passages, spans=None):
+    """
+    Find every occurrence of the given passages in a text. Passages that do
+    not occur literally, such as a quoted sentence with different spacing,
+    are looked up among the text's sentences by hash (see sentence_spans).
+
+    Args:
+        text (str): the full text
+        passages (dict): passage -> label
+        spans (SentenceSpans): the text's stored sentence spans, if any
+
+    Returns:
+        list: merged (start, end, labels) tuples sorted by start
+    """
+    passages = {passage: label for passage, label in passages.items() if passage}
+    labels = list(passages.values())
+
+    located = []
+    found = set()
+    for start, end, idx in PassageAutomaton(list(passages)).find_all(text):
+        located.append((start, end, labels[idx]))
+        found.add(idx)
+
+    if spans is not None:
+        for idx, passage in enumerate(passages):
+            if idx not in found:
+                span = spans.find(passage)
+                if span is not None:
+                    located.append((span[0], span[1], labels[idx]))
+    return merge_spans(located)
+
+def iter_paragraph_spans(text):
+    """
+    Yield the (start, end) offsets of each line-separated paragraph.
+    """
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end < 0:
+            yield start, len(text)
+            return
+        yield start, end
+        start = end + 1
+
+def iter_highlighted_paragraphs(text, highlights, markup=HIGHLIGHT_MARKUP):
+    """
+    Render a text paragraph by paragraph with the given spans highlighted.
+
+    Args:
+        text (str): the full text
+        highlights (list): merged (start, end, labels) tuples sorted by start, see merge_spans
+        markup (str): format string wrapped around highlighted text
+
+    Yields:
+        tuple: (escaped paragraph markup, labels of the spans in it),
+        or (None, []) for a blank paragraph
+    """
+    highlights = iter(highlights)
+    current = next(highlights, None)
+    for paragraph_start, paragraph_end in iter_paragraph_spans(text):
+        if not text[paragraph_start:paragraph_end].strip():
+            yield None, []
+            continue
+
+        parts, paragraph_labels = [], []
+        position = paragraph_start
+        while current is not None and current[0] < paragraph_end:
+            start, end, labels = current
+            start = max(start, position)
+            if start < end:
+                parts.append(escape(text[position:start]))
+                parts.append(markup.format(escape(text[start:min(end, paragraph_end)])))
+                paragraph_labels.extend(label for label in labels if label not in paragraph_labels)
+                position = min(end, paragraph_end)
+            if end > paragraph_end:
+                # Continues into the next paragraph
+                break
+            current = next(highlights, None)
+        parts.append(escape(text[position:paragraph_end]))
+        yield ''.join(parts), paragraph_labels
@@ -0,0 +1,367 @@
+"""
+A TF-IDF model shared by every comparison, built from the whole document
+corpus instead of being refitted on the two documents being compared.
+"""
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from sklearn.preprocessing import normalize
+
+from .models import DocumentText
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; updates are then only serialized per process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# TfidfVectorizer's default token pattern
+TOKEN_RE = re.compile(r'(?u)\b\w\w+\b')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class IDFModel:
+    """
+    Vocabulary and document frequencies of the DocumentText corpus, stored on
+    disk as:
+
+    - vocabulary.txt: one term per line, its line number being its column.
+      Terms are only ever appended, so stored term counts stay valid as the
+      corpus grows
+    - df.npy: the number of documents containing each term
+    - idf.npy: the smoothed idf of each term, memory-mapped on load
+    - meta.json: the term and document counts, the last DocumentText id
+      counted, when the vocabulary was started and the document count its
+      current generation started at; written last, so a partly written
+      update is never loaded
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.terms = []
+        self.vocabulary = {}
+        self.df = np.empty(0, dtype=np.int64)
+        self.idf = np.empty(0, dtype=np.float64)
+        self.n_documents = 0
+        self.last_document_id = 0
+        self.built_at = int(time.time())
+        self.generation_documents = 0
+        self._saved_terms = 0
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open the model stored in a directory, or an empty one if there is none yet.
+        """
+        model = cls(directory)
+        try:
+            with open(model._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(os.path.join(directory, 'vocabulary.txt'), 'r', encoding='utf-8') as f:
+                terms = [line.rstrip('\n') for _, line in zip(range(meta['terms']), f)]
+            if len(terms) != meta['terms']:
+                raise ValueError("Vocabulary file is shorter than recorded")
+            model.df = np.load(os.path.join(directory, 'df.npy'), mmap_mode='r')
+            model.idf = np.load(os.path.join(directory, 'idf.npy'), mmap_mode='r')
+            model.terms = terms
+            model.n_documents = meta['documents']
+            model.last_document_id = meta['last_document_id']
+            model.built_at = meta.get('built_at', 0)
+            model.generation_documents = meta.get('generation_documents', meta['documents'])
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(model._meta_path):
+                logger.error(f"Could not load IDF model, starting empty: {e}")
+            return cls(directory)
+        model.vocabulary = {term: index for index, term in enumerate(model.terms)}
+        model._saved_terms = len(model.terms)
+        return model
+
+    def add_document(self, text):
+        """
+        Count a document's distinct terms, appending unseen ones to the vocabulary.
+        Changes are kept in memory until save().
+        """
+        indices = []
+        for term in set(tokenize(text)):
+            index = self.vocabulary.get(term)
+            if index is None:
+                index = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            indices.append(index)
+
+        if len(self.df) < len(self.terms):
+            self.df = np.concatenate([self.df, np.zeros(len(self.terms) - len(self.df), dtype=np.int64)])
+        elif not self.df.flags.writeable:
+            self.df = np.array(self.df)
+        if indices:
+            self.df[np.array(indices)] += 1
+        self.n_documents += 1
+
+    def save(self):
+        """
+        Append new terms to the vocabulary and rewrite the frequency arrays and metadata.
+        """
+        self.df = np.asarray(self.df)
+        self.idf = np.log((1 + self.n_documents) / (1 + self.df)) + 1
+        if self.n_documents > self.generation_documents * (1 + settings.IDF_GENERATION_DRIFT):
+            self.generation_documents = self.n_documents
+
+        os.makedirs(self.directory, exist_ok=True)
+        vocabulary_path = os.path.join(self.directory, 'vocabulary.txt')
+        if self._saved_terms == 0:
+            # Truncate whatever a previous model left behind
+            open(vocabulary_path, 'w', encoding='utf-8').close()
+        with open(vocabulary_path, 'a', encoding='utf-8') as f:
+            f.writelines(f'{term}\n' for term in self.terms[self._saved_terms:])
+
+        for name, array in (('df.npy', self.df), ('idf.npy', self.idf)):
+            tmp_path = os.path.join(self.directory, f'{name}.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+
+        tmp_path = f'{self._meta_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'terms': len(self.terms),
+                'documents': self.n_documents,
+                'last_document_id': self.last_document_id,
+                'built_at': self.built_at,
+                'generation_documents': self.generation_documents
+            }, f)
+        os.replace(tmp_path, self._meta_path)
+        self._saved_terms = len(self.terms)
+
+    @property
+    def generation(self):
+        # Changes on every rebuild, and once the corpus has grown by
+        # IDF_GENERATION_DRIFT since the generation started; smaller updates
+        # barely move the idf weights, so scores stored under them are kept
+        return f'{self.built_at}-{self.generation_documents}'
+
+    @property
+    def unknown_idf(self):
+        # The idf a term would get if it were in no document of the corpus
+        return float(np.log(1 + self.n_documents) + 1)
+
+    def term_counts(self, text, extra_terms=None):
+        """
+        Count the terms of a text.
+
+        Args:
+            text: the text to count
+            extra_terms: terms outside the vocabulary are left out, unless this
+                dict is given: it assigns them columns after the vocabulary and
+                can be shared between calls so both sides of a comparison agree
+
+        Returns:
+            tuple: (sorted term columns as int32, counts as float32)
+        """
+        columns = {}
+        for term, count in Counter(tokenize(text)).items():
+            index = self.vocabulary.get(term)
+            if index is None:
+                if extra_terms is None:
+                    continue
+                index = extra_terms.setdefault(term, len(self.terms) + len(extra_terms))
+            columns[index] = count
+
+        indices = np.fromiter(columns, dtype=np.int32, count=len(columns))
+        counts = np.fromiter(columns.values(), dtype=np.float32, count=len(columns))
+        order = np.argsort(indices)
+        return indices[order], counts[order]
+
+    def weights(self, indices):
+        """
+        The idf of each column; columns beyond the vocabulary get the unknown-term idf.
+        """
+        weights = np.full(len(indices), self.unknown_idf)
+        known = indices < len(self.idf)
+        weights[known] = self.idf[indices[known]]
+        return weights
+
+    def similarity(self, counts1, counts2):
+        """
+        Cosine similarity of the TF-IDF vectors of two term counts, as a
+        sparse dot product over the terms they share.
+
+        Returns:
+            float: similarity between 0.0 and 1.0
+        """
+        (indices1, values1), (indices2, values2) = counts1, counts2
+        weighted1 = values1 * self.weights(indices1)
+        weighted2 = values2 * self.weights(indices2)
+        norm = np.linalg.norm(weighted1) * np.linalg.norm(weighted2)
+        if not norm:
+            return 0.0
+        _, shared1, shared2 = np.intersect1d(indices1, indices2, assume_unique=True, return_indices=True)
+        return float(min(np.dot(weighted1[shared1], weighted2[shared2]) / norm, 1.0))
+
+    def matrix(self, counts_list):
+        """
+        Stack term counts into an L2-normalised TF-IDF matrix, so the cosine
+        similarity of every pair of rows comes out of one sparse product.
+
+        Returns:
+            scipy.sparse.csr_matrix: one row per entry of counts_list
+        """
+        indptr = np.zeros(len(counts_list) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(indices) for indices, _ in counts_list])
+        indices = np.concatenate([np.empty(0, dtype=np.int32)] + [indices for indices, _ in counts_list])
+        values = np.concatenate([np.empty(0, dtype=np.float32)] + [counts for _, counts in counts_list])
+        n_columns = max(len(self.terms), int(indices.max()) + 1 if len(indices) else 0)
+
+        matrix = sp.csr_matrix((values * self.weights(indices), indices, indptr),
+                               shape=(len(counts_list), n_columns))
+        return normalize(matrix)
+
+_model = None
+_model_mtime = None
+_model_lock = threading.Lock()
+
+
+def get_idf_model():
+    """
+    Return the on-disk IDF model, reloading it when another process has updated it.
+    """
+    global _model, _model_mtime
+    directory = settings.IDF_MODEL_DIR
+    try:
+        mtime = os.path.getmtime(os.path.join(directory, 'meta.json'))
+    except OSError:
+        mtime = None
+
+    with _model_lock:
+        if _model is None or mtime != _model_mtime:
+            _model = IDFModel.load(directory)
+            _model_mtime = mtime
+        return _model
+
+@contextmanager
+def _update_lock(directory):
+    """
+    Hold the model's update lock: the in-process lock, and an exclusive lock
+    on a file in the model directory, so the web processes and the similarity
+    workers never append to the vocabulary at the same time.
+    """
+    with _model_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'update.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def update_idf_model(rebuild=False):
+    """
+    Count every DocumentText added since the last update into the IDF model.
+    A rebuild starts from an empty vocabulary, and stored term counts, whose
+    columns refer to the old one, are cleared. The model is read back from
+    disk under a lock shared by all processes, so updates never interleave.
+
+    Returns:
+        dict: the number of documents added and the model's size
+    """
+    global _model, _model_mtime
+    directory = settings.IDF_MODEL_DIR
+    with _update_lock(directory):
+        model = IDFModel(directory) if rebuild else IDFModel.load(directory)
+        if not model.terms:
+            # Columns of counts stored under a previous vocabulary mean nothing now
+            DocumentText.objects.exclude(term_counts=None).update(term_counts=None)
+
+        added = 0
+        documents = DocumentText.objects.filter(id__gt=model.last_document_id).order_by('id')
+        for document_id, preprocessed_text in documents.values_list('id', 'preprocessed_text').iterator():
+            model.add_document(preprocessed_text)
+            model.last_document_id = document_id
+            added += 1
+
+        if added or rebuild:
+            model.save()
+            logger.info(f"Added {added} documents to the IDF model ({len(model.terms)} terms)")
+        _model = model
+        try:
+            _model_mtime = os.path.getmtime(os.path.join(directory, 'meta.json'))
+        except OSError:
+            _model_mtime = None
+
+    return {'added': added, 'documents': model.n_documents, 'terms': len(model.terms)}
+
+def serialize_counts(indices, counts):
+    buffer = io.BytesIO()
+    np.savez(buffer, indices=indices, counts=counts)
+    return buffer.getvalue()
+
+def deserialize_counts(blob):
+    arrays = np.load(io.BytesIO(blob))
+    return arrays['indices'], arrays['counts']
+
+def get_document_counts(content_hashes):
+    """
+    Return the stored term counts of cached documents, computing and storing
+    any that are missing. Documents not in the text cache are left out.
+
+    Returns:
+        dict: content hash -> (term columns, counts)
+    """
+    counts = {}
+    missing = []
+    for document_id, content_hash, blob in DocumentText.objects.filter(
+            content_hash__in=set(content_hashes)).values_list('id', 'content_hash', 'term_counts'):
+        if blob:
+            counts[content_hash] = deserialize_counts(bytes(blob))
+        else:
+            missing.append((document_id, content_hash))
+
+    if missing:
+        model = get_idf_model()
+        # Count documents with the vocabulary that includes them
+        if max(document_id for document_id, _ in missing) > model.last_document_id:
+            update_idf_model()
+            model = get_idf_model()
+        for document in DocumentText.objects.filter(id__in=[document_id for document_id, _ in missing]):
+            document_counts = model.term_counts(document.preprocessed_text)
+            DocumentText.objects.filter(id=document.id).update(term_counts=serialize_counts(*document_counts))
+            counts[document.content_hash] = document_counts
+    return counts
+
+def text_similarity(text1, text2, counts1=None, counts2=None):
+    """
+    TF-IDF cosine similarity of two texts under the shared corpus model.
+    Stored term counts (see get_document_counts) can be passed to skip
+    tokenizing a side; terms of either text outside the vocabulary are
+    compared too.
+
+    Returns:
+        float: similarity between 0.0 and 1.0
+    """
+    model = get_idf_model()
+    extra_terms = {}
+    if counts1 is None:
+        counts1 = model.term_counts(text1, extra_terms)
+    if counts2 is None:
+        counts2 = model.term_counts(text2, extra_terms)
+    return model.similarity(counts1, counts2)
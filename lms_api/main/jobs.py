@@ -0,0 +1,208 @@
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .comparison import (
+    check_assignment_web_similarity,
+    ensure_content_hashes,
+    iter_pair_results,
+    iter_pairwise_results,
+    purge_stale_comparisons,
+)
+from .idf_model import get_idf_model
+from .minhash import find_candidate_pairs
+from .models import SimilarityJob, St_Assignment
+from .preprocessing import preprocess_assignment
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(kind, params):
+    """
+    Queue a similarity job for the worker and return it.
+    """
+    job = SimilarityJob.objects.create(kind=kind, params=params)
+    logger.info(f"Queued {kind} job {job.id}")
+    return job
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to 'running' and return it,
+    or None if the queue is empty. Safe with several workers on one database.
+    Upload preprocessing goes first, so new submissions are ready to compare.
+    """
+    while True:
+        job = SimilarityJob.objects.filter(status=SimilarityJob.STATUS_QUEUED).order_by(
+            Case(When(kind=SimilarityJob.KIND_PREPROCESS, then=0), default=1), 'id'
+        ).first()
+        if job is None:
+            return None
+
+        claimed = SimilarityJob.objects.filter(id=job.id, status=SimilarityJob.STATUS_QUEUED).update(
+            status=SimilarityJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            heartbeat_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # Another worker took it first, try the next one
+
+def reclaim_stale_jobs():
+    """
+    Queue again the jobs left 'running' by a worker that died, or fail them
+    once they have used up their attempts. A job is taken to be abandoned when
+    its worker has not reported progress on it for SIMILARITY_JOB_TIMEOUT.
+
+    Returns:
+        tuple: (number of jobs queued again, number failed)
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.SIMILARITY_JOB_TIMEOUT)
+    stale = SimilarityJob.objects.filter(status=SimilarityJob.STATUS_RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at=None, started_at__lt=cutoff)
+    )
+    failed = stale.filter(attempts__gte=settings.SIMILARITY_JOB_MAX_ATTEMPTS).update(
+        status=SimilarityJob.STATUS_FAILED,
+        error=f"Worker stopped before the job finished ({settings.SIMILARITY_JOB_MAX_ATTEMPTS} attempts)",
+        finished_at=timezone.now()
+    )
+    requeued = stale.update(status=SimilarityJob.STATUS_QUEUED, started_at=None, heartbeat_at=None, progress=0)
+    if requeued or failed:
+        logger.warning(f"Reclaimed stale jobs: {requeued} queued again, {failed} failed")
+    return requeued, failed
+
+# Minimum seconds between saves of a running job's partial results
+PARTIAL_RESULT_INTERVAL = 2.0
+
+
+def update_progress(job, done, total, partial_result=None):
+    """
+    Record how many steps of a running job have finished, and optionally
+    the results gathered so far. Also the job's heartbeat, see reclaim_stale_jobs.
+    """
+    job.progress = done
+    job.total = total
+    job.heartbeat_at = timezone.now()
+    fields = {'progress': done, 'total': total, 'heartbeat_at': job.heartbeat_at}
+    if partial_result is not None:
+        job.result = partial_result
+        fields['result'] = partial_result
+    SimilarityJob.objects.filter(id=job.id).update(**fields)
+
+def collect_results(job, results_iter, total, summary=None):
+    """
+    Gather a job's pair results, publishing them as they arrive.
+    """
+    summary = summary or {}
+    update_progress(job, 0, total, {**summary, 'results': []} if summary else None)
+
+    # Results stream back in order of completion; publish them as they arrive
+    results = []
+    last_saved = time.monotonic()
+    for result in results_iter:
+        results.append(result)
+        if time.monotonic() - last_saved >= PARTIAL_RESULT_INTERVAL:
+            update_progress(job, len(results), total, {**summary, 'results': results})
+            last_saved = time.monotonic()
+        else:
+            update_progress(job, len(results), total)
+
+    return {**summary, 'results': results}
+
+def run_compare_job(job):
+    assignment_ids = job.params.get('assignment_ids', [])
+    assignments = list(St_Assignment.objects.filter(id__in=assignment_ids))
+    total = len(assignments) * (len(assignments) - 1) // 2
+    return collect_results(job, iter_pairwise_results(assignments), total)
+
+def run_suspicious_job(job):
+    """
+    Narrow the pairs of the given assignments down to MinHash/LSH candidates
+    and run the sentence-level analysis on those only.
+    """
+    assignments = list(St_Assignment.objects.filter(id__in=job.params.get('assignment_ids', [])))
+    ensure_content_hashes(assignments)
+    candidates = find_candidate_pairs(assignments, job.params.get('threshold'))
+    estimates = {(assignment1.id, assignment2.id): estimate for assignment1, assignment2, estimate in candidates}
+    logger.info(f"Job {job.id}: {len(candidates)} candidate pairs out of "
+                f"{len(assignments) * (len(assignments) - 1) // 2}")
+
+    def results_iter():
+        for result in iter_pair_results([(assignment1, assignment2) for assignment1, assignment2, _ in candidates]):
+            result['estimated_jaccard'] = round(estimates[(result['assignment1_id'], result['assignment2_id'])], 4)
+            yield result
+
+    summary = {
+        'total_pairs': len(assignments) * (len(assignments) - 1) // 2,
+        'candidate_pairs': len(candidates)
+    }
+    return collect_results(job, results_iter(), len(candidates), summary)
+
+def run_web_job(job):
+    assignment = St_Assignment.objects.get(id=job.params['assignment_id'])
+
+    update_progress(job, 0, 1)
+    result = check_assignment_web_similarity(assignment)
+    update_progress(job, 1, 1)
+    return result
+
+def run_preprocess_job(job):
+    assignment = St_Assignment.objects.get(id=job.params['assignment_id'])
+    result = preprocess_assignment(assignment, progress=lambda done, total: update_progress(job, done, total))
+    if result['processing_status'] == St_Assignment.PROCESSING_FAILED:
+        raise RuntimeError(assignment.processing_error)
+    return result
+
+JOB_HANDLERS = {
+    SimilarityJob.KIND_COMPARE: run_compare_job,
+    SimilarityJob.KIND_WEB: run_web_job,
+    SimilarityJob.KIND_SUSPICIOUS: run_suspicious_job,
+    SimilarityJob.KIND_PREPROCESS: run_preprocess_job,
+}
+
+def run_job(job):
+    """
+    Run a claimed job and store its result or error.
+    """
+    logger.info(f"Running {job.kind} job {job.id}")
+    try:
+        handler = JOB_HANDLERS[job.kind]
+        job.result = handler(job)
+        job.status = SimilarityJob.STATUS_COMPLETED
+    except Exception as e:
+        logger.exception(f"Job {job.id} failed: {e}")
+        job.error = str(e)
+        job.status = SimilarityJob.STATUS_FAILED
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+    logger.info(f"Job {job.id} finished with status {job.status}")
+    return job
+
+def run_worker(poll_interval=2.0, once=False):
+    """
+    Process queued jobs until stopped. With once=True, drain the queue and return.
+    Jobs left running by a dead worker are reclaimed at start and while idle.
+    """
+    logger.info("Similarity worker started")
+    # Results of an older algorithm version are never reused; drop them
+    purge_stale_comparisons()
+    get_idf_model()
+    reclaim_stale_jobs()
+    while True:
+        close_old_connections()
+        job = claim_next_job()
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            return
+        # Jobs of other workers that died while this one was idle
+        reclaim_stale_jobs()
+        time.sleep(poll_interval)
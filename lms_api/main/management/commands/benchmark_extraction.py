@@ -0,0 +1,116 @@
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.core.management.base import BaseCommand
+
+from main.extractors import extract_with_registry, extract_with_textract, file_extension
+
+from .benchmark_sentence_matching import make_sentence, make_vocabulary
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def write_txt(path, paragraphs):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(paragraphs))
+
+def write_docx(path, paragraphs):
+    body = ''.join(f'<w:p><w:r><w:t>{escape(paragraph)}</w:t></w:r></w:p>' for paragraph in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', DOCX_RELS)
+        archive.writestr('word/document.xml', document)
+
+def write_pdf(path, paragraphs):
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    style = getSampleStyleSheet()['Normal']
+    SimpleDocTemplate(path).build([Paragraph(escape(paragraph), style) for paragraph in paragraphs])
+
+WRITERS = {'txt': write_txt, 'docx': write_docx, 'pdf': write_pdf}
+
+
+def measure(func, file_path, repeat):
+    """
+    Median latency and peak Python heap of extracting a file.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_path)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(file_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the native txt/docx/pdf extractors against textract, "
+            "per format, for latency and memory")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paragraphs', type=int, default=200,
+                            help='Paragraphs per synthetic document (default 200)')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--files', nargs='*', default=[],
+                            help='Benchmark these files instead of synthetic documents')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            files = options['files']
+            if not files:
+                rng = random.Random(options['seed'])
+                vocabulary = make_vocabulary(rng)
+                cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+                paragraphs = [
+                    ' '.join(make_sentence(rng, vocabulary, cum_weights) for _ in range(5))
+                    for _ in range(options['paragraphs'])
+                ]
+                for extension, write in WRITERS.items():
+                    file_path = os.path.join(directory, f'sample.{extension}')
+                    write(file_path, paragraphs)
+                    files.append(file_path)
+
+            self.stdout.write("  note: textract's converter subprocesses are not counted in its peak memory")
+            for file_path in files:
+                size = os.path.getsize(file_path)
+                textract_time, textract_peak = measure(extract_with_textract, file_path, options['repeat'])
+                native_time, native_peak = measure(extract_with_registry, file_path, options['repeat'])
+                _, extractor = extract_with_registry(file_path)
+
+                self.stdout.write(f"{file_extension(file_path):>5} ({size / 1024:.0f} KB, {extractor})")
+                self.stdout.write(f"       textract: {textract_time * 1000:8.1f} ms, peak {textract_peak / 1024:8.0f} KB")
+                self.stdout.write(f"       native:   {native_time * 1000:8.1f} ms, peak {native_peak / 1024:8.0f} KB, "
+                                  f"{textract_time / max(native_time, 1e-9):.1f}x faster")
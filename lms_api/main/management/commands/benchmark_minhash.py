@@ -0,0 +1,93 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.fingerprints import compute_fingerprints
+from main.minhash import find_candidates
+from main.utils import analyze_texts, preprocess_text
+
+from .benchmark_sentence_matching import make_sentence, make_vocabulary, perturb
+
+
+def make_corpus(rng, count, sentences, derived, vocabulary, cum_weights, prompt_sentences=0):
+    """
+    Synthetic submissions; a `derived` fraction copies (and perturbs) part of an earlier one.
+    Every submission starts with the same `prompt_sentences` sentences, like a restated assignment prompt.
+    """
+    prompt = [make_sentence(rng, vocabulary, cum_weights) for _ in range(prompt_sentences)]
+    documents = []
+    for index in range(count):
+        text = [make_sentence(rng, vocabulary, cum_weights) for _ in range(sentences)]
+        if documents and rng.random() < derived:
+            source = rng.choice(documents)
+            copied = rng.sample(source, int(sentences * rng.choice([0.1, 0.2, 0.3, 0.5, 0.8])))
+            text[:len(copied)] = [perturb(rng, s, vocabulary, rng.choice([0, 0.1, 0.2])) for s in copied]
+            rng.shuffle(text)
+        documents.append(text)
+    return [' '.join(prompt + text) for text in documents]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark MinHash/LSH candidate selection against analysing every pair "
+            "of a synthetic class of submissions")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=60,
+                            help='Synthetic submissions (default 60)')
+        parser.add_argument('--sentences', type=int, default=60,
+                            help='Sentences per submission (default 60)')
+        parser.add_argument('--derived', type=float, default=0.3,
+                            help='Fraction of submissions copying part of another')
+        parser.add_argument('--prompt-sentences', type=int, default=10,
+                            help='Sentences of a prompt every submission shares (default 10)')
+        parser.add_argument('--min-matches', type=int, default=3,
+                            help='Matched sentences that make a pair suspicious in the full analysis')
+        parser.add_argument('--threshold', type=float, help='Estimated Jaccard threshold (default from settings)')
+        parser.add_argument('--bands', type=int, help='LSH bands (default from settings)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def analyse(self, texts, preprocessed, pairs):
+        suspicious = set()
+        for i, j in pairs:
+            analysis = analyze_texts(f'{i}.txt', f'{j}.txt', texts[i], preprocessed[i], texts[j], preprocessed[j])
+            # Sentences of the shared prompt match in every pair
+            if len(analysis.similar_sentences) >= self.min_matches + self.prompt_sentences:
+                suspicious.add((i, j))
+        return suspicious
+
+    def handle(self, *args, **options):
+        self.min_matches = options['min_matches']
+        self.prompt_sentences = options['prompt_sentences']
+        rng = random.Random(options['seed'])
+        vocabulary = make_vocabulary(rng)
+        cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+        texts = make_corpus(rng, options['documents'], options['sentences'], options['derived'],
+                            vocabulary, cum_weights, options['prompt_sentences'])
+        preprocessed = [preprocess_text(text) for text in texts]
+        all_pairs = list(itertools.combinations(range(len(texts)), 2))
+        self.stdout.write(f"{len(texts)} submissions, {len(all_pairs)} pairs")
+
+        start = time.perf_counter()
+        expected = self.analyse(texts, preprocessed, all_pairs)
+        brute_force_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fingerprints = {i: compute_fingerprints(text)[0] for i, text in enumerate(preprocessed)}
+        candidates = find_candidates(fingerprints, options['threshold'], bands=options['bands'])
+        candidate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = self.analyse(texts, preprocessed, [(i, j) for i, j, _ in candidates])
+        analysis_time = time.perf_counter() - start
+
+        lsh_time = candidate_time + analysis_time
+        recall = len(found & expected) / len(expected) if expected else 1.0
+
+        self.stdout.write(f"All pairs:  {brute_force_time:.3f}s, {len(all_pairs)} analysed, "
+                          f"{len(expected)} suspicious ({len(all_pairs) / brute_force_time:.0f} pairs/s)")
+        self.stdout.write(f"MinHash:    {lsh_time:.3f}s ({candidate_time:.3f}s signatures and LSH), "
+                          f"{len(candidates)} candidates analysed, {len(found)} suspicious")
+        self.stdout.write(f"Speedup:    {brute_force_time / max(lsh_time, 1e-9):.1f}x")
+        self.stdout.write(f"Recall:     {recall:.4f}")
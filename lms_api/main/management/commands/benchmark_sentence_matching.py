@@ -0,0 +1,111 @@
+import itertools
+import random
+import time
+from difflib import SequenceMatcher
+
+from django.core.management.base import BaseCommand
+
+from main.sentence_matching import match_sentences
+from main.utils import extract_text_from_file
+
+
+# English letter frequencies, so synthetic words have realistic character statistics
+LETTER_WEIGHTS = {
+    'e': 12.7, 't': 9.1, 'a': 8.2, 'o': 7.5, 'i': 7.0, 'n': 6.7, 's': 6.3, 'h': 6.1,
+    'r': 6.0, 'd': 4.3, 'l': 4.0, 'c': 2.8, 'u': 2.8, 'm': 2.4, 'w': 2.4, 'f': 2.2,
+    'g': 2.0, 'y': 2.0, 'p': 1.9, 'b': 1.5, 'v': 1.0, 'k': 0.8, 'j': 0.2, 'x': 0.2,
+    'q': 0.1, 'z': 0.1,
+}
+
+def make_vocabulary(rng, size=5000):
+    letters = list(LETTER_WEIGHTS)
+    weights = list(LETTER_WEIGHTS.values())
+    return [
+        ''.join(rng.choices(letters, weights=weights, k=rng.randint(2, 11)))
+        for _ in range(size)
+    ]
+
+def make_sentence(rng, vocabulary, cum_weights):
+    # Zipf-distributed word choice so common words repeat the way they do in prose
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(6, 30))
+    return ' '.join(words).capitalize() + '.'
+
+def perturb(rng, sentence, vocabulary, rate):
+    words = []
+    for word in sentence.split():
+        roll = rng.random()
+        if roll < rate / 3:
+            continue
+        elif roll < 2 * rate / 3:
+            words.append(rng.choice(vocabulary))
+        elif roll < rate:
+            words.extend([word, rng.choice(vocabulary)])
+        else:
+            words.append(word)
+    return ' '.join(words) or sentence
+
+def original_loop(sentences1, sentences2, threshold):
+    """The all-pairs loop find_similar_sentences used before the index."""
+    matches = []
+    for i, s1 in enumerate(sentences1):
+        for j, s2 in enumerate(sentences2):
+            ratio = SequenceMatcher(None, s1, s2).ratio()
+            if ratio >= threshold:
+                matches.append((i, j, ratio))
+    return matches
+
+def split_sentences(text):
+    return [s.strip() for s in text.replace('\n', ' ').split('. ') if len(s.split()) >= 3]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the indexed sentence matcher against the all-pairs "
+            "SequenceMatcher loop on two long documents")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sentences', type=int, default=300,
+                            help='Sentences per synthetic document (default 300)')
+        parser.add_argument('--copied', type=float, default=0.3,
+                            help='Fraction of document 2 derived from document 1')
+        parser.add_argument('--threshold', type=float, default=0.6)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--file1', help='Use a real document instead of synthetic text')
+        parser.add_argument('--file2', help='Use a real document instead of synthetic text')
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+
+        if options['file1'] and options['file2']:
+            sentences1 = split_sentences(extract_text_from_file(options['file1']))
+            sentences2 = split_sentences(extract_text_from_file(options['file2']))
+        else:
+            rng = random.Random(options['seed'])
+            vocabulary = make_vocabulary(rng)
+            cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+            count = options['sentences']
+            sentences1 = [make_sentence(rng, vocabulary, cum_weights) for _ in range(count)]
+            copied = int(count * options['copied'])
+            sentences2 = [perturb(rng, s, vocabulary, rng.choice([0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6]))
+                          for s in rng.sample(sentences1, copied)]
+            sentences2 += [make_sentence(rng, vocabulary, cum_weights) for _ in range(count - copied)]
+            rng.shuffle(sentences2)
+
+        self.stdout.write(f"Document 1: {len(sentences1)} sentences, "
+                          f"document 2: {len(sentences2)} sentences, threshold {threshold}")
+
+        start = time.perf_counter()
+        indexed = match_sentences(sentences1, sentences2, threshold)
+        indexed_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exhaustive = original_loop(sentences1, sentences2, threshold)
+        exhaustive_time = time.perf_counter() - start
+
+        found = {(i, j) for i, j, _ in indexed}
+        expected = {(i, j) for i, j, _ in exhaustive}
+        recall = len(found & expected) / len(expected) if expected else 1.0
+
+        self.stdout.write(f"All-pairs:  {exhaustive_time:.3f}s, {len(exhaustive)} matches")
+        self.stdout.write(f"Indexed:    {indexed_time:.3f}s, {len(indexed)} matches")
+        self.stdout.write(f"Speedup:    {exhaustive_time / max(indexed_time, 1e-9):.1f}x")
+        self.stdout.write(f"Recall:     {recall:.4f}")
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.corpus_index import update_corpus_index
+
+
+class Command(BaseCommand):
+    help = "Build or incrementally update the local reference corpus index used by the web similarity check"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the existing index and index every document again')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = update_corpus_index(rebuild=options['rebuild'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Indexed {stats['sources']} sources in {elapsed:.2f}s "
+            f"(added {stats['added']}, updated {stats['updated']}, removed {stats['removed']}, "
+            f"unchanged {stats['unchanged']}, failed {stats['failed']})"
+        )
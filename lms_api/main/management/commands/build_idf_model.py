@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.idf_model import update_idf_model
+
+
+class Command(BaseCommand):
+    help = "Build or incrementally update the corpus-wide IDF model used by TF-IDF comparisons"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the existing vocabulary and count every document again')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = update_idf_model(rebuild=options['rebuild'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"IDF model has {stats['terms']} terms from {stats['documents']} documents "
+            f"(added {stats['added']}) in {elapsed:.2f}s"
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Process queued similarity jobs (assignment comparisons and web checks)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Process every queued job, then exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Waiting for similarity jobs...")
+        run_worker(poll_interval=options['poll_interval'], once=options['once'])
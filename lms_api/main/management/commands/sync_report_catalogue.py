@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.report_catalogue import sync_report_catalogue
+
+
+class Command(BaseCommand):
+    help = "Register existing similarity reports in the report catalogue and drop entries whose report is gone"
+
+    def handle(self, *args, **options):
+        stats = sync_report_catalogue()
+        self.stdout.write(f"Report catalogue synced (added {stats['added']}, removed {stats['removed']})")
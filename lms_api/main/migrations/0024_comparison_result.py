@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_similarity_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComparisonResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_filename', models.CharField(max_length=100, unique=True)),
+                ('file1_name', models.CharField(max_length=255)),
+                ('file2_name', models.CharField(max_length=255)),
+                ('similarity_score', models.FloatField()),
+                ('similar_sentences', models.JSONField(default=list)),
+                ('words1', models.PositiveIntegerField(default=0)),
+                ('words2', models.PositiveIntegerField(default=0)),
+                ('report_rendered_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('assignment1', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.st_assignment')),
+                ('assignment2', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.st_assignment')),
+            ],
+            options={
+                'verbose_name_plural': '11 . Comparison Results',
+            },
+        ),
+    ]
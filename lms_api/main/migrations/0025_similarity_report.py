@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_comparison_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('kind', models.CharField(choices=[('pairwise', 'Pairwise Comparison'), ('web', 'Web Similarity')], max_length=20)),
+                ('score', models.FloatField(blank=True, db_index=True, null=True)),
+                ('size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('assignment1', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.st_assignment')),
+                ('assignment2', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.st_assignment')),
+            ],
+            options={
+                'verbose_name_plural': '12 . Similarity Reports',
+                'indexes': [models.Index(fields=['kind', '-id'], name='report_kind_recent_idx')],
+                'unique_together': {('kind', 'filename')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_similarity_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comparisonresult',
+            name='algorithm_version',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='comparisonresult',
+            name='pair_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0026_comparison_pair_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='hashed_vector',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='st_assignment',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='submissions', to='main.course'),
+        ),
+        migrations.CreateModel(
+            name='PairSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('assignment1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.st_assignment')),
+                ('assignment2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.st_assignment')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.course')),
+            ],
+            options={
+                'verbose_name_plural': '13 . Pair Similarities',
+                'indexes': [models.Index(fields=['course', '-score'], name='pair_course_score_idx')],
+                'unique_together': {('assignment1', 'assignment2')},
+            },
+        ),
+    ]
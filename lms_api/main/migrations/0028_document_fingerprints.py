@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0027_class_similarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='fingerprints',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
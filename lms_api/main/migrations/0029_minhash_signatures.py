@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_document_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='minhash',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='similarityjob',
+            name='kind',
+            field=models.CharField(choices=[('compare', 'Compare Assignments'), ('web', 'Web Similarity'), ('suspicious', 'Find Suspicious Pairs')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0029_minhash_signatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='term_counts',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+def mark_processed_uploads_ready(apps, schema_editor):
+    # Uploads from before the pipeline had their text cached inline
+    St_Assignment = apps.get_model('main', 'St_Assignment')
+    St_Assignment.objects.exclude(content_hash='').update(processing_status='ready')
+
+    # Older ones never had it; queue them for the worker like a new upload
+    SimilarityJob = apps.get_model('main', 'SimilarityJob')
+    SimilarityJob.objects.bulk_create([
+        SimilarityJob(kind='preprocess', params={'assignment_id': assignment_id})
+        for assignment_id in St_Assignment.objects.filter(content_hash='').values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0030_document_term_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='st_assignment',
+            name='processing_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='st_assignment',
+            name='processing_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='similarityjob',
+            name='kind',
+            field=models.CharField(choices=[('compare', 'Compare Assignments'), ('web', 'Web Similarity'), ('suspicious', 'Find Suspicious Pairs'), ('preprocess', 'Preprocess Upload')], max_length=20),
+        ),
+        migrations.RunPython(mark_processed_uploads_ready, migrations.RunPython.noop),
+    ]
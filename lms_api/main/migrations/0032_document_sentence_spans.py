@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0031_assignment_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='sentence_spans',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0032_document_sentence_spans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comparisonresult',
+            name='idf_generation',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0033_comparison_idf_generation'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='documenttext',
+            name='hashed_vector',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_remove_hashed_vector'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='similarityreport',
+            name='report_kind_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='similarityreport',
+            index=models.Index(fields=['kind', '-created_at', '-id'], name='report_kind_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_report_created_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarityjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
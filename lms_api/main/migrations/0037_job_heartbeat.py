@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0036_job_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarityjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
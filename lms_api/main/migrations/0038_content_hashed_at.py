@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='hashed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='st_assignment',
+            name='hashed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,205 @@
+"""
+MinHash signatures and LSH banding over the winnowing fingerprint sets of
+submissions, to pick the pairs worth a full sentence-level comparison
+without scoring every pair.
+"""
+import logging
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from .fingerprints import get_document_fingerprints
+from .models import DocumentText
+
+logger = logging.getLogger(__name__)
+
+_MAX_HASH = np.iinfo(np.uint64).max
+
+
+def get_permutations(num_perm=None, seed=1):
+    """
+    The (a, b) parameters of the num_perm hash functions h(x) = a * x + b (mod 2**64).
+    """
+    num_perm = num_perm or settings.MINHASH_NUM_PERM
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MAX_HASH, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    b = rng.integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64, endpoint=True)
+    return a, b
+
+def compute_signature(hashes, permutations=None):
+    """
+    MinHash signature of a set of 64-bit hashes.
+
+    Returns:
+        numpy.ndarray: num_perm uint64 minima (all max for an empty set)
+    """
+    a, b = permutations or get_permutations()
+    hashes = np.unique(hashes)
+    if not len(hashes):
+        return np.full(len(a), _MAX_HASH, dtype=np.uint64)
+
+    with np.errstate(over='ignore'):
+        signature = np.full(len(a), _MAX_HASH, dtype=np.uint64)
+        # Process in chunks to bound the (num_perm x chunk) temporary
+        for start in range(0, len(hashes), 4096):
+            chunk = hashes[start:start + 4096]
+            signature = np.minimum(signature, (np.outer(a, chunk) + b[:, None]).min(axis=1))
+    return signature
+
+def estimate_jaccard(signature1, signature2):
+    return float(np.mean(signature1 == signature2))
+
+def get_document_signatures(content_hashes):
+    """
+    Return the stored MinHash signatures of cached documents, computing and
+    storing any that are missing. Documents not in the text cache are left out.
+
+    Returns:
+        dict: content hash -> signature
+    """
+    num_perm = settings.MINHASH_NUM_PERM
+    signatures = {}
+    missing = []
+    for content_hash, blob in DocumentText.objects.filter(content_hash__in=set(content_hashes)).values_list(
+            'content_hash', 'minhash'):
+        signature = np.frombuffer(bytes(blob), dtype=np.uint64) if blob else None
+        if signature is not None and len(signature) == num_perm:
+            signatures[content_hash] = signature
+        else:
+            missing.append(content_hash)
+
+    if missing:
+        permutations = get_permutations()
+        for content_hash, (hashes, _) in get_document_fingerprints(missing).items():
+            signature = compute_signature(hashes, permutations)
+            DocumentText.objects.filter(content_hash=content_hash).update(minhash=signature.tobytes())
+            signatures[content_hash] = signature
+    return signatures
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures: two items
+    become candidates if all rows of at least one band agree.
+    """
+
+    def __init__(self, bands=None, num_perm=None):
+        self.num_perm = num_perm or settings.MINHASH_NUM_PERM
+        self.bands = bands or settings.MINHASH_BANDS
+        self.rows = self.num_perm // self.bands
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band in range(self.bands):
+            band_values = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            self.buckets[(band, band_values)].append(key)
+
+    def candidate_pairs(self, threshold=None, max_bucket_size=None):
+        """
+        Return the candidate pairs whose estimated Jaccard similarity is at least threshold.
+        Buckets holding more than max_bucket_size items are skipped: they come
+        from text nearly everyone shares, and would make every pair a candidate.
+
+        Returns:
+            list: (key1, key2, estimated Jaccard) tuples, most similar first
+        """
+        threshold = settings.MINHASH_JACCARD_THRESHOLD if threshold is None else threshold
+        max_bucket_size = max_bucket_size or settings.MINHASH_MAX_BUCKET_SIZE
+        pairs = set()
+        skipped = 0
+        for keys in self.buckets.values():
+            if len(keys) > max_bucket_size:
+                skipped += 1
+                continue
+            if len(keys) > 1:
+                for i in range(len(keys)):
+                    for j in range(i + 1, len(keys)):
+                        pairs.add((keys[i], keys[j]) if keys[i] < keys[j] else (keys[j], keys[i]))
+        if skipped:
+            logger.info(f"Skipped {skipped} LSH buckets of more than {max_bucket_size} items")
+
+        candidates = []
+        for key1, key2 in pairs:
+            estimate = estimate_jaccard(self.signatures[key1], self.signatures[key2])
+            if estimate >= threshold:
+                candidates.append((key1, key2, estimate))
+        return sorted(candidates, key=lambda candidate: candidate[2], reverse=True)
+
+def common_fingerprints(fingerprint_sets, max_fraction=None):
+    """
+    The fingerprints found in more than max_fraction of the given sets (and
+    in more than two): an assignment prompt, a template or a common reference
+    list, shared by the whole class rather than copied between two students.
+
+    Returns:
+        numpy.ndarray: the common fingerprint hashes, sorted
+    """
+    max_fraction = settings.MINHASH_COMMON_FRACTION if max_fraction is None else max_fraction
+    fingerprint_sets = [np.unique(hashes) for hashes in fingerprint_sets]
+    if not fingerprint_sets:
+        return np.empty(0, dtype=np.uint64)
+    values, counts = np.unique(np.concatenate(fingerprint_sets), return_counts=True)
+    return values[counts > max(2, max_fraction * len(fingerprint_sets))]
+
+def find_candidates(fingerprints, threshold=None, signatures=None, bands=None):
+    """
+    Band the MinHash signatures of fingerprint sets, without their common
+    fingerprints, and return the likely near-duplicate pairs.
+
+    Args:
+        fingerprints: dict key -> fingerprint hashes
+        threshold: estimated Jaccard threshold (default from settings)
+        signatures: optional dict key -> stored signature of the full set,
+            used for sets that have no common fingerprints
+        bands: LSH bands (default from settings)
+
+    Returns:
+        list: (key1, key2, estimated Jaccard) tuples, most similar first
+    """
+    common = common_fingerprints(fingerprints.values())
+    permutations = get_permutations()
+    index = LSHIndex(bands=bands)
+    for key, hashes in fingerprints.items():
+        signature = (signatures or {}).get(key)
+        if len(common):
+            distinctive = hashes[~np.isin(hashes, common)]
+            if len(distinctive) < len(hashes):
+                hashes, signature = distinctive, None
+        if not len(hashes):
+            # Nothing of its own to match on
+            continue
+        if signature is None:
+            signature = compute_signature(hashes, permutations)
+        index.add(key, signature)
+
+    if len(common):
+        logger.info(f"Left {len(common)} fingerprints shared by most submissions out of MinHash")
+    return index.candidate_pairs(threshold)
+
+def find_candidate_pairs(assignments, threshold=None):
+    """
+    Find the pairs of St_Assignment rows that are likely near-duplicates.
+
+    Returns:
+        list: (assignment1, assignment2, estimated Jaccard) tuples, most similar first
+    """
+    assignments = [assignment for assignment in assignments if assignment.content_hash]
+    content_hashes = [assignment.content_hash for assignment in assignments]
+    document_fingerprints = get_document_fingerprints(content_hashes)
+    document_signatures = get_document_signatures(content_hashes)
+
+    by_id = {}
+    fingerprints = {}
+    signatures = {}
+    for assignment in assignments:
+        if assignment.content_hash in document_fingerprints:
+            by_id[assignment.id] = assignment
+            fingerprints[assignment.id] = document_fingerprints[assignment.content_hash][0]
+            if assignment.content_hash in document_signatures:
+                signatures[assignment.id] = document_signatures[assignment.content_hash]
+
+    return [(by_id[id1], by_id[id2], estimate)
+            for id1, id2, estimate in find_candidates(fingerprints, threshold, signatures)]
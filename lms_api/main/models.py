@@ -1,5 +1,6 @@
 from django.db import models #this is create database structure
 from django.core.validators import FileExtensionValidator
+from django.utils import timezone
 import os
 
 # Lecturer Model
@@ -48,6 +49,8 @@ class Assignment(models.Model):
     file = models.FileField(upload_to='course_assignment/',
                             validators = [FileExtensionValidator(allowed_extensions=['txt', 'doc', 'docx', 'pdf'])])
     uploaded_at = models.DateTimeField(auto_now_add=True) 
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True) #SHA-256 of the file, links to DocumentText
+    hashed_at = models.DateTimeField(null=True, blank=True, db_index=True) #when content_hash was last set, see fingerprints
 
     class Meta :
         verbose_name_plural = "4 . Assignments"
@@ -63,10 +66,26 @@ class Assignment(models.Model):
 
 #Similarity Checker Assignment
 class St_Assignment(models.Model):
+    PROCESSING_QUEUED = 'queued'
+    PROCESSING_RUNNING = 'processing'
+    PROCESSING_READY = 'ready'
+    PROCESSING_FAILED = 'failed'
+    PROCESSING_CHOICES = [
+        (PROCESSING_QUEUED, 'Queued'),
+        (PROCESSING_RUNNING, 'Processing'),
+        (PROCESSING_READY, 'Ready'),
+        (PROCESSING_FAILED, 'Failed'),
+    ]
+
     title = models.CharField(max_length=200)
     file = models.FileField(upload_to = 'student_assignment/',
                             validators = [FileExtensionValidator(allowed_extensions=['txt', 'doc', 'docx', 'pdf'])])
     uploaded_At = models.DateTimeField(auto_now_add=True)#only can add auto_now_add to datetime fields
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True) #SHA-256 of the file, links to DocumentText
+    hashed_at = models.DateTimeField(null=True, blank=True, db_index=True) #when content_hash was last set, see fingerprints
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='submissions') #class the submission is compared within
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_CHOICES, default=PROCESSING_QUEUED) #text, fingerprints and vectors precomputed after upload, see preprocessing
+    processing_error = models.TextField(blank=True, default='')
 
     class Meta :
         verbose_name_plural = "5 .Similarity Checker Assignments"
@@ -106,6 +125,24 @@ class StudentCourseEnrollment(models.Model):
     class Meta:
         verbose_name_plural = "8. Enrolled Courses"
         unique_together = ('student', 'course')  
+
+
+#Extracted text cache, keyed by the SHA-256 of the uploaded file bytes
+class DocumentText(models.Model):
+    content_hash = models.CharField(max_length=64, unique=True)
+    raw_text = models.TextField()
+    preprocessed_text = models.TextField()
+    fingerprints = models.BinaryField(null=True, blank=True) #winnowed k-gram hashes and offsets, see fingerprints
+    minhash = models.BinaryField(null=True, blank=True) #MinHash signature of the fingerprint set, see minhash
+    term_counts = models.BinaryField(null=True, blank=True) #term columns and counts under the shared IDF model, see idf_model
+    sentence_spans = models.BinaryField(null=True, blank=True) #sentence offsets into raw_text, word counts and hashes, see sentence_spans
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta :
+        verbose_name_plural = "9 . Document Text Cache"
+
+    def __str__(self):
+        return self.content_hash
         
 
 #user Profile
@@ -113,4 +150,157 @@ class StudentCourseEnrollment(models.Model):
 
 
         
- 
\ No newline at end of file
+ 
+
+#Background similarity job, processed by the run_similarity_worker command
+class SimilarityJob(models.Model):
+    KIND_COMPARE = 'compare'
+    KIND_WEB = 'web'
+    KIND_SUSPICIOUS = 'suspicious'
+    KIND_PREPROCESS = 'preprocess'
+    KIND_CHOICES = [
+        (KIND_COMPARE, 'Compare Assignments'),
+        (KIND_WEB, 'Web Similarity'),
+        (KIND_SUSPICIOUS, 'Find Suspicious Pairs'),
+        (KIND_PREPROCESS, 'Preprocess Upload'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    params = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    progress = models.PositiveIntegerField(default=0) #finished steps out of total
+    total = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0) #times a worker claimed the job
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True) #last progress report of the worker running the job
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta :
+        verbose_name_plural = "10 . Similarity Jobs"
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'error': self.error or None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'status_url': f'/api/jobs/{self.id}/',
+            'result_url': f'/api/jobs/{self.id}/result/',
+        }
+
+
+#Structured result of comparing two documents; its PDF report is rendered on first request
+class ComparisonResult(models.Model):
+    report_filename = models.CharField(max_length=100, unique=True)
+    pair_key = models.CharField(max_length=64, unique=True, null=True, blank=True) #content address: both file hashes + algorithm version
+    algorithm_version = models.CharField(max_length=50, blank=True, default='', db_index=True)
+    idf_generation = models.CharField(max_length=50, blank=True, default='') #IDF model the score was computed under, see idf_model
+    assignment1 = models.ForeignKey(St_Assignment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    assignment2 = models.ForeignKey(St_Assignment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    file1_name = models.CharField(max_length=255)
+    file2_name = models.CharField(max_length=255)
+    similarity_score = models.FloatField() #cosine similarity, 0-1
+    similar_sentences = models.JSONField(default=list)
+    words1 = models.PositiveIntegerField(default=0)
+    words2 = models.PositiveIntegerField(default=0)
+    report_rendered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta :
+        verbose_name_plural = "11 . Comparison Results"
+
+    def __str__(self):
+        return f"{self.file1_name} vs {self.file2_name}"
+
+    @property
+    def similarity_percentage(self):
+        return round(self.similarity_score * 100, 2)
+
+
+#Catalogue of generated similarity reports, used to list and delete them without scanning directories
+class SimilarityReport(models.Model):
+    KIND_PAIRWISE = 'pairwise'
+    KIND_WEB = 'web'
+    KIND_CHOICES = [
+        (KIND_PAIRWISE, 'Pairwise Comparison'),
+        (KIND_WEB, 'Web Similarity'),
+    ]
+
+    filename = models.CharField(max_length=255)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    assignment1 = models.ForeignKey(St_Assignment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    assignment2 = models.ForeignKey(St_Assignment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    score = models.FloatField(null=True, blank=True, db_index=True) #similarity percentage
+    size = models.PositiveBigIntegerField(null=True, blank=True) #bytes, null until the PDF is rendered
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta :
+        verbose_name_plural = "12 . Similarity Reports"
+        unique_together = ('kind', 'filename')
+        indexes = [
+            models.Index(fields=['kind', '-created_at', '-id'], name='report_kind_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.filename
+
+    def to_dict(self):
+        if self.kind == self.KIND_WEB:
+            view_url = f'/api/web-reports/{self.filename}'
+            download_url = f'/api/download-web-report/{self.filename}'
+        else:
+            view_url = f'/api/reports/{self.filename}'
+            download_url = f'/api/download-report/{self.filename}'
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'kind': self.kind,
+            'assignment1_id': self.assignment1_id,
+            'assignment2_id': self.assignment2_id,
+            'score': self.score,
+            'size': self.size,
+            'created': self.created_at.timestamp(),
+            'view_url': view_url,
+            'download_url': download_url
+        }
+
+
+#Stored similarity of two submissions in the same course, one matrix cell per row
+class PairSimilarity(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    assignment1 = models.ForeignKey(St_Assignment, on_delete=models.CASCADE, related_name='+') #always the lower id
+    assignment2 = models.ForeignKey(St_Assignment, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField() #cosine similarity percentage
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta :
+        verbose_name_plural = "13 . Pair Similarities"
+        unique_together = ('assignment1', 'assignment2')
+        indexes = [
+            models.Index(fields=['course', '-score'], name='pair_course_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assignment1_id} vs {self.assignment2_id}: {self.score}%"
@@ -0,0 +1,53 @@
+"""
+Worker-process side of parallel pairwise comparison.
+
+Kept free of Django imports at module level so it can be loaded by freshly
+spawned worker processes before the app registry is ready.
+"""
+
+# Documents for this worker process:
+# assignment id -> (file name, raw text, preprocessed text, term counts or None, sentence spans or None)
+_documents = {}
+
+
+def init_worker(documents):
+    """
+    ProcessPoolExecutor initializer: set up Django and keep the batch texts,
+    so each pair task only has to carry two ids.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+    # Memory-map the shared IDF model once rather than on the first pair
+    from .idf_model import get_idf_model
+    get_idf_model()
+
+    _documents.clear()
+    _documents.update(documents)
+
+def compare_pair_task(assignment1_id, assignment2_id):
+    """
+    Analyze one pair. Returns the calculate_text_similarity result dict;
+    failures are reported in its 'error' key.
+    """
+    from .utils import calculate_text_similarity
+
+    try:
+        file1_name, text1, preprocessed_text1, counts1, spans1 = _documents[assignment1_id]
+        file2_name, text2, preprocessed_text2, counts2, spans2 = _documents[assignment2_id]
+    except KeyError as e:
+        return {
+            'similarity_score': 0,
+            'error': f'Document {e} could not be read',
+            'report_path': None,
+            'report_filename': None
+        }
+
+    return calculate_text_similarity(
+        file1_name, file2_name,
+        text1, preprocessed_text1, text2, preprocessed_text2,
+        counts1, counts2, spans1, spans2
+    )
@@ -0,0 +1,89 @@
+"""
+The upload pipeline: everything a submission's comparisons need, computed
+once in the background right after the file is saved.
+"""
+import logging
+
+from .class_similarity import update_class_similarity
+from .fingerprints import get_document_fingerprints
+from .idf_model import get_document_counts
+from .minhash import get_document_signatures
+from .sentence_spans import get_document_sentences
+from .models import St_Assignment
+from .utils import cache_assignment_text
+
+logger = logging.getLogger(__name__)
+
+
+def extract_step(assignment):
+    cache_assignment_text(assignment)
+
+def fingerprint_step(assignment):
+    get_document_fingerprints([assignment.content_hash])
+    get_document_signatures([assignment.content_hash])
+
+def segment_step(assignment):
+    get_document_sentences([assignment.content_hash])
+
+def vectorize_step(assignment):
+    get_document_counts([assignment.content_hash])
+
+def class_similarity_step(assignment):
+    update_class_similarity(assignment)
+
+# (name, function, required): a failed required step fails the submission's
+# processing; the others are logged, and computed again when first needed
+PREPROCESS_STEPS = [
+    ('extract', extract_step, True),
+    ('fingerprint', fingerprint_step, False),
+    ('segment', segment_step, False),
+    ('vectorize', vectorize_step, False),
+    ('class_similarity', class_similarity_step, False),
+]
+
+
+def set_processing_status(assignment, status, error=''):
+    assignment.processing_status = status
+    assignment.processing_error = error
+    St_Assignment.objects.filter(id=assignment.id).update(processing_status=status, processing_error=error)
+
+def preprocess_assignment(assignment, progress=None):
+    """
+    Extract, fingerprint, segment and vectorize an uploaded submission and
+    add it to its class similarity matrix, recording its processing status.
+
+    Args:
+        assignment: the St_Assignment to process
+        progress: optional callable(done, total) called after each step
+
+    Returns:
+        dict: processing status, completed steps and failed steps with their errors
+    """
+    set_processing_status(assignment, St_Assignment.PROCESSING_RUNNING)
+    completed, failed = [], {}
+
+    for done, (name, step, required) in enumerate(PREPROCESS_STEPS, start=1):
+        try:
+            step(assignment)
+            completed.append(name)
+        except Exception as e:
+            logger.exception(f"Preprocessing step {name} failed for assignment {assignment.id}: {e}")
+            failed[name] = str(e)
+            if required:
+                break
+        finally:
+            if progress is not None:
+                progress(done, len(PREPROCESS_STEPS))
+
+    required_failed = [name for name, _, required in PREPROCESS_STEPS if required and name in failed]
+    if required_failed:
+        set_processing_status(assignment, St_Assignment.PROCESSING_FAILED, failed[required_failed[0]])
+    else:
+        set_processing_status(assignment, St_Assignment.PROCESSING_READY)
+
+    return {
+        'assignment_id': assignment.id,
+        'processing_status': assignment.processing_status,
+        'completed_steps': completed,
+        'failed_steps': failed
+    }
@@ -0,0 +1,202 @@
+import datetime
+import logging
+import os
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ComparisonResult, SimilarityReport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_reports_dir(kind):
+    if kind == SimilarityReport.KIND_WEB:
+        return os.path.join(settings.SIMILARITY_REPORTS_DIR, 'web_reports')
+    return settings.SIMILARITY_REPORTS_DIR
+
+def file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return None
+
+def register_report(filename, kind, score=None, assignment1=None, assignment2=None):
+    """
+    Add a generated (or, for pairwise reports, stored but not yet rendered)
+    report to the catalogue.
+    """
+    try:
+        score = float(score) if score is not None else None
+    except (TypeError, ValueError):
+        score = None
+    size = file_size(os.path.join(get_reports_dir(kind), filename))
+    report, _ = SimilarityReport.objects.update_or_create(
+        kind=kind,
+        filename=filename,
+        defaults={
+            'score': score,
+            'size': size,
+            'assignment1': assignment1,
+            'assignment2': assignment2
+        }
+    )
+    return report
+
+def update_report_size(filename, kind):
+    """
+    Record the size of a report's PDF once it has been rendered.
+    """
+    size = file_size(os.path.join(get_reports_dir(kind), filename))
+    SimilarityReport.objects.filter(kind=kind, filename=filename).update(size=size)
+
+def parse_time(value, end_of_day=False):
+    """
+    Parse an ISO date or datetime query parameter into an aware datetime.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.datetime.combine(day, datetime.time.max if end_of_day else datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def encode_cursor(report):
+    """
+    Encode a report's position in the listing order as "<created_at in microseconds>_<id>".
+    """
+    return f'{(report.created_at - EPOCH) // datetime.timedelta(microseconds=1)}_{report.id}'
+
+def decode_cursor(value):
+    """
+    Decode a cursor made by encode_cursor.
+
+    Returns:
+        tuple: (created_at, id)
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    micros, _, report_id = value.partition('_')
+    return EPOCH + datetime.timedelta(microseconds=int(micros)), int(report_id)
+
+def list_catalogued_reports(kind, params):
+    """
+    Return one page of catalogued reports of a kind, newest first.
+
+    Query parameters:
+    - cursor: the next_cursor value returned with the previous page
+    - limit: page size (default 50, at least 1, at most 200)
+    - assignment_id: only reports involving this assignment
+    - min_score / max_score: similarity percentage range
+    - created_after / created_before: ISO date or datetime
+
+    Returns:
+        tuple: (list of report dicts, next_cursor or None)
+    Raises:
+        ValueError: if a parameter is malformed
+    """
+    reports = SimilarityReport.objects.filter(kind=kind)
+
+    if params.get('assignment_id'):
+        assignment_id = int(params['assignment_id'])
+        reports = reports.filter(Q(assignment1_id=assignment_id) | Q(assignment2_id=assignment_id))
+    if params.get('min_score'):
+        reports = reports.filter(score__gte=float(params['min_score']))
+    if params.get('max_score'):
+        reports = reports.filter(score__lte=float(params['max_score']))
+    if params.get('created_after'):
+        reports = reports.filter(created_at__gte=parse_time(params['created_after']))
+    if params.get('created_before'):
+        reports = reports.filter(created_at__lte=parse_time(params['created_before'], end_of_day=True))
+
+    # Backfilled reports get their original creation time but a new id, so
+    # pages follow (created_at, id), ids breaking ties
+    if params.get('cursor'):
+        created_at, report_id = decode_cursor(params['cursor'])
+        reports = reports.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=report_id))
+
+    limit = min(int(params.get('limit') or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError(f"Invalid limit: {params['limit']}")
+    page = list(reports.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return [report.to_dict() for report in page[:limit]], next_cursor
+
+def delete_catalogued_report(filename, kind):
+    """
+    Delete a report's catalogue entry, its PDF and, for pairwise reports,
+    the stored comparison it is rendered from.
+
+    Returns:
+        bool: False if the report is not in the catalogue
+    """
+    deleted, _ = SimilarityReport.objects.filter(kind=kind, filename=filename).delete()
+    if not deleted:
+        return False
+
+    if kind == SimilarityReport.KIND_PAIRWISE:
+        ComparisonResult.objects.filter(report_filename=filename).delete()
+
+    file_path = os.path.join(get_reports_dir(kind), filename)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    return True
+
+def sync_report_catalogue():
+    """
+    Reconcile the catalogue with the report directories and stored comparisons:
+    register reports that are missing (e.g. generated before the catalogue
+    existed) and drop entries whose report no longer exists.
+
+    Returns:
+        dict: counts of added and removed entries
+    """
+    stats = {'added': 0, 'removed': 0}
+
+    for kind, _ in SimilarityReport.KIND_CHOICES:
+        reports_dir = get_reports_dir(kind)
+        known = set(SimilarityReport.objects.filter(kind=kind).values_list('filename', flat=True))
+        present = set()
+
+        if kind == SimilarityReport.KIND_PAIRWISE:
+            for comparison in ComparisonResult.objects.all():
+                present.add(comparison.report_filename)
+                if comparison.report_filename not in known:
+                    register_report(comparison.report_filename, kind, comparison.similarity_percentage,
+                                    comparison.assignment1, comparison.assignment2)
+                    SimilarityReport.objects.filter(kind=kind, filename=comparison.report_filename).update(
+                        created_at=comparison.created_at)
+                    stats['added'] += 1
+
+        if os.path.isdir(reports_dir):
+            for entry in os.scandir(reports_dir):
+                # Rendered reports of stored comparisons were handled above
+                if not entry.is_file() or not entry.name.endswith('.pdf') or entry.name in present:
+                    continue
+                present.add(entry.name)
+                if entry.name not in known:
+                    stat = entry.stat()
+                    SimilarityReport.objects.create(
+                        kind=kind,
+                        filename=entry.name,
+                        size=stat.st_size,
+                        created_at=datetime.datetime.fromtimestamp(stat.st_ctime, tz=datetime.timezone.utc)
+                    )
+                    stats['added'] += 1
+
+        missing = known - present
+        if missing:
+            SimilarityReport.objects.filter(kind=kind, filename__in=missing).delete()
+            stats['removed'] += len(missing)
+
+    return stats
@@ -0,0 +1,120 @@
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Character shingle size used to index sentences
+SHINGLE_SIZE = 3
+
+# A pair is only scored exactly when its shingle Dice coefficient reaches this
+# fraction of the similarity threshold. SequenceMatcher ratios above the
+# threshold come with high shingle overlap, so this keeps recall at the level
+# of the all-pairs loop while skipping almost every unrelated pair (see the
+# benchmark_sentence_matching command).
+CANDIDATE_FACTOR = 0.4
+
+# Below this many sentence pairs the exhaustive loop is cheap enough to keep
+EXHAUSTIVE_PAIR_LIMIT = 2500
+
+
+def char_shingles(sentence, size=SHINGLE_SIZE):
+    """
+    Return the multiset of overlapping character n-grams of a sentence.
+    """
+    if len(sentence) <= size:
+        return Counter([sentence])
+    return Counter(sentence[k:k + size] for k in range(len(sentence) - size + 1))
+
+class SentenceIndex:
+    """
+    Inverted index from character shingles to the sentences containing them.
+    Used to generate candidate pairs without comparing every sentence pair.
+    """
+
+    def __init__(self, sentences, size=SHINGLE_SIZE):
+        self.size = size
+        self.shingle_totals = []
+        self.postings = defaultdict(list)
+        for idx, sentence in enumerate(sentences):
+            shingles = char_shingles(sentence, size)
+            self.shingle_totals.append(sum(shingles.values()))
+            for shingle, count in shingles.items():
+                self.postings[shingle].append((idx, count))
+
+    def candidates(self, sentence, min_dice):
+        """
+        Return the indexed sentences whose shingle Dice coefficient with
+        `sentence` is at least `min_dice`.
+        """
+        shingles = char_shingles(sentence, self.size)
+        shared = defaultdict(int)
+        for shingle, count in shingles.items():
+            for idx, indexed_count in self.postings.get(shingle, ()):
+                shared[idx] += min(count, indexed_count)
+
+        total = sum(shingles.values())
+        return [
+            idx for idx, count in shared.items()
+            if 2 * count >= min_dice * (total + self.shingle_totals[idx])
+        ]
+
+def _exact_ratio(matcher, threshold):
+    """
+    Return the SequenceMatcher ratio if it reaches the threshold, else None.
+    The cheap upper bounds are checked first so most pairs never pay for ratio().
+    """
+    if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+        return None
+    ratio = matcher.ratio()
+    return ratio if ratio >= threshold else None
+
+def match_sentences_exhaustive(sentences1, sentences2, threshold=0.6):
+    """
+    Score every sentence pair. Returns (i, j, ratio) tuples ordered by (i, j).
+    """
+    matches = []
+    matcher = SequenceMatcher(None)
+    for j, s2 in enumerate(sentences2):
+        matcher.set_seq2(s2)
+        for i, s1 in enumerate(sentences1):
+            matcher.set_seq1(s1)
+            ratio = _exact_ratio(matcher, threshold)
+            if ratio is not None:
+                matches.append((i, j, ratio))
+    return sorted(matches)
+
+def match_sentences(sentences1, sentences2, threshold=0.6, exhaustive=False):
+    """
+    Find sentence pairs whose SequenceMatcher ratio reaches the threshold.
+    Candidate pairs come from a shingle index over the second document, and
+    only those are sent to the exact scorer.
+
+    Returns:
+        list: (i, j, ratio) tuples ordered by (i, j)
+    """
+    if exhaustive or len(sentences1) * len(sentences2) <= EXHAUSTIVE_PAIR_LIMIT:
+        return match_sentences_exhaustive(sentences1, sentences2, threshold)
+
+    index = SentenceIndex(sentences2)
+    min_dice = threshold * CANDIDATE_FACTOR
+
+    # Group candidates by second-document sentence so SequenceMatcher can
+    # reuse its analysis of seq2 across all first-document candidates
+    candidates = defaultdict(list)
+    for i, s1 in enumerate(sentences1):
+        for j in index.candidates(s1, min_dice):
+            candidates[j].append(i)
+
+    matches = []
+    matcher = SequenceMatcher(None)
+    for j, first_idxs in candidates.items():
+        s2 = sentences2[j]
+        matcher.set_seq2(s2)
+        for i in first_idxs:
+            s1 = sentences1[i]
+            # ratio can never exceed 2 * min(len) / (len1 + len2)
+            if 2 * min(len(s1), len(s2)) < threshold * (len(s1) + len(s2)):
+                continue
+            matcher.set_seq1(s1)
+            ratio = _exact_ratio(matcher, threshold)
+            if ratio is not None:
+                matches.append((i, j, ratio))
+    return sorted(matches)
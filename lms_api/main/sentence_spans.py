@@ -0,0 +1,127 @@
+"""
+Per-document sentence spans.
+
+Each document's sentences are segmented once, at upload, and stored with
+the text cache as offsets into its raw text, together with their word
+counts and a hash of their words. Sentence matching reads the sentences
+back by offset instead of segmenting both documents for every pair, and
+reports highlight matched sentences by offset, finding quoted sentences
+by hash, instead of searching the text for them again.
+"""
+import hashlib
+import io
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from .models import DocumentText
+from .text_normalization import NORMALIZATION_CACHE_SIZE, clean_text, normalize_text, preprocess_tokens, raw_offsets
+
+logger = logging.getLogger(__name__)
+
+
+def sentence_hash(sentence):
+    """
+    Hash a sentence's lowercase words, so spacing and punctuation don't matter.
+    """
+    key = ' '.join(preprocess_tokens(sentence)).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class SentenceSpans:
+    """
+    The sentences of one raw text: start and end offsets into it, word
+    counts and hashes, as parallel arrays.
+    """
+
+    def __init__(self, starts, ends, words, hashes):
+        self.starts = starts
+        self.ends = ends
+        self.words = words
+        self.hashes = hashes
+        self._by_hash = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sentence(self, text, idx):
+        return clean_text(text[self.starts[idx]:self.ends[idx]])
+
+    def sentences(self, text, min_words=1):
+        """
+        Return the cleaned sentences with at least min_words words.
+
+        Returns:
+            tuple: (span indices, sentences)
+        """
+        indices = np.flatnonzero(self.words >= min_words)
+        return indices, [self.sentence(text, idx) for idx in indices]
+
+    def span(self, idx):
+        return int(self.starts[idx]), int(self.ends[idx])
+
+    def find(self, sentence):
+        """
+        Return the (start, end) of the first sentence with the same words, or None.
+        """
+        if self._by_hash is None:
+            by_hash = {}
+            for idx, value in enumerate(self.hashes.tolist()):
+                by_hash.setdefault(value, idx)
+            self._by_hash = by_hash
+        idx = self._by_hash.get(sentence_hash(sentence))
+        return None if idx is None else self.span(idx)
+
+    def serialize(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, starts=self.starts, ends=self.ends, words=self.words, hashes=self.hashes)
+        return buffer.getvalue()
+
+    @classmethod
+    def deserialize(cls, blob):
+        arrays = np.load(io.BytesIO(blob))
+        return cls(arrays['starts'], arrays['ends'], arrays['words'], arrays['hashes'])
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def compute_sentence_spans(text):
+    """
+    Segment a raw text into sentences. Cached per text like normalize_text.
+
+    Returns:
+        SentenceSpans
+    """
+    normalized = normalize_text(text)
+    sentences = normalized.sentences
+    starts, ends = raw_offsets(text or '', [start for start, _, _ in sentences], [end for _, end, _ in sentences])
+    return SentenceSpans(
+        starts.astype(np.uint32),
+        ends.astype(np.uint32),
+        np.array([words for _, _, words in sentences], dtype=np.uint32),
+        np.array([sentence_hash(normalized.text[start:end]) for start, end, _ in sentences], dtype=np.uint64)
+    )
+
+def get_document_sentences(content_hashes):
+    """
+    Return the stored sentence spans of cached documents, computing and
+    storing any that are missing. Documents not in the text cache are left out.
+
+    Returns:
+        dict: content hash -> SentenceSpans
+    """
+    spans = {}
+    missing = []
+    for document_id, content_hash, blob in DocumentText.objects.filter(
+            content_hash__in=set(content_hashes)).values_list('id', 'content_hash', 'sentence_spans'):
+        if blob:
+            spans[content_hash] = SentenceSpans.deserialize(bytes(blob))
+        else:
+            missing.append(document_id)
+
+    for document_id, content_hash, raw_text in DocumentText.objects.filter(
+            id__in=missing).values_list('id', 'content_hash', 'raw_text'):
+        document_spans = compute_sentence_spans(raw_text)
+        DocumentText.objects.filter(id=document_id).update(sentence_spans=document_spans.serialize())
+        spans[content_hash] = document_spans
+    return spans
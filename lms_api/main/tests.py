@@ -1,3 +1,272 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.test import TestCase, override_settings
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from . import idf_model
+from .comparison import compare_assignment_pair, get_report_path, purge_stale_comparisons
+from .idf_model import IDFModel, get_idf_model, update_idf_model
+from .minhash import find_candidates
+from .models import ComparisonResult, DocumentText, SimilarityReport, St_Assignment
+from .report_catalogue import list_catalogued_reports
+
+CORPUS = [
+    "the quick brown fox jumps over the lazy dog",
+    "a quick brown dog outpaces a lazy fox",
+    "plagiarism detection compares student submissions with each other",
+    "student submissions are compared with the course corpus and the web",
+    "the dog and the fox are both quick",
+]
+
+
+def build_model(directory, texts):
+    model = IDFModel(directory)
+    for text in texts:
+        model.add_document(text)
+    model.save()
+    return model
+
+
+# Shared by two submissions, so their sentence analysis finds matches
+ESSAY = (
+    "Plagiarism detection compares every student submission with the rest of the class. "
+    "Copied passages are highlighted in a report that the lecturer can download. "
+    "Scores combine sentence matches with the similarity of the whole documents. "
+)
+
+
+class IsolatedStorageTestCase(TestCase):
+    """
+    Runs each test with its own media, report and IDF model directories.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.reports_dir = os.path.join(self.directory, 'reports')
+        os.makedirs(self.reports_dir)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.directory, 'media'),
+            SIMILARITY_REPORTS_DIR=self.reports_dir,
+            IDF_MODEL_DIR=os.path.join(self.directory, 'idf_model'),
+            IDF_GENERATION_DRIFT=0.25,
+            SIMILARITY_MAX_WORKERS=1
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The process-wide model belongs to whichever directory was used last
+        idf_model._model = idf_model._model_mtime = None
+        self.addCleanup(setattr, idf_model, '_model', None)
+
+    def upload(self, title, text, name=None):
+        return St_Assignment.objects.create(
+            title=title,
+            file=SimpleUploadedFile(name or f'{title}.txt', text.encode('utf-8'))
+        )
+
+
+class IDFModelTests(IsolatedStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = os.path.join(self.directory, 'idf_model')
+
+    def test_similarity_matches_sklearn(self):
+        model = build_model(self.directory, CORPUS)
+        expected = cosine_similarity(TfidfVectorizer().fit_transform(CORPUS))
+
+        counts = [model.term_counts(text) for text in CORPUS]
+        for i in range(len(CORPUS)):
+            for j in range(len(CORPUS)):
+                self.assertAlmostEqual(model.similarity(counts[i], counts[j]), expected[i, j], places=6)
+
+        matrix = model.matrix(counts)
+        np.testing.assert_allclose((matrix @ matrix.T).toarray(), expected, atol=1e-6)
+
+    def test_appending_a_document_matches_a_full_build(self):
+        initial = build_model(self.directory, CORPUS[:-1])
+        stored_counts = IDFModel.load(self.directory).term_counts(CORPUS[0])
+
+        model = IDFModel.load(self.directory)
+        model.add_document(CORPUS[-1])
+        model.save()
+        appended = IDFModel.load(self.directory)
+
+        full = build_model(tempfile.mkdtemp(dir=self.directory), CORPUS)
+        # Terms are only appended, so counts stored earlier keep their columns
+        self.assertEqual(appended.terms[:len(initial.terms)], initial.terms)
+        self.assertEqual(appended.n_documents, len(CORPUS))
+        self.assertEqual(
+            {term: appended.idf[index] for index, term in enumerate(appended.terms)},
+            {term: full.idf[index] for index, term in enumerate(full.terms)}
+        )
+        self.assertAlmostEqual(
+            appended.similarity(stored_counts, appended.term_counts(CORPUS[1])),
+            full.similarity(full.term_counts(CORPUS[0]), full.term_counts(CORPUS[1])),
+            places=6
+        )
+
+    def test_update_counts_documents_added_by_another_process_once(self):
+        for index, text in enumerate(CORPUS[:2]):
+            DocumentText.objects.create(content_hash=f'hash{index}', raw_text=text, preprocessed_text=text)
+        self.assertEqual(update_idf_model()['added'], 2)
+        get_idf_model()
+
+        # Another process counts a document while this one holds an older model
+        document = DocumentText.objects.create(content_hash='hash2', raw_text=CORPUS[2], preprocessed_text=CORPUS[2])
+        other = IDFModel.load(self.directory)
+        other.add_document(CORPUS[2])
+        other.last_document_id = document.id
+        other.save()
+
+        for index, text in enumerate(CORPUS[3:], start=3):
+            DocumentText.objects.create(content_hash=f'hash{index}', raw_text=text, preprocessed_text=text)
+        self.assertEqual(update_idf_model()['added'], 2)
+
+        model = get_idf_model()
+        full = build_model(tempfile.mkdtemp(dir=self.directory), CORPUS)
+        self.assertEqual(model.n_documents, len(CORPUS))
+        self.assertEqual(sorted(model.terms), sorted(full.terms))
+        self.assertEqual(int(model.df[model.vocabulary['plagiarism']]), 1)
+
+    def test_generation_only_moves_after_drift(self):
+        model = build_model(self.directory, CORPUS[:4])
+        generation = model.generation
+
+        model.add_document(CORPUS[4])
+        model.save()
+        self.assertEqual(model.generation, generation)
+
+        model.add_document(CORPUS[0])
+        model.save()
+        self.assertNotEqual(model.generation, generation)
+        self.assertEqual(IDFModel.load(self.directory).generation, model.generation)
+
+
+class StoredScoreRefreshTests(IsolatedStorageTestCase):
+    def test_new_generation_rescores_and_rerenders(self):
+        assignment1 = self.upload('first', ESSAY + "The first student adds a conclusion of their own.")
+        assignment2 = self.upload('second', ESSAY + "The second student writes about something else entirely.")
+        result = compare_assignment_pair(assignment1, assignment2)
+        self.assertNotIn('error', result)
+        report_path = get_report_path(result['report_filename'])
+        self.assertTrue(os.path.isfile(report_path))
+
+        # As if the score had been computed under an earlier IDF model
+        ComparisonResult.objects.update(similarity_score=0.0123, idf_generation='0-1')
+        report = SimilarityReport.objects.get(filename=result['report_filename'])
+        SimilarityReport.objects.filter(id=report.id).update(score=1.23)
+        with open(report_path, 'wb') as f:
+            f.write(b'stale report')
+
+        cached = compare_assignment_pair(assignment1, assignment2)
+        self.assertTrue(cached['cached'])
+        self.assertEqual(cached['similarity_score'], result['similarity_score'])
+        self.assertFalse(os.path.exists(report_path))
+        report.refresh_from_db()
+        self.assertEqual(report.score, result['similarity_score'])
+
+        self.assertEqual(get_report_path(result['report_filename']), report_path)
+        with open(report_path, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+    def test_report_is_refreshed_when_served(self):
+        assignment1 = self.upload('first', ESSAY + "One ending.")
+        assignment2 = self.upload('second', ESSAY + "Another ending.")
+        result = compare_assignment_pair(assignment1, assignment2)
+        report_path = get_report_path(result['report_filename'])
+
+        ComparisonResult.objects.update(idf_generation='0-1')
+        with open(report_path, 'wb') as f:
+            f.write(b'stale report')
+
+        self.assertEqual(get_report_path(result['report_filename']), report_path)
+        with open(report_path, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+        self.assertEqual(ComparisonResult.objects.get().idf_generation, get_idf_model().generation)
+
+
+class ComparisonDeduplicationTests(IsolatedStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assignment1 = self.upload('first', ESSAY + "The first student adds a conclusion of their own.")
+        self.assignment2 = self.upload('second', ESSAY + "The second student writes about something else entirely.")
+        self.result = compare_assignment_pair(self.assignment1, self.assignment2)
+        self.assertNotIn('error', self.result)
+        self.assertFalse(self.result['cached'])
+
+    def test_reversed_pair_is_served_from_the_store(self):
+        result = compare_assignment_pair(self.assignment2, self.assignment1)
+
+        self.assertTrue(result['cached'])
+        self.assertEqual(result['report_filename'], self.result['report_filename'])
+        self.assertEqual(result['similarity_score'], self.result['similarity_score'])
+        self.assertEqual(ComparisonResult.objects.count(), 1)
+
+    def test_reuploaded_identical_file_is_served_from_the_store(self):
+        with open(self.assignment1.file.path, 'rb') as f:
+            content = f.read().decode('utf-8')
+        reupload = self.upload('first again', content, name='renamed.txt')
+
+        result = compare_assignment_pair(self.assignment2, reupload)
+
+        self.assertTrue(result['cached'])
+        self.assertEqual(result['report_filename'], self.result['report_filename'])
+        self.assertEqual(ComparisonResult.objects.count(), 1)
+        self.assertEqual(SimilarityReport.objects.filter(kind=SimilarityReport.KIND_PAIRWISE).count(), 1)
+
+    def test_algorithm_version_bump_purges_old_results(self):
+        report_path = get_report_path(self.result['report_filename'])
+        self.assertTrue(os.path.isfile(report_path))
+
+        with override_settings(SIMILARITY_ALGORITHM_VERSION=settings.SIMILARITY_ALGORITHM_VERSION + 1):
+            self.assertEqual(purge_stale_comparisons(), 1)
+            self.assertFalse(ComparisonResult.objects.exists())
+            self.assertFalse(SimilarityReport.objects.filter(filename=self.result['report_filename']).exists())
+            self.assertFalse(os.path.exists(report_path))
+
+            result = compare_assignment_pair(self.assignment1, self.assignment2)
+            self.assertFalse(result['cached'])
+            self.assertNotEqual(result['report_filename'], self.result['report_filename'])
+
+
+class ReportCatalogueTests(TestCase):
+    def setUp(self):
+        for index in range(3):
+            SimilarityReport.objects.create(kind=SimilarityReport.KIND_WEB, filename=f'report_{index}.pdf')
+
+    def test_pages_cover_every_report_once(self):
+        filenames, params = [], {'limit': '2'}
+        while True:
+            reports, next_cursor = list_catalogued_reports(SimilarityReport.KIND_WEB, params)
+            filenames.extend(report['filename'] for report in reports)
+            if next_cursor is None:
+                break
+            params = {'limit': '2', 'cursor': next_cursor}
+        self.assertEqual(filenames, ['report_2.pdf', 'report_1.pdf', 'report_0.pdf'])
+
+    def test_limit_must_be_positive(self):
+        for limit in ('0', '-1'):
+            with self.assertRaises(ValueError):
+                list_catalogued_reports(SimilarityReport.KIND_WEB, {'limit': limit})
+
+
+class CandidateSearchTests(TestCase):
+    def test_shared_prompt_does_not_make_every_pair_a_candidate(self):
+        rng = np.random.default_rng(0)
+        prompt = rng.integers(0, 2**63, size=300, dtype=np.uint64)
+        fingerprints = {
+            key: np.concatenate([prompt, rng.integers(0, 2**63, size=1000, dtype=np.uint64)])
+            for key in range(30)
+        }
+        # Submission 1 copies a tenth of submission 0's own text
+        fingerprints[1] = np.concatenate([fingerprints[1], fingerprints[0][300:400]])
+
+        candidates = find_candidates(fingerprints)
+
+        self.assertEqual([(key1, key2) for key1, key2, _ in candidates], [(0, 1)])
@@ -0,0 +1,175 @@
+"""
+Text normalization shared by the pairwise and web similarity paths.
+
+A document's text is normalized once into everything the matchers need:
+the cleaned text used for sentences and display, the preprocessed text
+(lowercase words only) used for vectors and fingerprints, its word tokens,
+and the character offsets of its sentences in the cleaned text. All
+patterns are compiled once, and results are cached per document text, so
+a document compared against a whole class is normalized only once.
+"""
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+import nltk
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Punctuation kept in cleaned text; any other non-word character, and any
+# whitespace run, becomes a single space
+CLEAN_CLASS = r'[^\w.,!?;:"\'/()\[\]{}\-_+=<>@#$%&*]'
+CLEAN_RE = re.compile(CLEAN_CLASS + '+')
+LEADING_CLEAN_RE = re.compile(CLEAN_CLASS)
+
+# Runs that cleaning shortens, shifting the offsets after them
+COLLAPSED_RE = re.compile(CLEAN_CLASS + '{2,}')
+
+# Characters dropped from preprocessed text
+PUNCTUATION_RE = re.compile(r'[^\w\s]+')
+
+# Sentence breaks when the punkt model is unavailable
+SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+')
+
+NEWLINES_RE = re.compile(r'\n+')
+
+# Documents whose normalization is kept in memory per process
+NORMALIZATION_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class NormalizedText:
+    # Whitespace collapsed, unusual characters replaced by spaces
+    text: str
+    # Lowercase words separated by single spaces
+    preprocessed: str
+    # Words of the preprocessed text
+    tokens: tuple
+    # (start, end, words) of each sentence, as offsets into text
+    sentences: tuple
+
+    def sentence_texts(self, min_words=1):
+        return [self.text[start:end] for start, end, words in self.sentences if words >= min_words]
+
+
+def tidy_extracted_text(text):
+    """
+    Collapse blank lines and replace tabs in freshly extracted text.
+    """
+    return NEWLINES_RE.sub('\n', text).replace('\t', ' ')
+
+_punkt = None
+_punkt_loaded = False
+_punkt_lock = threading.Lock()
+
+
+def _load_punkt():
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer  # nltk >= 3.8.2 (punkt_tab data)
+        return PunktTokenizer('english')
+    except ImportError:
+        return nltk.data.load('tokenizers/punkt/english.pickle')
+
+def get_sentence_tokenizer():
+    """
+    Return the punkt sentence tokenizer, downloading its data on first use,
+    or None if it is unavailable (sentences are then split on punctuation).
+    """
+    global _punkt, _punkt_loaded
+    with _punkt_lock:
+        if not _punkt_loaded:
+            _punkt_loaded = True
+            try:
+                _punkt = _load_punkt()
+            except LookupError:
+                try:
+                    nltk.download('punkt_tab', quiet=True)
+                    nltk.download('punkt', quiet=True)
+                    _punkt = _load_punkt()
+                except Exception as e:
+                    logger.warning(f"Punkt sentence tokenizer unavailable, splitting on punctuation: {e}")
+            except Exception as e:
+                logger.warning(f"Punkt sentence tokenizer unavailable, splitting on punctuation: {e}")
+        return _punkt
+
+def sentence_spans(text):
+    """
+    Return the (start, end) offsets of the sentences of a cleaned text.
+    """
+    tokenizer = get_sentence_tokenizer()
+    if tokenizer is not None:
+        try:
+            return list(tokenizer.span_tokenize(text))
+        except Exception as e:
+            logger.warning(f"Punkt sentence tokenization failed, splitting on punctuation: {e}")
+
+    spans = []
+    start = 0
+    for match in SENTENCE_BREAK_RE.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+    return spans
+
+def clean_text(text):
+    return CLEAN_RE.sub(' ', text).strip()
+
+def raw_offsets(text, starts, ends):
+    """
+    Map spans of clean_text(text), none starting or ending in whitespace,
+    to the spans of text they were cleaned from.
+
+    Returns:
+        tuple: (starts, ends) as int64 arrays of offsets into text
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    # strip() dropped the space a leading run was collapsed to
+    lead = 1 if LEADING_CLEAN_RE.match(text) else 0
+
+    runs = [(match.start(), match.end() - match.start()) for match in COLLAPSED_RE.finditer(text)]
+    if not runs:
+        return starts + lead, ends + lead
+    run_starts = np.array([start for start, _ in runs], dtype=np.int64)
+    removed = np.array([length - 1 for _, length in runs], dtype=np.int64)
+    # Characters removed before each run, and where its space landed
+    shifts = np.concatenate([[0], np.cumsum(removed)])
+    collapsed_at = run_starts - shifts[:-1]
+
+    def to_raw(positions):
+        positions = positions + lead
+        return positions + shifts[np.searchsorted(collapsed_at, positions, side='left')]
+
+    return to_raw(starts), to_raw(ends - 1) + 1
+
+def preprocess_tokens(text):
+    return PUNCTUATION_RE.sub('', text.lower()).split()
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_text(text):
+    """
+    Normalize a document's text. Cached per text, so repeated calls for the
+    same document (e.g. once per pair it appears in) are free.
+
+    Returns:
+        NormalizedText
+    """
+    text = text or ''
+    cleaned = clean_text(text)
+    tokens = preprocess_tokens(text)
+
+    sentences = []
+    for start, end in sentence_spans(cleaned):
+        if start < end:
+            # Cleaned text has single spaces, and spans carry no outer whitespace
+            sentences.append((start, end, cleaned.count(' ', start, end) + 1))
+
+    return NormalizedText(
+        text=cleaned,
+        preprocessed=' '.join(tokens),
+        tokens=tuple(tokens),
+        sentences=tuple(sentences)
+    )
@@ -46,6 +46,13 @@ urlpatterns = [
     path('upload/', views.upload_assignment, name='upload_assignment'),
     path('compare/', views.compare_assignments, name='compare_assignments'),
     path('list/', views.get_assignments, name='get_assignments'),
+    path('fingerprint-matches/<int:assignment_id>/', views.fingerprint_matches, name='fingerprint_matches'),
+    path('find-suspicious-pairs/', views.find_suspicious_pairs, name='find_suspicious_pairs'),
+    path('extraction-metrics/', views.extraction_metrics, name='extraction_metrics'),
+
+    # Class-wide similarity, stored incrementally as submissions are uploaded
+    path('course/<int:course_id>/similarity-matrix/', views.class_similarity_matrix, name='class_similarity_matrix'),
+    path('course/<int:course_id>/suspicious-pairs/', views.suspicious_pairs, name='suspicious_pairs'),
 
     # Similarity reports
     path('reports/', views.list_reports, name='list_reports'),
@@ -60,6 +67,14 @@ urlpatterns = [
     path('download-web-report/<str:filename>', views.download_web_report, name='download_web_report'),
     path('delete-web-report/<str:filename>', views.delete_web_report, name='delete_web_report'),
     
+    # Similarity jobs
+    path('jobs/', views.submit_job, name='submit_job'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/result/', views.job_result, name='job_result'),
+    
+    # Local reference corpus
+    path('corpus/query/', views.query_corpus_index, name='query_corpus_index'),
+    
     #Student
     path('student/', views.StudentList.as_view()),
     path('student/<int:pk>/', views.StudentDetail.as_view()),
@@ -1,13 +1,9 @@
 import os
-import re
 import hashlib
 import datetime
-import nltk
-from nltk.tokenize import sent_tokenize
-from difflib import SequenceMatcher
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import textract
+import tempfile
+from dataclasses import dataclass, field
+from xml.sax.saxutils import escape
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
@@ -21,11 +17,16 @@ from reportlab.graphics.shapes import Drawing, Line, Rect
 from reportlab.graphics.charts.piecharts import Pie
 from reportlab.lib.units import inch, cm
 
-# Download necessary NLTK data (run once)
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from django.conf import settings
+from django.utils import timezone
+
+from .extraction import ExtractionError, extract_file, extract_files
+from .idf_model import get_document_counts, get_idf_model, text_similarity
+from .highlighting import iter_highlighted_paragraphs, locate_passages, merge_spans
+from .models import DocumentText
+from .sentence_matching import match_sentences
+from .sentence_spans import compute_sentence_spans, get_document_sentences
+from .text_normalization import normalize_text
 
 class HorizontalLineFlowable(Flowable):
     """A flowable that draws a horizontal line."""
@@ -45,43 +46,123 @@ def preprocess_text(text):
     """
     Preprocess the text by removing special characters and converting to lowercase.
     """
-    # Convert to lowercase and remove special characters
-    text = re.sub(r'[^\w\s]', '', text.lower())
-    # Remove extra whitespaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    return normalize_text(text).preprocessed
 
 def extract_text_from_file(file_path):
     """
-    Extract text from various file formats using textract.
-    Returns the extracted text as a string.
+    Extract text from various file formats in the sandboxed extraction pool.
+    Returns the extracted text as a string, empty if extraction failed.
     """
-    try:
-        # Extract text from various file formats
-        text = textract.process(file_path).decode('utf-8')
-        # Clean up the text
-        text = re.sub(r'\n+', '\n', text)  # Replace multiple newlines with single
-        text = re.sub(r'\t', ' ', text)    # Replace tabs with spaces
-        return text
-    except Exception as e:
-        print(f"Error extracting text: {e}")
-        return ""
+    return extract_file(file_path).text
 
-def get_report_filename(file1_path, file2_path):
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """
+    Return the SHA-256 hex digest of a file's contents.
     """
-    Generate a unique report filename based on the input file names and a timestamp.
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def store_document_text(content_hash, raw_text):
     """
-    file1_name = os.path.basename(file1_path)
-    file2_name = os.path.basename(file2_path)
+    Add an extracted text to the DocumentText cache. Empty texts are not cached.
     
-    # Create a hash of the filenames to ensure uniqueness
-    hash_str = hashlib.md5(f"{file1_name}_{file2_name}_{datetime.datetime.now()}".encode()).hexdigest()[:8]
+    Returns:
+        tuple: (raw_text, preprocessed_text)
+    """
+    preprocessed_text = preprocess_text(raw_text)
+    if raw_text:
+        DocumentText.objects.get_or_create(
+            content_hash=content_hash,
+            defaults={'raw_text': raw_text, 'preprocessed_text': preprocessed_text}
+        )
+    return raw_text, preprocessed_text
+
+def get_document_text(file_path, content_hash=None):
+    """
+    Return the raw and preprocessed text of a file, using the DocumentText cache.
+    Extraction only runs the first time a given file content is seen; failed
+    extractions are not cached so they can be retried.
     
-    return f"similarity_report_{hash_str}.pdf"
+    Returns:
+        tuple: (raw_text, preprocessed_text, content_hash)
+    Raises:
+        ExtractionError: if the file's text could not be extracted
+    """
+    if not content_hash:
+        content_hash = compute_file_hash(file_path)
+    
+    cached = DocumentText.objects.filter(content_hash=content_hash).first()
+    if cached is not None:
+        return cached.raw_text, cached.preprocessed_text, content_hash
+    
+    result = extract_file(file_path)
+    if not result.ok:
+        raise ExtractionError(f"Could not extract text from {os.path.basename(file_path)}: {result.error}")
+    raw_text, preprocessed_text = store_document_text(content_hash, result.text)
+    return raw_text, preprocessed_text, content_hash
 
-def find_similar_sentences(text1, text2, threshold=0.6):
+def record_content_hash(assignment, content_hash):
+    """
+    Store a new content hash on an assignment row, with the time it changed.
+    """
+    if assignment.content_hash != content_hash:
+        assignment.content_hash = content_hash
+        assignment.hashed_at = timezone.now()
+        assignment.save(update_fields=['content_hash', 'hashed_at'])
+
+def cache_assignment_text(assignment):
+    """
+    Fill the text cache for an uploaded St_Assignment or Assignment and record
+    its content hash on the row. Called once at upload time.
+    Raises ExtractionError if the text could not be extracted.
+    """
+    if not assignment.file:
+        return None
+    raw_text, preprocessed_text, content_hash = get_document_text(assignment.file.path)
+    record_content_hash(assignment, content_hash)
+    return content_hash
+
+def cache_assignment_texts(assignments):
+    """
+    cache_assignment_text for several rows, extracting the uncached files in parallel.
+    
+    Returns:
+        dict: assignment id -> error message, for rows whose text could not be extracted
+    """
+    hashes = {
+        assignment.id: compute_file_hash(assignment.file.path)
+        for assignment in assignments if assignment.file
+    }
+    cached = set(DocumentText.objects.filter(content_hash__in=set(hashes.values())).values_list(
+        'content_hash', flat=True))
+    results = extract_files(
+        assignment.file.path for assignment in assignments
+        if assignment.id in hashes and hashes[assignment.id] not in cached
+    )
+    
+    errors = {}
+    for assignment in assignments:
+        content_hash = hashes.get(assignment.id)
+        if content_hash is None:
+            continue
+        if content_hash not in cached:
+            result = results[assignment.file.path]
+            if not result.ok:
+                errors[assignment.id] = result.error
+                continue
+            store_document_text(content_hash, result.text)
+            cached.add(content_hash)
+        record_content_hash(assignment, content_hash)
+    return errors
+
+def find_similar_sentences(text1, text2, threshold=0.6, spans1=None, spans2=None):
     """
     Find similar sentences between two texts using sequence matching.
+    Candidate pairs come from a shingle index (see sentence_matching) so
+    long documents are not compared sentence-by-sentence.
     Handles text extraction issues by cleaning and normalizing the text.
     Uses a lower threshold to capture more matches for complete analysis.
     
@@ -89,69 +170,39 @@ def find_similar_sentences(text1, text2, threshold=0.6):
         text1 (str): Text from first document
         text2 (str): Text from second document
         threshold (float): Similarity threshold (0.0-1.0), lower values find more matches
+        spans1, spans2 (SentenceSpans): stored sentence spans of the texts, segmented here if not given
         
     Returns:
-        list: List of dictionaries containing similar sentence pairs
-    """
-    # Clean and normalize text to improve sentence tokenization
-    def clean_text(text):
-        # Replace multiple spaces with single space
-        text = re.sub(r'\s+', ' ', text)
-        # Replace multiple newlines with single newline
-        text = re.sub(r'\n+', '\n', text)
-        # Remove special characters that might interfere with tokenization
-        text = re.sub(r'[^\w\s\.\,\!\?\;\:\"\'\/\(\)\[\]\{\}\-\_\+\=\<\>\@\#\$\%\&\*]', ' ', text)
-        return text.strip()
-    
-    # Clean the texts
-    clean_text1 = clean_text(text1)
-    clean_text2 = clean_text(text2)
-    
-    # Try different methods to split into sentences
-    def get_sentences(text):
-        try:
-            # First try NLTK sentence tokenization
-            return sent_tokenize(text)
-        except Exception:
-            try:
-                # Fall back to regex-based sentence splitting
-                return re.split(r'(?<=[.!?])\s+', text)
-            except Exception:
-                # Ultimate fallback - split by newlines and periods
-                sentences = []
-                for line in text.split('\n'):
-                    if line.strip():
-                        # If line contains multiple sentences, split them
-                        if re.search(r'[.!?]', line):
-                            sentences.extend([s.strip() + "." for s in re.split(r'(?<=[.!?])\s+', line) if s.strip()])
-                        else:
-                            sentences.append(line.strip())
-                return sentences
-    
-    # Get sentences using the robust method
-    sentences1 = get_sentences(clean_text1)
-    sentences2 = get_sentences(clean_text2)
-    
-    # Remove very short or empty sentences
-    sentences1 = [s for s in sentences1 if s and len(s.split()) >= 3]
-    sentences2 = [s for s in sentences2 if s and len(s.split()) >= 3]
+        list: List of dictionaries containing similar sentence pairs, with
+        the offsets of both sentences in their raw texts
+    """
+    if spans1 is None:
+        spans1 = compute_sentence_spans(text1)
+    if spans2 is None:
+        spans2 = compute_sentence_spans(text2)
+    
+    # Sentences of the cleaned texts, without very short or empty ones
+    indices1, sentences1 = spans1.sentences(text1, min_words=3)
+    indices2, sentences2 = spans2.sentences(text2, min_words=3)
     
     similar_sentences = []
     
-    # Find similar sentence pairs
-    for i, s1 in enumerate(sentences1):
-        for j, s2 in enumerate(sentences2):
-            # Calculate similarity using SequenceMatcher
-            similarity = SequenceMatcher(None, s1, s2).ratio()
-            
-            if similarity >= threshold:
-                similar_sentences.append({
-                    "text1_idx": i,
-                    "text1_sentence": s1,
-                    "text2_idx": j,
-                    "text2_sentence": s2,
-                    "similarity": round(similarity * 100, 2)
-                })
+    # Find similar sentence pairs; the shingle index only sends plausible
+    # pairs to SequenceMatcher instead of scoring every combination
+    for i, j, similarity in match_sentences(sentences1, sentences2, threshold):
+        start1, end1 = spans1.span(indices1[i])
+        start2, end2 = spans2.span(indices2[j])
+        similar_sentences.append({
+            "text1_idx": i,
+            "text1_sentence": sentences1[i],
+            "text1_start": start1,
+            "text1_end": end1,
+            "text2_idx": j,
+            "text2_sentence": sentences2[j],
+            "text2_start": start2,
+            "text2_end": end2,
+            "similarity": round(similarity * 100, 2)
+        })
     
     # Sort by similarity score (highest first)
     return sorted(similar_sentences, key=lambda x: x['similarity'], reverse=True)
@@ -188,48 +239,160 @@ def create_pie_chart(data_dict, width=400, height=200):
     drawing.add(pie)
     return drawing
 
-def generate_similarity_report(file1_path, file2_path, output_path):
+@dataclass
+class DocumentAnalysis:
     """
-    Generate a comprehensive similarity report in PDF format comparing two documents.
-    Uses a list-based approach rather than tables for displaying similar content to avoid overlap issues.
-    Shows ALL similar sentences/phrases found, not just the top ones.
+    The result of comparing two documents, computed once and shared by the
+    PDF report and the JSON response.
     """
-    # Extract text from files
-    text1 = extract_text_from_file(file1_path)
-    text2 = extract_text_from_file(file2_path)
-    
-    # Calculate similarity score
-    preprocessed_text1 = preprocess_text(text1)
-    preprocessed_text2 = preprocess_text(text2)
+    file1_name: str
+    file2_name: str
+    text1: str
+    text2: str
+    preprocessed_text1: str
+    preprocessed_text2: str
+    similarity_score: float
+    similar_sentences: list = field(default_factory=list)
+    idf_generation: str = ''
+    
+    @property
+    def similarity_percentage(self):
+        return round(self.similarity_score * 100, 2)
+    
+    @property
+    def words1(self):
+        return len(self.preprocessed_text1.split())
+    
+    @property
+    def words2(self):
+        return len(self.preprocessed_text2.split())
+    
+    def result_fields(self):
+        """
+        The parts of the analysis kept in a ComparisonResult (everything the report needs).
+        """
+        return {
+            'file1_name': self.file1_name,
+            'file2_name': self.file2_name,
+            'similarity_score': self.similarity_score,
+            'similar_sentences': self.similar_sentences,
+            'words1': self.words1,
+            'words2': self.words2,
+            'idf_generation': self.idf_generation
+        }
+
+def analyze_texts(file1_name, file2_name, text1, preprocessed_text1, text2, preprocessed_text2,
+                  counts1=None, counts2=None, spans1=None, spans2=None):
+    """
+    Run the full similarity analysis for two already-extracted documents:
+    TF-IDF cosine score and sentence-level matches. Touches neither the
+    database nor the files, so it can run in a worker process.
+    Stored term counts (see idf_model) and sentence spans (see
+    sentence_spans) of either document can be passed to skip tokenizing
+    and segmenting it again.
     
+    Returns:
+        DocumentAnalysis: the analysis result
+    """
     # Skip empty documents
     if not preprocessed_text1 or not preprocessed_text2:
         raise ValueError("One or both documents appear to be empty or couldn't be processed")
     
-    # Calculate similarity using TF-IDF vectorization and cosine similarity
-    vectorizer = TfidfVectorizer()
+    # TF-IDF cosine similarity under the corpus-wide IDF model
+    idf_generation = ''
     try:
-        tfidf_matrix = vectorizer.fit_transform([preprocessed_text1, preprocessed_text2])
-        similarity_score = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+        idf_generation = get_idf_model().generation
+        similarity_score = text_similarity(preprocessed_text1, preprocessed_text2, counts1, counts2)
     except Exception as e:
         print(f"Error during vectorization: {e}")
-        similarity_score = 0
-    
-    similarity_percentage = round(similarity_score * 100, 2)
+        similarity_score = 0.0
     
     # Find similar sentences - use a slightly lower threshold to catch more matches
-    similar_sentences = find_similar_sentences(text1, text2, threshold=0.6)
+    similar_sentences = find_similar_sentences(text1, text2, threshold=settings.SENTENCE_MATCH_THRESHOLD,
+                                               spans1=spans1, spans2=spans2)
+    
+    return DocumentAnalysis(
+        file1_name=file1_name,
+        file2_name=file2_name,
+        text1=text1,
+        text2=text2,
+        preprocessed_text1=preprocessed_text1,
+        preprocessed_text2=preprocessed_text2,
+        similarity_score=similarity_score,
+        similar_sentences=similar_sentences,
+        idf_generation=idf_generation
+    )
+
+def analyze_documents(file1_path, file2_path, file1_hash=None, file2_hash=None):
+    """
+    Run the full similarity analysis for two files using their cached text.
     
-    # Calculate word count statistics
-    words1 = len(preprocessed_text1.split())
-    words2 = len(preprocessed_text2.split())
+    Returns:
+        DocumentAnalysis: the analysis result
+    """
+    # Get text from the extraction cache
+    text1, preprocessed_text1, _ = get_document_text(file1_path, file1_hash)
+    text2, preprocessed_text2, _ = get_document_text(file2_path, file2_hash)
     
-    # Generate PDF report
-    doc = SimpleDocTemplate(output_path, pagesize=A4, 
-                          rightMargin=36, leftMargin=36, 
-                          topMargin=50, bottomMargin=18)
+    return analyze_texts(
+        os.path.basename(file1_path), os.path.basename(file2_path),
+        text1, preprocessed_text1, text2, preprocessed_text2
+    )
+
+def generate_similarity_report(file1_path, file2_path, output_path, file1_hash=None, file2_hash=None):
+    """
+    Analyze two documents and render the PDF similarity report.
+    """
+    analysis = analyze_documents(file1_path, file2_path, file1_hash, file2_hash)
+    return render_similarity_report(analysis, output_path)
+
+class FlowableStream(list):
+    """
+    A list of flowables that is filled lazily from an iterator.
+
+    doc.build() consumes its flowables from the front of a list and calls
+    len() before handling each one, so topping the list up in __len__ keeps
+    only `lookahead` flowables in memory, however long the report is.
+    """
+
+    def __init__(self, flowables, lookahead=50):
+        super().__init__()
+        self._source = iter(flowables)
+        self.lookahead = lookahead
+
+    def __len__(self):
+        while list.__len__(self) < self.lookahead:
+            flowable = next(self._source, None)
+            if flowable is None:
+                break
+            self.append(flowable)
+        return list.__len__(self)
+
+def build_pdf(output_path, flowables, **doc_kwargs):
+    """
+    Build a PDF from an iterable of flowables. The file is written under a
+    temporary name and renamed into place, so a report is never served half-written.
+    The temporary name is unique, so threads rendering the same report don't clash.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(output_path) + '.',
+                                    dir=os.path.dirname(output_path) or None)
+    os.close(fd)
+    doc = SimpleDocTemplate(tmp_path, pagesize=A4, **doc_kwargs)
+    try:
+        doc.build(FlowableStream(flowables))
+        # mkstemp creates the file private to its owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+def get_report_styles():
+    """
+    Return the paragraph styles shared by the similarity report sections.
+    """
     styles = getSampleStyleSheet()
-    elements = []
     
     # Custom styles
     title_style = ParagraphStyle(
@@ -283,19 +446,66 @@ def generate_similarity_report(file1_path, file2_path, output_path):
         spaceAfter=2
     )
     
+    return {
+        'styles': styles,
+        'title': title_style,
+        'subtitle': subtitle_style,
+        'heading': heading_style,
+        'subheading': subheading_style,
+        'normal': normal_style,
+        'match': match_style
+    }
+
+def render_similarity_report(analysis, output_path, top_k=None, texts=None):
+    """
+    Render a comprehensive similarity report in PDF format from a DocumentAnalysis.
+    Uses a list-based approach rather than tables for displaying similar content to avoid overlap issues.
+    
+    The report is built page by page from a generator, so memory stays bounded
+    however many similar sentences there are. Only the top_k most similar
+    matches (SIMILARITY_REPORT_TOP_K by default, 0 for all) are shown in full;
+    the rest are summarized in an appendix. Both documents follow in full,
+    matches highlighted, when their raw texts are known: from the analysis
+    itself, or passed as texts=(text1, text2).
+    """
+    if top_k is None:
+        top_k = settings.SIMILARITY_REPORT_TOP_K
+    return build_pdf(
+        output_path, iter_similarity_report(analysis, top_k, texts),
+        rightMargin=36, leftMargin=36, topMargin=50, bottomMargin=18
+    )
+
+def iter_similarity_report(analysis, top_k=0, texts=None):
+    """
+    Yield the flowables of a similarity report, in order. With top_k=0 every match is shown in full.
+    """
+    if texts is None:
+        texts = (getattr(analysis, 'text1', ''), getattr(analysis, 'text2', ''))
+    similarity_percentage = analysis.similarity_percentage
+    similar_sentences = analysis.similar_sentences
+    
+    report_styles = get_report_styles()
+    styles = report_styles['styles']
+    title_style = report_styles['title']
+    subtitle_style = report_styles['subtitle']
+    heading_style = report_styles['heading']
+    subheading_style = report_styles['subheading']
+    normal_style = report_styles['normal']
+    match_style = report_styles['match']
+    
     # Title and header
-    elements.append(Paragraph("Document Similarity Analysis Report", title_style))
-    elements.append(Paragraph(f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", subtitle_style))
-    elements.append(HorizontalLineFlowable(450, thickness=2, color=darkblue))
-    elements.append(Spacer(1, 20))
+    yield Paragraph("Document Similarity Analysis Report", title_style)
+    yield Paragraph(f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", subtitle_style)
+    yield HorizontalLineFlowable(450, thickness=2, color=darkblue)
+    yield Spacer(1, 20)
     
     # Summary section
-    elements.append(Paragraph("Executive Summary", heading_style))
-    elements.append(Spacer(1, 6))
+    yield Paragraph("Executive Summary", heading_style)
+    yield Spacer(1, 6)
     
     # Similarity score with color-coding
     score_color = "red" if similarity_percentage > 50 else "black"
-    elements.append(Paragraph(f"<b>Overall Similarity Score:</b> <font color='{score_color}'>{similarity_percentage}%</font>", normal_style))
+    yield Paragraph(f"<b>Overall Similarity Score:</b> <font color='{score_color}'>{similarity_percentage}%</font>", normal_style)
     
     # Interpretation of similarity score
     interpretation = ""
@@ -310,30 +520,30 @@ def generate_similarity_report(file1_path, file2_path, output_path):
     else:
         interpretation = "The documents are extremely similar or potentially identical in content."
     
-    elements.append(Paragraph(f"<b>Interpretation:</b> {interpretation}", normal_style))
-    elements.append(Spacer(1, 12))
+    yield Paragraph(f"<b>Interpretation:</b> {interpretation}", normal_style)
+    yield Spacer(1, 12)
     
     # Pie chart of similar vs. different content
-    elements.append(Paragraph("Similarity Visualization", subheading_style))
-    elements.append(Spacer(1, 6))
+    yield Paragraph("Similarity Visualization", subheading_style)
+    yield Spacer(1, 6)
     
     pie_data = {
         "Similar Content": similarity_percentage,
         "Different Content": 100 - similarity_percentage
     }
     pie_chart = create_pie_chart(pie_data)
-    elements.append(pie_chart)
-    elements.append(Spacer(1, 12))
+    yield pie_chart
+    yield Spacer(1, 12)
     
     # File information
-    elements.append(Paragraph("Documents Compared", heading_style))
-    elements.append(Spacer(1, 6))
+    yield Paragraph("Documents Compared", heading_style)
+    yield Spacer(1, 6)
     
     # Create a table for file information
     file_data = [
         ["Property", "Document 1", "Document 2"],
-        ["Filename", os.path.basename(file1_path), os.path.basename(file2_path)],
-        ["Word Count", str(words1), str(words2)],
+        ["Filename", analysis.file1_name, analysis.file2_name],
+        ["Word Count", str(analysis.words1), str(analysis.words2)],
     ]
     
     file_table = Table(file_data, colWidths=[100, 200, 200])
@@ -348,35 +558,40 @@ def generate_similarity_report(file1_path, file2_path, output_path):
         ('PADDING', (0, 0), (-1, -1), 6),
     ]))
     
-    elements.append(file_table)
-    elements.append(Spacer(1, 20))
+    yield file_table
+    yield Spacer(1, 20)
     
-    # Similar content section - display ALL similar phrases found
+    # Similar content section - the top_k most similar phrases in full
     if similar_sentences:
-        elements.append(Paragraph("Similar Content Analysis", heading_style))
-        elements.append(Spacer(1, 6))
+        detailed = similar_sentences
+        remaining = []
+        if top_k and len(similar_sentences) > top_k:
+            ranked = sorted(similar_sentences, key=lambda match: match['similarity'], reverse=True)
+            detailed, remaining = ranked[:top_k], ranked[top_k:]
+        
+        yield Paragraph("Similar Content Analysis", heading_style)
+        yield Spacer(1, 6)
         
-        elements.append(Paragraph(f"All similar phrases found ({len(similar_sentences)} total):", normal_style))
-        elements.append(Spacer(1, 10))
+        if remaining:
+            yield Paragraph(f"The {len(detailed)} most similar of {len(similar_sentences)} phrases found "
+                            f"(the rest are summarized in the appendix):", normal_style)
+        else:
+            yield Paragraph(f"All similar phrases found ({len(similar_sentences)} total):", normal_style)
+        yield Spacer(1, 10)
         
-        # Create small groups for pairs of similar phrases for better organization
         # Creates a new page after every 10 matches to avoid PDF length issues
-        total_matches = len(similar_sentences)
+        total_matches = len(detailed)
         matches_per_page = 10
-        current_match = 0
         
-        # Loop through all similar sentences
-        for i, match in enumerate(similar_sentences):
+        for i, match in enumerate(detailed):
             # Insert page break after every matches_per_page items (except the first page)
             if i > 0 and i % matches_per_page == 0:
-                elements.append(PageBreak())
-                elements.append(Paragraph(f"Similar Content Analysis (continued)", heading_style))
-                elements.append(Spacer(1, 10))
+                yield PageBreak()
+                yield Paragraph(f"Similar Content Analysis (continued)", heading_style)
+                yield Spacer(1, 10)
             
             # Create a match header with match number and similarity score
-            current_match += 1
-            match_num = Paragraph(f"<b>Match {current_match}/{total_matches}</b> <font color='blue'>({match['similarity']}% similarity)</font>", normal_style)
-            elements.append(match_num)
+            yield Paragraph(f"<b>Match {i + 1}/{total_matches}</b> <font color='blue'>({match['similarity']}% similarity)</font>", normal_style)
             
             # Truncate long text to avoid overflow but show more content
             max_display_chars = 100
@@ -392,81 +607,171 @@ def generate_similarity_report(file1_path, file2_path, output_path):
                 doc2_text = doc2_text[:max_display_chars] + "..."
             
             # Add content as indented paragraphs
-            elements.append(Paragraph(f"<b>Document 1:</b> {doc1_text}", match_style))
-            elements.append(Paragraph(f"<b>Document 2:</b> {doc2_text}", match_style))
+            yield Paragraph(f"<b>Document 1:</b> {doc1_text}", match_style)
+            yield Paragraph(f"<b>Document 2:</b> {doc2_text}", match_style)
             
             # Add a separator line between matches
-            elements.append(Spacer(1, 5))
-            elements.append(HorizontalLineFlowable(400, thickness=0.5, color=lightgrey))
-            elements.append(Spacer(1, 5))
+            yield Spacer(1, 5)
+            yield HorizontalLineFlowable(400, thickness=0.5, color=lightgrey)
+            yield Spacer(1, 5)
+        
+        if remaining:
+            yield from iter_match_summary_appendix(remaining, report_styles)
     else:
-        elements.append(Paragraph("No significant similar sentences found between the documents.", normal_style))
+        yield Paragraph("No significant similar sentences found between the documents.", normal_style)
+    
+    # Both documents in full with their matches highlighted
+    if similar_sentences:
+        yield from iter_highlighted_documents(analysis, texts, report_styles)
     
     # Footer with report details
-    elements.append(PageBreak())
-    elements.append(Paragraph("Report Details", heading_style))
-    elements.append(HorizontalLineFlowable(450, thickness=1, color=grey))
-    elements.append(Spacer(1, 10))
+    yield PageBreak()
+    yield Paragraph("Report Details", heading_style)
+    yield HorizontalLineFlowable(450, thickness=1, color=grey)
+    yield Spacer(1, 10)
     
-    elements.append(Paragraph("<b>Analysis Method:</b> This report uses TF-IDF (Term Frequency-Inverse Document Frequency) vectorization and cosine similarity metrics to analyze document similarity. Additionally, sentence-level comparison is performed using sequence matching algorithms.", normal_style))
-    elements.append(Spacer(1, 6))
+    yield Paragraph("<b>Analysis Method:</b> This report uses TF-IDF (Term Frequency-Inverse Document Frequency) vectorization and cosine similarity metrics to analyze document similarity. Additionally, sentence-level comparison is performed using sequence matching algorithms.", normal_style)
+    yield Spacer(1, 6)
     
-    elements.append(Paragraph("<b>Interpretation Guide:</b>", normal_style))
-    elements.append(Paragraph("• 0-20%: Very low similarity", normal_style))
-    elements.append(Paragraph("• 21-40%: Low similarity", normal_style))
-    elements.append(Paragraph("• 41-60%: Moderate similarity", normal_style))
-    elements.append(Paragraph("• 61-80%: High similarity", normal_style))
-    elements.append(Paragraph("• 81-100%: Very high similarity", normal_style))
+    yield Paragraph("<b>Interpretation Guide:</b>", normal_style)
+    yield Paragraph("• 0-20%: Very low similarity", normal_style)
+    yield Paragraph("• 21-40%: Low similarity", normal_style)
+    yield Paragraph("• 41-60%: Moderate similarity", normal_style)
+    yield Paragraph("• 61-80%: High similarity", normal_style)
+    yield Paragraph("• 81-100%: Very high similarity", normal_style)
     
     # Disclaimer
-    elements.append(Spacer(1, 20))
-    elements.append(HorizontalLineFlowable(450, thickness=1, color=grey))
-    elements.append(Spacer(1, 6))
-    elements.append(Paragraph("<i>Disclaimer: This automated similarity analysis provides an approximation of content similarity. The results should be interpreted by a human reviewer for context-appropriate assessment.</i>", styles["Italic"]))
-    
-    # Generate the PDF
-    doc.build(elements)
-    return output_path
+    yield Spacer(1, 20)
+    yield HorizontalLineFlowable(450, thickness=1, color=grey)
+    yield Spacer(1, 6)
+    yield Paragraph("<i>Disclaimer: This automated similarity analysis provides an approximation of content similarity. The results should be interpreted by a human reviewer for context-appropriate assessment.</i>", styles["Italic"])
 
-def calculate_similarity(file1_path, file2_path):
+def iter_highlighted_documents(analysis, texts, report_styles):
     """
-    Calculate the similarity between two files and generate a detailed report.
-    Returns a dictionary with similarity score and report path.
+    Yield each document whose raw text is known in full, with every matched
+    sentence highlighted. Matches carry their sentences' offsets; matches
+    stored before offsets were recorded are found in the text instead.
     """
-    # Ensure the output directory exists
-    reports_dir = os.path.join('media', 'similarity_reports')
-    os.makedirs(reports_dir, exist_ok=True)
-    
-    # Generate a unique filename for the report
-    report_filename = get_report_filename(file1_path, file2_path)
-    output_path = os.path.join(reports_dir, report_filename)
-    
-    # Generate the report
-    try:
-        report_path = generate_similarity_report(file1_path, file2_path, output_path)
-        
-        # Extract text from files for basic similarity score
-        text1 = extract_text_from_file(file1_path)
-        text2 = extract_text_from_file(file2_path)
+    file_names = (analysis.file1_name, analysis.file2_name)
+    for number, (file_name, text) in enumerate(zip(file_names, texts), start=1):
+        if not text:
+            continue
+        start_key, end_key = f'text{number}_start', f'text{number}_end'
+        spans = [
+            (match[start_key], match[end_key], None)
+            for match in analysis.similar_sentences
+            if start_key in match and match[end_key] <= len(text)
+        ]
+        older = {
+            match[f'text{number}_sentence']: None
+            for match in analysis.similar_sentences if start_key not in match
+        }
+        if older:
+            spans.extend((start, end, None) for start, end, _ in locate_passages(text, older))
         
-        # Calculate similarity score
-        preprocessed_text1 = preprocess_text(text1)
-        preprocessed_text2 = preprocess_text(text2)
+        yield PageBreak()
+        yield Paragraph(f"Document {number} with Highlighted Matches: {escape(file_name)}", report_styles['heading'])
+        yield Spacer(1, 6)
+        yield Paragraph("<i>Sentences highlighted in yellow with red text are similar to the other document.</i>",
+                        report_styles['styles']["Italic"])
+        yield Spacer(1, 10)
         
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform([preprocessed_text1, preprocessed_text2])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+        for paragraph, _ in iter_highlighted_paragraphs(text, merge_spans(spans)):
+            if paragraph is None:
+                yield Spacer(1, 6)
+            else:
+                yield Paragraph(paragraph, report_styles['normal'])
+
+def iter_match_summary_appendix(matches, report_styles):
+    """
+    Yield an appendix summarizing matches not shown in full: how many fall in
+    each similarity band and how many distinct sentences of each document they cover.
+    """
+    yield PageBreak()
+    yield Paragraph("Appendix: Remaining Similar Content", report_styles['heading'])
+    yield Spacer(1, 6)
+    yield Paragraph(f"{len(matches)} further similar phrases were found and are summarized below.", report_styles['normal'])
+    yield Spacer(1, 10)
+    
+    band_data = [["Similarity", "Matches"]]
+    for low, high in [(90, 100), (80, 90), (70, 80), (60, 70)]:
+        count = sum(1 for match in matches if low <= match['similarity'] < high or match['similarity'] == high == 100)
+        band_data.append([f"{low}-{high}%", str(count)])
+    band_data.append(["Sentences in Document 1", str(len({match['text1_idx'] for match in matches}))])
+    band_data.append(["Sentences in Document 2", str(len({match['text2_idx'] for match in matches}))])
+    
+    band_table = Table(band_data, colWidths=[200, 100])
+    band_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ]))
+    yield band_table
+
+def calculate_text_similarity(file1_name, file2_name, text1, preprocessed_text1, text2, preprocessed_text2,
+                              counts1=None, counts2=None, spans1=None, spans2=None):
+    """
+    Calculate the similarity between two already-extracted documents.
+    Returns a dictionary with the similarity score and the structured analysis
+    in 'comparison'.
+    
+    The PDF itself is not rendered here: the caller stores the analysis as a
+    ComparisonResult, which names the report, and the report is rendered from
+    it on first request.
+    """
+    try:
+        analysis = analyze_texts(file1_name, file2_name, text1, preprocessed_text1, text2, preprocessed_text2,
+                                 counts1, counts2, spans1, spans2)
         
         return {
-            'similarity_score': round(similarity * 100, 2),
-            'report_path': report_path,
-            'report_filename': report_filename
+            'similarity_score': analysis.similarity_percentage,
+            'report_path': None,
+            'report_filename': None,
+            'comparison': analysis.result_fields()
+        }
+    except Exception as e:
+        print(f"Error analyzing documents: {e}")
+        return {
+            'similarity_score': 0,
+            'error': str(e),
+            'report_path': None,
+            'report_filename': None
         }
+
+def calculate_similarity(file1_path, file2_path, file1_hash=None, file2_hash=None):
+    """
+    Calculate the similarity between two files.
+    Returns a dictionary as described in calculate_text_similarity.
+    Known content hashes can be passed to skip re-hashing the files.
+    """
+    try:
+        text1, preprocessed_text1, file1_hash = get_document_text(file1_path, file1_hash)
+        text2, preprocessed_text2, file2_hash = get_document_text(file2_path, file2_hash)
     except Exception as e:
-        print(f"Error generating similarity report: {e}")
+        print(f"Error reading documents: {e}")
         return {
             'similarity_score': 0,
             'error': str(e),
             'report_path': None,
             'report_filename': None
-        }
\ No newline at end of file
+        }
+    
+    try:
+        counts = get_document_counts([file1_hash, file2_hash])
+    except Exception as e:
+        print(f"Error loading term counts: {e}")
+        counts = {}
+    
+    try:
+        spans = get_document_sentences([file1_hash, file2_hash])
+    except Exception as e:
+        print(f"Error loading sentence spans: {e}")
+        spans = {}
+    
+    return calculate_text_similarity(
+        os.path.basename(file1_path), os.path.basename(file2_path),
+        text1, preprocessed_text1, text2, preprocessed_text2,
+        counts.get(file1_hash), counts.get(file2_hash),
+        spans.get(file1_hash), spans.get(file2_hash)
+    )
@@ -5,9 +5,9 @@ from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework import permissions #if want to access to data must want cedentials
 from . import models
-from .models import St_Assignment
+from .models import St_Assignment, SimilarityJob, SimilarityReport
 from django.core.exceptions import ValidationError
-from .utils import calculate_similarity, extract_text_from_file
+from .utils import extract_text_from_file, cache_assignment_text, get_document_text
 import json
 from django.http import HttpResponseBadRequest, JsonResponse,HttpResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -23,10 +23,18 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError
 from django.http import FileResponse
 from django.views.decorators.http import require_GET
-import mimetypes,os
+import mimetypes,os,time
 import logging
 from django.conf import settings
-from .web_similarity import analyze_assignment_web_similarity
+from .batch_similarity import build_similarity_matrix
+from .jobs import enqueue_job
+from .corpus_index import query_corpus
+from .comparison import get_report_path
+from .report_catalogue import delete_catalogued_report, list_catalogued_reports
+from .class_similarity import get_class_matrix, get_suspicious_pairs
+from .fingerprints import find_fingerprint_matches
+from .idf_model import get_document_counts
+from .extraction import ExtractionError, get_extraction_metrics
 
 
 #we use generics method to get post and delete functions.when we useprevious method using API view then we have to mension all input Fields
@@ -281,6 +289,12 @@ class AssignmentList(generics.ListCreateAPIView):
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             self.perform_create(serializer)
+            # Extract and cache the text once so later checks never re-run textract
+            try:
+                cache_assignment_text(serializer.instance)
+                store_document_counts(serializer.instance)
+            except ExtractionError as e:
+                logger.warning(f"Assignment {serializer.instance.id} saved without text: {str(e)}")
             headers = self.get_success_headers(serializer.data)
             return Response(
                 serializer.data,
@@ -318,7 +332,13 @@ class AssignmentList(generics.ListCreateAPIView):
                 except Exception as e:
                     print(f"Error deleting old file: {e}")
             
-            serializer.save()
+            assignment = serializer.save()
+            if 'file' in request.FILES:
+                try:
+                    cache_assignment_text(assignment)
+                    store_document_counts(assignment)
+                except ExtractionError as e:
+                    logger.warning(f"Assignment {assignment.id} saved without text: {str(e)}")
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -390,6 +410,18 @@ class LecturerCourseList(generics.ListAPIView):
 
     
 #Similarity checker Assignments
+def store_document_counts(assignment):
+    """
+    Count an uploaded St_Assignment or Assignment into the shared IDF model and
+    store its term counts, so batch comparisons never have to read its text.
+    """
+    if not assignment.content_hash:
+        return
+    try:
+        get_document_counts([assignment.content_hash])
+    except Exception as e:
+        logger.exception(f"Error storing term counts for {assignment.__class__.__name__} {assignment.id}: {str(e)}")
+
 @csrf_exempt
 def upload_assignment(request):
     if request.method == 'POST':
@@ -419,12 +451,31 @@ def upload_assignment(request):
                     'message': 'File size should not exceed 10MB'
                 }, status=400)
             
-            assignment = St_Assignment.objects.create(title=title, file=file)
+            # Optional course the submission is compared within
+            course = None
+            course_id = request.POST.get('course_id')
+            if course_id:
+                course = models.Course.objects.filter(id=course_id).first()
+                if course is None:
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': f'Course with ID {course_id} not found'
+                    }, status=404)
+            
+            assignment = St_Assignment.objects.create(title=title, file=file, course=course)
+            
+            # Extraction, fingerprints and vectors are computed by the similarity
+            # worker right away, so they are ready before anyone compares
+            job = enqueue_job(SimilarityJob.KIND_PREPROCESS, {'assignment_id': assignment.id})
             
             return JsonResponse({
                 'status': 'success',
                 'assignment_id': assignment.id,
                 'title': assignment.title,
+                'course_id': assignment.course_id,
+                'processing_status': assignment.processing_status,
+                'processing_job_id': job.id,
+                'processing_status_url': job.to_dict()['status_url'],
                 'file_url': assignment.file.url if assignment.file else None,
                 'uploaded_at': assignment.uploaded_At.isoformat() if hasattr(assignment, 'uploaded_At') else None
             })
@@ -448,6 +499,7 @@ def compare_assignments(request):
         try:
             data = json.loads(request.body)
             assignment_ids = data.get('assignment_ids', [])
+            return_matrix = data.get('return_matrix', False)
             
             if len(assignment_ids) < 2:
                 return JsonResponse({
@@ -464,54 +516,23 @@ def compare_assignments(request):
                     'message': 'One or more selected assignments not found'
                 }, status=404)
             
-            results = []
-            
-            # Compare each pair of assignments
-            for i in range(len(assignments)):
-                for j in range(i + 1, len(assignments)):
-                    try:
-                        similarity_result = calculate_similarity(
-                            assignments[i].file.path,
-                            assignments[j].file.path
-                        )
-                        
-                        # Build result object with improved information
-                        result = {
-                            'assignment1_id': assignments[i].id,
-                            'assignment1_title': assignments[i].title,
-                            'assignment2_id': assignments[j].id,
-                            'assignment2_title': assignments[j].title,
-                            'similarity_score': similarity_result.get('similarity_score', 0),
-                        }
-                        
-                        # Add report path if available
-                        if similarity_result.get('report_path'):
-                            report_filename = os.path.basename(similarity_result['report_path'])
-                            result.update({
-                                'report_url': f'/api/reports/{report_filename}',
-                                'download_url': f'/api/download-report/{report_filename}',
-                                'report_filename': report_filename
-                            })
-                        
-                        # Add error if present
-                        if 'error' in similarity_result:
-                            result['error'] = similarity_result['error']
-                            
-                        results.append(result)
-                    except Exception as e:
-                        results.append({
-                            'assignment1_id': assignments[i].id,
-                            'assignment1_title': assignments[i].title,
-                            'assignment2_id': assignments[j].id,
-                            'assignment2_title': assignments[j].title,
-                            'error': f'Failed to compare: {str(e)}',
-                            'similarity_score': None
-                        })
+            # Fast path: one TF-IDF fit and one sparse product for the whole batch
+            if return_matrix:
+                matrix_result = build_similarity_matrix(assignments)
+                return JsonResponse({
+                    'status': 'success',
+                    **matrix_result
+                })
+            
+            # Pairwise analysis runs in the similarity worker; return the job at once
+            job = enqueue_job(SimilarityJob.KIND_COMPARE, {
+                'assignment_ids': [assignment.id for assignment in assignments]
+            })
             
             return JsonResponse({
-                'status': 'success',
-                'results': results
-            })
+                'status': 'queued',
+                **job.to_dict()
+            }, status=202)
             
         except json.JSONDecodeError:
             return JsonResponse({
@@ -530,6 +551,8 @@ def get_assignments(request):
     if request.method == 'GET':
         try:
             assignments = St_Assignment.objects.all().order_by('-uploaded_At')
+            if request.GET.get('course_id'):
+                assignments = assignments.filter(course_id=request.GET['course_id'])
             
             # Sort by date from newest to oldest
             assignments_data = []
@@ -538,6 +561,9 @@ def get_assignments(request):
                     'id': assignment.id,
                     'title': assignment.title,
                     'file_url': assignment.file.url if assignment.file else None,
+                    'course_id': assignment.course_id,
+                    'processing_status': assignment.processing_status,
+                    'processing_error': assignment.processing_error or None,
                 }
                 
                 # Add uploaded_at if available
@@ -559,10 +585,10 @@ def get_assignments(request):
     return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
 
 def serve_report(request, filename):
-    """Serve a similarity report PDF with improved error handling."""
+    """Serve a similarity report PDF, rendering it on first request."""
     try:
-        file_path = os.path.join(settings.SIMILARITY_REPORTS_DIR, filename)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
+        file_path = get_report_path(filename)
+        if file_path:
             return FileResponse(open(file_path, 'rb'), content_type='application/pdf')
         else:
             return HttpResponse('Report file not found', status=404)
@@ -570,10 +596,10 @@ def serve_report(request, filename):
         return HttpResponse(f'Error serving report: {str(e)}', status=500)
 
 def download_report(request, filename):
-    """Download a similarity report PDF with improved handling."""
+    """Download a similarity report PDF, rendering it on first request."""
     try:
-        file_path = os.path.join(settings.SIMILARITY_REPORTS_DIR, filename)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
+        file_path = get_report_path(filename)
+        if file_path:
             response = FileResponse(open(file_path, 'rb'), content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
             return response
@@ -584,39 +610,23 @@ def download_report(request, filename):
 
 # Add this new endpoint to list all available reports
 def list_reports(request):
-    """List all available similarity reports."""
+    """
+    List similarity reports, newest first, from the report catalogue.
+    Supports cursor pagination and filters; see list_catalogued_reports.
+    """
     try:
-        reports_dir = settings.SIMILARITY_REPORTS_DIR
-        if not os.path.exists(reports_dir):
-            return JsonResponse({
-                'status': 'success',
-                'reports': []
-            })
-            
-        # Get all PDF files in the reports directory
-        report_files = [f for f in os.listdir(reports_dir) if f.endswith('.pdf')]
-        
-        # Get file details
-        reports = []
-        for filename in report_files:
-            file_path = os.path.join(reports_dir, filename)
-            file_stats = os.stat(file_path)
-            
-            reports.append({
-                'filename': filename,
-                'size': file_stats.st_size,
-                'created': file_stats.st_ctime,
-                'view_url': f'/api/reports/{filename}',
-                'download_url': f'/api/download-report/{filename}'
-            })
-            
-        # Sort by creation time (newest first)
-        reports.sort(key=lambda x: x['created'], reverse=True)
+        reports, next_cursor = list_catalogued_reports(SimilarityReport.KIND_PAIRWISE, request.GET)
         
         return JsonResponse({
             'status': 'success',
-            'reports': reports
+            'reports': reports,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid filter: {str(e)}'
+        }, status=400)
     except Exception as e:
         return JsonResponse({
             'status': 'error',
@@ -634,15 +644,12 @@ def delete_report(request, filename):
         }, status=405)
         
     try:
-        file_path = os.path.join(settings.SIMILARITY_REPORTS_DIR, filename)
-        if not os.path.exists(file_path):
+        # Removes the catalogue entry, the stored result and the PDF if rendered
+        if not delete_catalogued_report(filename, SimilarityReport.KIND_PAIRWISE):
             return JsonResponse({
                 'status': 'error',
                 'message': 'Report not found'
             }, status=404)
-            
-        # Delete the file
-        os.remove(file_path)
         
         return JsonResponse({
             'status': 'success',
@@ -657,13 +664,14 @@ def delete_report(request, filename):
 @csrf_exempt
 def check_web_similarity(request):
     """
-    Check an assignment against web content for similarity using CrewAI agents.
+    Queue a check of an assignment against web content for similarity.
     
     POST parameters:
     - assignment_id: ID of the assignment to check
     
     Returns:
-    - JSON response with analysis results and report path
+    - JSON response with the queued job id; poll /api/jobs/<id>/ for progress
+      and fetch the analysis results from /api/jobs/<id>/result/
     """
     if request.method != 'POST':
         return JsonResponse({
@@ -690,39 +698,17 @@ def check_web_similarity(request):
                 'message': f'Assignment with ID {assignment_id} not found'
             }, status=404)
         
-        # Get assignment file path
-        assignment_path = assignment.file.path
-        
-        # Define output directory for reports
-        web_reports_dir = os.path.join(settings.SIMILARITY_REPORTS_DIR, 'web_reports')
-        os.makedirs(web_reports_dir, exist_ok=True)
-        
-        logger.info(f"Starting web similarity analysis for assignment {assignment_id}")
-        
-        # Analyze web similarity using CrewAI
-        result = analyze_assignment_web_similarity(assignment_path, web_reports_dir)
-        
-        if 'error' in result:
-            logger.error(f"Web similarity analysis failed: {result['error']}")
-            return JsonResponse({
-                'status': 'error',
-                'message': result['error']
-            }, status=500)
+        # The analysis runs in the similarity worker; return the job at once
+        job = enqueue_job(SimilarityJob.KIND_WEB, {'assignment_id': assignment.id})
         
-        # Return success response
-        report_filename = os.path.basename(result['report_path'])
-        
-        logger.info(f"Web similarity analysis completed for assignment {assignment_id}")
+        logger.info(f"Queued web similarity analysis for assignment {assignment_id} as job {job.id}")
         
         return JsonResponse({
-            'status': 'success',
-            'assignment_id': assignment_id,
+            'status': 'queued',
+            'assignment_id': assignment.id,
             'assignment_title': assignment.title,
-            'web_similarity_score': result['web_similarity_score'],
-            'analysis_summary': result['analysis_summary'],
-            'report_url': f'/api/web-reports/{report_filename}',
-            'download_url': f'/api/download-web-report/{report_filename}'
-        })
+            **job.to_dict()
+        }, status=202)
         
     except Exception as e:
         logger.exception(f"Unexpected error in web similarity check: {str(e)}")
@@ -754,35 +740,23 @@ def download_web_report(request, filename):
         return HttpResponse('Report file not found', status=404)
 
 def list_web_reports(request):
-    """List all available web similarity reports."""
+    """
+    List web similarity reports, newest first, from the report catalogue.
+    Supports cursor pagination and filters; see list_catalogued_reports.
+    """
     try:
-        web_reports_dir = os.path.join(settings.SIMILARITY_REPORTS_DIR, 'web_reports')
-        os.makedirs(web_reports_dir, exist_ok=True)
-        
-        # Get all PDF files in the reports directory
-        report_files = [f for f in os.listdir(web_reports_dir) if f.endswith('.pdf')]
-        
-        # Get file details
-        reports = []
-        for filename in report_files:
-            file_path = os.path.join(web_reports_dir, filename)
-            file_stats = os.stat(file_path)
-            
-            reports.append({
-                'filename': filename,
-                'size': file_stats.st_size,
-                'created': file_stats.st_ctime,
-                'view_url': f'/api/web-reports/{filename}',
-                'download_url': f'/api/download-web-report/{filename}'
-            })
-            
-        # Sort by creation time (newest first)
-        reports.sort(key=lambda x: x['created'], reverse=True)
+        reports, next_cursor = list_catalogued_reports(SimilarityReport.KIND_WEB, request.GET)
         
         return JsonResponse({
             'status': 'success',
-            'reports': reports
+            'reports': reports,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid filter: {str(e)}'
+        }, status=400)
     except Exception as e:
         logger.exception(f"Error listing web reports: {str(e)}")
         return JsonResponse({
@@ -800,17 +774,13 @@ def delete_web_report(request, filename):
         }, status=405)
         
     try:
-        web_reports_dir = os.path.join(settings.SIMILARITY_REPORTS_DIR, 'web_reports')
-        file_path = os.path.join(web_reports_dir, filename)
-        
-        if not os.path.exists(file_path):
+        # Removes the catalogue entry and the PDF
+        if not delete_catalogued_report(filename, SimilarityReport.KIND_WEB):
             return JsonResponse({
                 'status': 'error',
                 'message': 'Report not found'
             }, status=404)
-            
-        # Delete the file
-        os.remove(file_path)
+        
         logger.info(f"Deleted web similarity report: {filename}")
         
         return JsonResponse({
@@ -823,6 +793,274 @@ def delete_web_report(request, filename):
             'status': 'error',
             'message': f'Error deleting report: {str(e)}'
         }, status=500)
+
+@csrf_exempt
+def submit_job(request):
+    """
+    Submit a similarity job.
+    
+    POST parameters:
+    - kind: 'compare' (with assignment_ids) or 'web' (with assignment_id)
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON data'}, status=400)
+    
+    kind = data.get('kind')
+    if kind == SimilarityJob.KIND_COMPARE:
+        assignment_ids = data.get('assignment_ids', [])
+        if len(assignment_ids) < 2:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Please select at least 2 assignments to compare'
+            }, status=400)
+        if St_Assignment.objects.filter(id__in=assignment_ids).count() != len(set(assignment_ids)):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'One or more selected assignments not found'
+            }, status=404)
+        params = {'assignment_ids': assignment_ids}
+    elif kind == SimilarityJob.KIND_WEB:
+        assignment_id = data.get('assignment_id')
+        if not St_Assignment.objects.filter(id=assignment_id).exists():
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Assignment with ID {assignment_id} not found'
+            }, status=404)
+        params = {'assignment_id': assignment_id}
+    else:
+        return JsonResponse({
+            'status': 'error',
+            'message': f"Unknown job kind. Allowed kinds: {SimilarityJob.KIND_COMPARE}, {SimilarityJob.KIND_WEB}"
+        }, status=400)
+    
+    job = enqueue_job(kind, params)
+    return JsonResponse({'status': 'queued', **job.to_dict()}, status=202)
+
+def job_status(request, job_id):
+    """Return the status and progress of a similarity job."""
+    job = SimilarityJob.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    
+    return JsonResponse({'status': 'success', 'job': job.to_dict()})
+
+def job_result(request, job_id):
+    """Return the result of a finished similarity job."""
+    job = SimilarityJob.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    
+    if job.status == SimilarityJob.STATUS_FAILED:
+        return JsonResponse({
+            'status': 'error',
+            'message': job.error,
+            'job': job.to_dict()
+        }, status=500)
+    
+    if job.status != SimilarityJob.STATUS_COMPLETED:
+        # Running comparison jobs publish the pairs finished so far
+        return JsonResponse({
+            'status': job.status,
+            'message': 'Job has not finished yet',
+            'job': job.to_dict(),
+            'partial_result': job.result
+        }, status=202)
+    
+    return JsonResponse({'status': 'success', **job.result})
+
+@csrf_exempt
+def query_corpus_index(request):
+    """
+    Find the sources in the local reference corpus most similar to an assignment or text.
+    
+    POST parameters:
+    - assignment_id: ID of a similarity checker assignment, or
+    - text: the text to look up
+    - top_k: number of sources to return (optional)
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON data'}, status=400)
+    
+    top_k = data.get('top_k') or settings.CORPUS_TOP_K
+    exclude_hashes = set()
+    
+    try:
+        if data.get('assignment_id'):
+            assignment = St_Assignment.objects.filter(id=data['assignment_id']).first()
+            if assignment is None:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': f"Assignment with ID {data['assignment_id']} not found"
+                }, status=404)
+            text, _, content_hash = get_document_text(assignment.file.path, assignment.content_hash or None)
+            exclude_hashes.add(content_hash)
+        else:
+            text = data.get('text', '')
+        
+        if not text:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'An assignment_id or non-empty text is required'
+            }, status=400)
+        
+        start = time.perf_counter()
+        matches = query_corpus(text, int(top_k), exclude_hashes)
+        
+        return JsonResponse({
+            'status': 'success',
+            'matches': matches,
+            'query_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+    except Exception as e:
+        logger.exception(f"Error querying corpus index: {str(e)}")
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Error querying corpus index: {str(e)}'
+        }, status=500)
+
+def extraction_metrics(request):
+    """
+    Return the text extraction counters of this server process.
+    """
+    return JsonResponse({
+        'status': 'success',
+        **get_extraction_metrics()
+    })
+
+def class_similarity_matrix(request, course_id):
+    """
+    Return the stored similarity matrix of a course's submissions.
+    Nothing is recomputed; pairs are stored as submissions are uploaded.
+    """
+    if not models.Course.objects.filter(id=course_id).exists():
+        return JsonResponse({'status': 'error', 'message': 'Course not found'}, status=404)
+    
+    return JsonResponse({
+        'status': 'success',
+        'course_id': course_id,
+        **get_class_matrix(course_id)
+    })
+
+def suspicious_pairs(request, course_id):
+    """
+    Return the most similar pairs of submissions in a course.
+    
+    GET parameters:
+    - limit: number of pairs (default 10)
+    - min_score: only pairs at or above this similarity percentage
+    """
+    if not models.Course.objects.filter(id=course_id).exists():
+        return JsonResponse({'status': 'error', 'message': 'Course not found'}, status=404)
+    
+    try:
+        limit = int(request.GET.get('limit', 10))
+        min_score = float(request.GET['min_score']) if request.GET.get('min_score') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit and min_score must be numbers'}, status=400)
+    
+    return JsonResponse({
+        'status': 'success',
+        'course_id': course_id,
+        'pairs': get_suspicious_pairs(course_id, limit, min_score)
+    })
+
+@csrf_exempt
+def find_suspicious_pairs(request):
+    """
+    Queue a job that finds likely near-duplicate pairs with MinHash/LSH and runs
+    the full sentence-level analysis on those candidates only.
+
+    POST body:
+    - assignment_ids: the assignments to search, or
+    - course_id: search every submission of a course
+    - threshold: optional estimated Jaccard similarity a candidate must reach
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON data'}, status=400)
+
+    if data.get('course_id') is not None:
+        if not models.Course.objects.filter(id=data['course_id']).exists():
+            return JsonResponse({'status': 'error', 'message': 'Course not found'}, status=404)
+        assignment_ids = list(St_Assignment.objects.filter(course_id=data['course_id']).values_list('id', flat=True))
+    else:
+        assignment_ids = data.get('assignment_ids', [])
+        if len(St_Assignment.objects.filter(id__in=assignment_ids)) != len(assignment_ids):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'One or more selected assignments not found'
+            }, status=404)
+
+    if len(assignment_ids) < 2:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Please select at least 2 assignments to compare'
+        }, status=400)
+
+    params = {'assignment_ids': assignment_ids}
+    if data.get('threshold') is not None:
+        try:
+            params['threshold'] = float(data['threshold'])
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'threshold must be a number'}, status=400)
+
+    job = enqueue_job(SimilarityJob.KIND_SUSPICIOUS, params)
+    return JsonResponse({
+        'status': 'queued',
+        **job.to_dict()
+    }, status=202)
+
+def fingerprint_matches(request, assignment_id):
+    """
+    Find the submissions sharing the most winnowing fingerprints with an assignment.
+    
+    GET parameters:
+    - limit: number of matches (default 10)
+    - course_id: only consider submissions of this course
+    - spans: 'false' to leave out the matched character spans
+    """
+    assignment = St_Assignment.objects.filter(id=assignment_id).first()
+    if assignment is None:
+        return JsonResponse({'status': 'error', 'message': 'Assignment not found'}, status=404)
+    
+    try:
+        limit = int(request.GET.get('limit', 10))
+        course_id = int(request.GET['course_id']) if request.GET.get('course_id') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit and course_id must be integers'}, status=400)
+    
+    try:
+        if not assignment.content_hash:
+            cache_assignment_text(assignment)
+        matches = find_fingerprint_matches(
+            assignment, limit, course_id, with_spans=request.GET.get('spans', 'true').lower() != 'false'
+        )
+        return JsonResponse({
+            'status': 'success',
+            'assignment_id': assignment.id,
+            'matches': matches
+        })
+    except Exception as e:
+        logger.exception(f"Error finding fingerprint matches: {str(e)}")
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Error finding fingerprint matches: {str(e)}'
+        }, status=500)
+
 # Student class
 
 class StudentList(generics.ListCreateAPIView):
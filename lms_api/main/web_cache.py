@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    A size-bounded, least-recently-used cache of JSON entries stored as one
+    file per key. Reading an entry refreshes its file's mtime, and eviction
+    removes the files with the oldest mtime first.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self.counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0}
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f'{digest}.json')
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def get(self, key):
+        """
+        Return the stored entry for a key, or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # mark as recently used
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, entry):
+        """
+        Store an entry, then evict old entries if the cache is over its size bound.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry).encode('utf-8')
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.counters['stores'] += 1
+            if self._size is not None:
+                self._size += len(data) - old_size
+        self.evict()
+
+    def items(self):
+        """
+        Yield every stored entry, without marking it as recently used.
+        """
+        for path, _, _ in self._entries():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is under 90% of max_bytes.
+        """
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            if self._size <= self.max_bytes:
+                return
+
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            self._size = sum(size for _, size, _ in entries)
+            target = self.max_bytes * 0.9
+            for path, size, _ in entries:
+                if self._size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+                self.counters['evictions'] += 1
+
+_page_cache = None
+_search_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """
+    Return the process-wide cache of cleaned web page text.
+    """
+    global _page_cache
+    with _cache_lock:
+        if _page_cache is None:
+            _page_cache = DiskCache(settings.WEB_PAGE_CACHE_DIR, settings.WEB_PAGE_CACHE_MAX_BYTES)
+        return _page_cache
+
+def get_search_cache():
+    """
+    Return the process-wide cache of web search results.
+    """
+    global _search_cache
+    with _cache_lock:
+        if _search_cache is None:
+            _search_cache = DiskCache(settings.WEB_SEARCH_CACHE_DIR, settings.WEB_SEARCH_CACHE_MAX_BYTES)
+        return _search_cache
+
+def normalize_query(query):
+    """
+    Normalize a search query so trivially different spellings share a cache key:
+    lower case, punctuation dropped, whitespace collapsed.
+    """
+    query = re.sub(r'[^\w\s]', ' ', query.lower())
+    return ' '.join(query.split())
+
+def is_fresh(entry, ttl):
+    return time.time() - entry.get('fetched_at', 0) < ttl
+
+class SingleFlight:
+    """
+    De-duplicates concurrent calls: while a call for a key is running, other
+    callers with the same key wait for it and share its result (or exception)
+    instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+_host_semaphores = {}
+_host_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide HTTP session. Its connection pool is sized for
+    WEB_MAX_CONCURRENCY, so concurrent requests to one host reuse connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.WEB_MAX_CONCURRENCY,
+                pool_maxsize=settings.WEB_MAX_CONCURRENCY
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            })
+            _session = session
+        return _session
+
+@contextmanager
+def host_slot(url):
+    """
+    Hold one of the WEB_PER_HOST_LIMIT request slots for the URL's host.
+    """
+    host = urlsplit(url).netloc.lower()
+    with _host_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(settings.WEB_PER_HOST_LIMIT)
+            _host_semaphores[host] = semaphore
+    with semaphore:
+        yield
+
+def request(method, url, **kwargs):
+    """
+    Send a request through the shared session, respecting the per-host limit.
+    """
+    kwargs.setdefault('timeout', settings.WEB_REQUEST_TIMEOUT)
+    with host_slot(url):
+        return get_session().request(method, url, **kwargs)
+
+def run_concurrently(func, items, deadline=None):
+    """
+    Call func(item) for every item on a pool of WEB_MAX_CONCURRENCY threads.
+
+    Args:
+        func: callable taking one item
+        items: the items to process; duplicates are processed once
+        deadline: time.monotonic() value after which unfinished calls are abandoned
+
+    Returns:
+        dict: item -> func(item) for every call that finished in time without raising
+    """
+    items = list(dict.fromkeys(items))
+    if not items:
+        return {}
+
+    executor = ThreadPoolExecutor(max_workers=min(settings.WEB_MAX_CONCURRENCY, len(items)))
+    futures = {executor.submit(func, item): item for item in items}
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    done, not_done = wait(futures, timeout=timeout)
+
+    if not_done:
+        logger.warning(f"Deadline reached with {len(not_done)} of {len(items)} web requests unfinished")
+    # Don't block on stragglers; their results are simply dropped
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            logger.error(f"Web request for {futures[future]} failed: {e}")
+    return results
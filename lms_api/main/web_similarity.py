@@ -3,11 +3,8 @@ import re
 import json
 import hashlib
 import datetime
-import requests
+import time
 from bs4 import BeautifulSoup
-import textract
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
 from typing import List, Dict, Any, Optional
 import google.generativeai as genai
@@ -22,6 +19,17 @@ from reportlab.lib.colors import red, grey, lightgrey, white, black, blue, darkb
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics.charts.piecharts import Pie
 
+from django.conf import settings
+
+from . import web_client
+from .web_cache import SingleFlight, get_page_cache, get_search_cache, is_fresh, normalize_query
+from .corpus_index import KIND_WEB, query_corpus
+from .highlighting import iter_highlighted_paragraphs, locate_passages
+from .idf_model import text_similarity
+from .sentence_spans import get_document_sentences
+from .text_normalization import normalize_text
+from .utils import get_document_text
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -31,6 +39,7 @@ load_dotenv()
 # Configure API keys
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
+SERPER_SEARCH_URL = os.environ.get("SERPER_SEARCH_URL", "https://google.serper.dev/search")
 
 try:
     genai.configure(api_key=GOOGLE_API_KEY)
@@ -53,18 +62,6 @@ class HorizontalLineFlowable(Flowable):
         self.canv.setLineWidth(self.thickness)
         self.canv.line(0, 0, self.width, 0)
 
-def extract_text_from_file(file_path):
-    """Extract text from various file formats."""
-    try:
-        text = textract.process(file_path).decode('utf-8')
-        # Clean up the text
-        text = re.sub(r'\n+', '\n', text)  # Replace multiple newlines with single
-        text = re.sub(r'\t', ' ', text)    # Replace tabs with spaces
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from {file_path}: {e}")
-        return ""
-
 def create_pie_chart(data_dict, width=400, height=200):
     """Create a pie chart Drawing object."""
     drawing = Drawing(width, height)
@@ -92,8 +89,7 @@ def create_pie_chart(data_dict, width=400, height=200):
 
 def extract_significant_sentences(assignment_text: str, num_sentences: int = 3) -> List[str]:
     """Extract significant sentences for web search queries."""
-    sentences = re.split(r'[.!?]', assignment_text)
-    significant_sentences = [s.strip() for s in sentences if len(s.split()) > 5]
+    significant_sentences = normalize_text(assignment_text).sentence_texts(min_words=6)
     
     if not significant_sentences:
         return [assignment_text[:100]]
@@ -111,70 +107,129 @@ def extract_significant_sentences(assignment_text: str, num_sentences: int = 3)
     
     return queries
 
+# Concurrent searches for the same normalized query share one Serper call
+_search_flight = SingleFlight()
+
+
+def _search_serper(query: str, cache_key: str) -> List[Dict[str, str]]:
+    """Send one query to Serper and store the formatted results in the search cache."""
+    # Serper API request
+    url = SERPER_SEARCH_URL
+    headers = {
+        'X-API-KEY': SERPER_API_KEY,
+        'Content-Type': 'application/json'
+    }
+    payload = {
+        'q': query,
+        'num': 5  # Get top 5 results
+    }
+    
+    response = web_client.request('POST', url, headers=headers, json=payload)
+    response.raise_for_status()
+    results = response.json()
+    
+    # Extract and format the results
+    formatted_results = []
+    for result in results.get("organic", [])[:5]:
+        formatted_results.append({
+            "title": result.get("title", ""),
+            "link": result.get("link", ""),
+            "snippet": result.get("snippet", "")
+        })
+    
+    search_cache = get_search_cache()
+    search_cache.count('misses')
+    search_cache.set(cache_key, {
+        'query': cache_key,
+        'results': formatted_results,
+        'fetched_at': time.time()
+    })
+    
+    logger.info(f"Found {len(formatted_results)} search results for query")
+    return formatted_results
+
 # Simple function-based tools instead of BaseTool classes
 def search_web(query: str) -> List[Dict[str, str]]:
-    """Search the web for content similar to the query."""
+    """
+    Search the web for content similar to the query. Results are cached on disk
+    by normalized query for WEB_SEARCH_CACHE_TTL seconds.
+    """
     try:
         api_key = SERPER_API_KEY
         if not api_key:
             logger.error("Serper API key is missing")
             return [{"title": "Error", "link": "", "snippet": "API key is missing"}]
-            
-        # Serper API request
-        url = "https://google.serper.dev/search"
-        headers = {
-            'X-API-KEY': api_key,
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            'q': query,
-            'num': 5  # Get top 5 results
-        }
         
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        results = response.json()
-        
-        # Extract and format the results
-        formatted_results = []
-        for result in results.get("organic", [])[:5]:
-            formatted_results.append({
-                "title": result.get("title", ""),
-                "link": result.get("link", ""),
-                "snippet": result.get("snippet", "")
-            })
+        cache_key = normalize_query(query)
+        search_cache = get_search_cache()
+        entry = search_cache.get(cache_key)
+        if entry and is_fresh(entry, settings.WEB_SEARCH_CACHE_TTL):
+            search_cache.count('hits')
+            return entry['results']
         
-        logger.info(f"Found {len(formatted_results)} search results for query")
-        return formatted_results
+        return _search_flight.do(cache_key, lambda: _search_serper(query, cache_key))
     except Exception as e:
         logger.error(f"Error searching web: {e}")
         return []
 
+def html_to_text(html: str) -> str:
+    """Extract the readable text of an HTML page."""
+    # Parse HTML and extract text
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.extract()
+        
+    # Get text
+    text = soup.get_text()
+    
+    # Clean text
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
 def fetch_web_content(url: str) -> str:
-    """Fetch content from a web page."""
+    """
+    Fetch the cleaned text of a web page. Pages are served from the on-disk
+    page cache while fresh; stale entries are revalidated with ETag /
+    Last-Modified so an unchanged page skips both the download and the parse.
+    """
+    page_cache = get_page_cache()
+    entry = page_cache.get(url)
+    
+    if entry and is_fresh(entry, settings.WEB_PAGE_CACHE_TTL):
+        page_cache.count('hits')
+        return entry['text']
+    
     try:
-        # Fetch web page content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
+        # Fetch web page content through the shared, pooled session
+        response = web_client.request('GET', url, headers=headers)
+        
+        if entry and response.status_code == 304:
+            page_cache.count('revalidated')
+            entry['fetched_at'] = time.time()
+            page_cache.set(url, entry)
+            return entry['text']
         
-        response = requests.get(url, headers=headers, timeout=10)
         response.raise_for_status()
+        page_cache.count('misses')
         
-        # Parse HTML and extract text
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
-            
-        # Get text
-        text = soup.get_text()
-        
-        # Clean text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        text = html_to_text(response.text)
+        page_cache.set(url, {
+            'url': url,
+            'text': text,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time()
+        })
         
         logger.info(f"Successfully fetched content from {url[:50]}...")
         return text
@@ -189,9 +244,7 @@ def calculate_similarity(text1: str, text2: str) -> float:
             logger.warning("Empty text provided for similarity calculation")
             return 0.0
             
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform([text1, text2])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+        similarity = text_similarity(text1, text2)
         result = round(similarity * 100, 2)
         
         logger.info(f"Calculated similarity: {result}%")
@@ -485,32 +538,18 @@ def generate_report_with_highlighting(analysis_results: Dict[str, Any], output_p
             if plagiarized_text:
                 plagiarized_sections[plagiarized_text] = match.get("source_url", "")
     
-    # Split the assignment text into paragraphs
-    paragraphs = assignment_text.split('\n')
+    # Find every occurrence of every section in one pass over the text,
+    # merge overlaps and highlight paragraphs by offset
+    highlights = locate_passages(assignment_text, plagiarized_sections, analysis_results.get("sentence_spans"))
     
-    # Process each paragraph to highlight plagiarism
-    for paragraph in paragraphs:
-        if not paragraph.strip():
+    for paragraph, source_urls in iter_highlighted_paragraphs(assignment_text, highlights):
+        if paragraph is None:
             elements.append(Spacer(1, 6))
             continue
         
-        # Check if the paragraph contains any plagiarized sections
-        plagiarized = False
-        for plagiarized_text, source_url in plagiarized_sections.items():
-            if plagiarized_text in paragraph:
-                # Highlight the plagiarized text
-                highlighted_paragraph = paragraph.replace(
-                    plagiarized_text, 
-                    f'<font color="red" backcolor="yellow">{plagiarized_text}</font>'
-                )
-                elements.append(Paragraph(highlighted_paragraph, normal_style))
-                elements.append(Paragraph(f"<i><font size='8'>Source: {source_url}</font></i>", styles["Italic"]))
-                plagiarized = True
-                break
-        
-        # If no plagiarism found in this paragraph, add it normally
-        if not plagiarized:
-            elements.append(Paragraph(paragraph, normal_style))
+        elements.append(Paragraph(paragraph, normal_style))
+        for source_url in source_urls:
+            elements.append(Paragraph(f"<i><font size='8'>Source: {source_url}</font></i>", styles["Italic"]))
     
     # Analysis methodology section
     elements.append(PageBreak())
@@ -552,7 +591,60 @@ def get_web_similarity_report_filename(assignment_path):
     
     return f"web_similarity_report_{hash_str}.pdf"
 
-def analyze_assignment_web_similarity(assignment_path, output_dir):
+def search_and_fetch_sources(assignment_text: str, exclude_urls=()) -> List[Dict[str, Any]]:
+    """
+    Search the web for an assignment's significant sentences and fetch the top results.
+    
+    Returns:
+        list: web sources with url, title, content and TF-IDF similarity
+    """
+    # Get significant sentences for search queries
+    search_queries = extract_significant_sentences(assignment_text)
+    
+    # Searches and page fetches share one overall deadline
+    deadline = time.monotonic() + settings.WEB_ANALYSIS_DEADLINE
+    
+    # Search web for similar content, all queries at once
+    search_results = web_client.run_concurrently(search_web, search_queries, deadline)
+    web_results = []
+    for query in search_queries:
+        web_results.extend(search_results.get(query, []))
+    
+    # Remove duplicates by URL
+    unique_results = {}
+    for result in web_results:
+        url = result['link']
+        if url not in unique_results and url not in exclude_urls:
+            unique_results[url] = result
+    
+    web_results = list(unique_results.values())
+    
+    # Fetch content from each web source concurrently
+    web_results = web_results[:5]  # Limit to top 5 results
+    page_contents = web_client.run_concurrently(
+        fetch_web_content, [result['link'] for result in web_results], deadline
+    )
+    
+    web_sources = []
+    for result in web_results:
+        url = result['link']
+        title = result['title']
+        content = page_contents.get(url, "")
+        
+        if content:
+            # Calculate basic similarity
+            similarity = calculate_similarity(assignment_text, content)
+            
+            web_sources.append({
+                'url': url,
+                'title': title,
+                'content': content,
+                'similarity': similarity
+            })
+    
+    return web_sources
+
+def analyze_assignment_web_similarity(assignment_path, output_dir, content_hash=None):
     """
     Analyze an assignment for web similarity using Google Gemini.
     This version includes the full assignment text with highlighted plagiarism in the report.
@@ -560,6 +652,7 @@ def analyze_assignment_web_similarity(assignment_path, output_dir):
     Args:
         assignment_path (str): Path to the assignment file
         output_dir (str): Directory to save the report
+        content_hash (str): Known SHA-256 of the file, used for the text cache
         
     Returns:
         dict: Result information including report path and similarity score
@@ -570,8 +663,8 @@ def analyze_assignment_web_similarity(assignment_path, output_dir):
     try:
         logger.info(f"Starting web similarity analysis for: {assignment_path}")
         
-        # Extract assignment text
-        assignment_text = extract_text_from_file(assignment_path)
+        # Get assignment text from the extraction cache
+        assignment_text, _, content_hash = get_document_text(assignment_path, content_hash)
         if not assignment_text:
             return {
                 'web_similarity_score': 0,
@@ -580,42 +673,42 @@ def analyze_assignment_web_similarity(assignment_path, output_dir):
                 'report_filename': None
             }
         
-        # Get significant sentences for search queries
-        search_queries = extract_significant_sentences(assignment_text)
-        
-        # Search web for similar content
-        web_results = []
-        for query in search_queries:
-            results = search_web(query)
-            web_results.extend(results)
-        
-        # Remove duplicates by URL
-        unique_results = {}
-        for result in web_results:
-            url = result['link']
-            if url not in unique_results:
-                unique_results[url] = result
-        
-        web_results = list(unique_results.values())
-        
-        # Fetch content from each web source
+        # Look the assignment up in the local corpus before making any external call
+        try:
+            corpus_matches = [
+                match for match in query_corpus(assignment_text, exclude_hashes={content_hash})
+                if match['score'] >= settings.CORPUS_MIN_SCORE
+            ]
+        except Exception as e:
+            logger.error(f"Error querying local corpus: {e}")
+            corpus_matches = []
+        
+        # Web pages already in the corpus are compared from the page cache
         web_sources = []
-        for result in web_results[:5]:  # Limit to top 5 results
-            url = result['link']
-            title = result['title']
-            content = fetch_web_content(url)
-            
-            if content:
-                # Calculate basic similarity
-                similarity = calculate_similarity(assignment_text, content)
-                
+        page_cache = get_page_cache()
+        for match in corpus_matches:
+            if match['kind'] != KIND_WEB:
+                continue
+            entry = page_cache.get(match['url'])
+            if entry and entry.get('text'):
                 web_sources.append({
-                    'url': url,
-                    'title': title,
-                    'content': content,
-                    'similarity': similarity
+                    'url': match['url'],
+                    'title': match['title'],
+                    'content': entry['text'],
+                    'similarity': calculate_similarity(assignment_text, entry['text'])
                 })
         
+        if any(match['kind'] == KIND_WEB and match['score'] >= settings.CORPUS_SKIP_SEARCH_SCORE
+               for match in corpus_matches) and web_sources:
+            logger.info("Strong local corpus match found, skipping live web search")
+        else:
+            web_sources.extend(search_and_fetch_sources(
+                assignment_text, exclude_urls={source['url'] for source in web_sources}
+            ))
+        
+        logger.info(f"Web page cache counters: {page_cache.stats()}")
+        logger.info(f"Web search cache counters: {get_search_cache().stats()}")
+        
         # Use Gemini for in-depth analysis
         gemini_analysis = analyze_with_gemini(assignment_text, web_sources)
         
@@ -623,9 +716,16 @@ def analyze_assignment_web_similarity(assignment_path, output_dir):
         report_filename = get_web_similarity_report_filename(assignment_path)
         report_path = os.path.join(output_dir, report_filename)
         
+        try:
+            sentence_spans = get_document_sentences([content_hash]).get(content_hash)
+        except Exception as e:
+            logger.error(f"Error loading sentence spans: {e}")
+            sentence_spans = None
+        
         # Combine all results for report generation
         analysis_results = {
             "assignment_text": assignment_text,
+            "sentence_spans": sentence_spans,
             "overall_similarity_score": gemini_analysis.get("overall_similarity_score", 0),
             "web_sources": web_sources,
             "detailed_matches": gemini_analysis.get("detailed_matches", []),
@@ -641,7 +741,8 @@ def analyze_assignment_web_similarity(assignment_path, output_dir):
             'web_similarity_score': analysis_results["overall_similarity_score"],
             'report_path': report_path,
             'report_filename': report_filename,
-            'analysis_summary': analysis_results["similarity_assessment"]
+            'analysis_summary': analysis_results["similarity_assessment"],
+            'corpus_matches': corpus_matches
         }
     except Exception as e:
         logger.error(f"Error in web similarity analysis: {e}", exc_info=True)